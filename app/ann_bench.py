@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from app.vector_store import ANN_NPROBE, FAISS_AVAILABLE, FaissANNIndex, IVFIndex, _unit_rows
+
+_CHUNK_ROWS = 262144
+
+
+def synthetic_corpus(
+    size: int, dim: int, clusters: int = 1024, seed: int = 0
+) -> tuple[np.ndarray, np.ndarray]:
+    # Embeddings of news text are strongly clustered (by ticker, event type and
+    # phrasing), so a Gaussian mixture is a fairer stand-in than uniform noise.
+    # Rows are generated and normalised in place a chunk at a time, so the
+    # corpus is the only full-size array (size * dim * 4 bytes).
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = np.empty((size, dim), dtype=np.float32)
+    for start in range(0, size, _CHUNK_ROWS):
+        chunk = vectors[start : start + _CHUNK_ROWS]
+        np.take(centers, rng.integers(0, clusters, len(chunk)), axis=0, out=chunk)
+        noise = rng.standard_normal(chunk.shape, dtype=np.float32)
+        noise *= 1.5
+        chunk += noise
+        norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+        np.divide(chunk, norms, out=chunk, where=norms > 0)
+    return vectors, centers
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, top_k: int) -> np.ndarray:
+    best = np.empty((len(queries), top_k), dtype=np.int64)
+    for row, query in enumerate(queries):
+        scores = vectors @ query
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        best[row] = candidates[np.argsort(-scores[candidates])]
+    return best
+
+
+def _percentiles(latencies: list[float]) -> tuple[float, float]:
+    p50, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 99])
+    return float(p50), float(p99)
+
+
+def bench(
+    size: int, dim: int, backends: list[str], queries: int, top_k: int, nprobe: int
+) -> list[str]:
+    vectors, _ = synthetic_corpus(size, dim)
+    rng = np.random.default_rng(1)
+    picks = vectors[rng.integers(0, size, queries)]
+    noise = rng.standard_normal(picks.shape).astype(np.float32)
+    query_vectors = _unit_rows(picks + 0.3 * noise / np.sqrt(dim))
+
+    latencies = []
+    truth = np.empty((queries, top_k), dtype=np.int64)
+    for row, query in enumerate(query_vectors):
+        started = time.perf_counter()
+        truth[row] = exact_top_k(vectors, query[None, :], top_k)[0]
+        latencies.append(time.perf_counter() - started)
+    p50, p99 = _percentiles(latencies)
+    lines = [f"n={size} dim={dim} backend=flat recall@{top_k}=1.000 p50={p50:.2f}ms p99={p99:.2f}ms"]
+
+    # An ivf build reorders the corpus in place rather than copying it; row_ids
+    # maps positions in the current row order back to the generated ones.
+    row_ids: np.ndarray | None = None
+    for backend in backends:
+        if backend != "ivf" and not FAISS_AVAILABLE:
+            lines.append(f"n={size} backend={backend} skipped: faiss is not installed")
+            continue
+        started = time.perf_counter()
+        if backend == "ivf":
+            index = IVFIndex(vectors, nprobe=nprobe, in_place=True)
+        else:
+            index = FaissANNIndex(vectors, backend, nprobe=nprobe)
+        build = time.perf_counter() - started
+        latencies = []
+        hits = 0
+        for row, query in enumerate(query_vectors):
+            started = time.perf_counter()
+            _, positions = index.search(query[None, :], top_k)
+            latencies.append(time.perf_counter() - started)
+            if row_ids is not None:
+                positions = np.where(positions >= 0, row_ids[positions], -1)
+            hits += len(set(positions[0].tolist()) & set(truth[row].tolist()))
+        p50, p99 = _percentiles(latencies)
+        lines.append(
+            f"n={size} dim={dim} backend={backend} build={build:.1f}s "
+            f"recall@{top_k}={hits / (queries * top_k):.3f} p50={p50:.2f}ms p99={p99:.2f}ms"
+        )
+        if backend == "ivf":
+            row_ids = index.order if row_ids is None else row_ids[index.order]
+    return lines
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Recall and latency of ANN backends against the flat index.")
+    parser.add_argument(
+        "--sizes",
+        default="100000",
+        help="comma-separated corpus sizes, e.g. 100000,1000000; each needs size * dim * 4 bytes of memory",
+    )
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument(
+        "--backends", default="ivf,HNSW32,IVF1024,PQ32", help="'ivf' and/or faiss index_factory specs"
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=ANN_NPROBE)
+    args = parser.parse_args(argv)
+
+    backends = _split_backends(args.backends)
+    for size in (int(value) for value in args.sizes.split(",")):
+        for line in bench(size, args.dim, backends, args.queries, args.top_k, args.nprobe):
+            print(line, file=sys.stderr)
+    return 0
+
+
+def _split_backends(value: str) -> list[str]:
+    # faiss specs contain commas ("IVF1024,PQ32"), so a part that does not start
+    # a new index type continues the previous spec.
+    backends: list[str] = []
+    for part in value.split(","):
+        if backends and backends[-1] != "ivf" and not part.startswith(("ivf", "HNSW", "IVF", "Flat")):
+            backends[-1] += f",{part}"
+        else:
+            backends.append(part)
+    return backends
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
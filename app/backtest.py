@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from app import db
+from app.ingest import chunked, ingest_news_many, iter_ndjson
+from app.llm_analyzer import AsyncLLMClient, analyze_article_async, default_async_client
+from app.models import LLMImpactResult, NewsIn
+from app.pipeline import _query, persist_analysis
+from app.rag import retrieve_context, seed_profiles_if_missing
+from app.ticker_linker import REGISTRY
+from app.utils import clean_text
+
+STAGES = ("ingest", "retrieve", "analyze", "apply")
+
+
+@dataclass
+class StageStats:
+    items: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.items / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class BacktestReport:
+    partitions: int = 1
+    news: int = 0
+    analyzed: int = 0
+    elapsed: float = 0.0
+    stages: dict[str, StageStats] = field(default_factory=lambda: {name: StageStats() for name in STAGES})
+
+    @contextmanager
+    def timed(self, stage: str, items: int) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage].items += items
+            self.stages[stage].seconds += time.perf_counter() - started
+
+    def merge(self, other: BacktestReport) -> None:
+        # Partitions run side by side, so a stage's wall-clock is its slowest partition.
+        self.analyzed += other.analyzed
+        self.news = max(self.news, other.news)
+        for name, stats in other.stages.items():
+            merged = self.stages[name]
+            merged.items += stats.items
+            merged.seconds = max(merged.seconds, stats.seconds)
+
+
+@dataclass
+class _Pending:
+    item: NewsIn
+    article: str
+    tickers: list[str]
+
+
+def in_partition(ticker: str, partition: int, partitions: int) -> bool:
+    return zlib.crc32(ticker.encode("utf-8")) % partitions == partition
+
+
+def _time_ordered(items: Iterable[NewsIn]) -> Iterator[NewsIn]:
+    last: datetime | None = None
+    for item in items:
+        if last is not None and item.published_at < last:
+            raise ValueError(f"archive is not time-ordered: {item.id} precedes {last.isoformat()}")
+        last = item.published_at
+        yield item
+
+
+def _micro_batches(pending: list[_Pending]) -> Iterator[list[_Pending]]:
+    # Consecutive items with no ticker in common can be retrieved and analyzed
+    # together: none of them can see state written by another, exactly as when
+    # they run one at a time. A repeated ticker starts the next batch.
+    batch: list[_Pending] = []
+    used: set[str] = set()
+    for entry in pending:
+        if used.intersection(entry.tickers):
+            yield batch
+            batch, used = [], set()
+        batch.append(entry)
+        used.update(entry.tickers)
+    if batch:
+        yield batch
+
+
+def _analyze_batch(
+    batch: list[_Pending],
+    report: BacktestReport,
+    loop: asyncio.AbstractEventLoop,
+    client: AsyncLLMClient,
+) -> None:
+    pairs = [(entry, ticker) for entry in batch for ticker in entry.tickers]
+    with report.timed("retrieve", len(pairs)):
+        contexts = [
+            retrieve_context(
+                ticker=ticker,
+                query=_query(entry.item.model_dump(), ticker),
+                top_k=6,
+                as_of=entry.item.published_at,
+            )
+            for entry, ticker in pairs
+        ]
+
+    async def analyze_all() -> list[LLMImpactResult | None]:
+        return await asyncio.gather(
+            *(
+                analyze_article_async(ticker=ticker, article=entry.article, context=chunks, client=client)
+                for (entry, ticker), chunks in zip(pairs, contexts)
+            )
+        )
+
+    with report.timed("analyze", len(pairs)):
+        analyses = loop.run_until_complete(analyze_all())
+    outcomes = iter(zip(contexts, analyses))
+    with report.timed("apply", len(batch)), db.transaction():
+        for entry in batch:
+            persist_analysis(
+                entry.item.id,
+                entry.item.published_at.isoformat(),
+                entry.tickers,
+                [next(outcomes) for _ in entry.tickers],
+            )
+    report.analyzed += len(batch)
+
+
+def run_partition(
+    archive: str | Path,
+    scratch_db: str | Path,
+    partition: int = 0,
+    partitions: int = 1,
+    chunk_size: int = 1000,
+) -> BacktestReport:
+    # Every partition ingests the whole archive into its own scratch database, so
+    # dedupe and linking match a single run, then analyzes only its own tickers.
+    # Items are processed in publication order and retrieval only sees state
+    # written by earlier items, so no future event leaks into an analysis.
+    # This repoints the whole process at the scratch database, so run_backtest
+    # only ever calls it in a child process.
+    with _scratch_database(Path(scratch_db)):
+        return _run_partition(archive, partition, partitions, chunk_size)
+
+
+@contextmanager
+def _scratch_database(path: Path) -> Iterator[None]:
+    # Redirects the app to the scratch database for the duration of a run. The
+    # index is pinned next to it too: APP_INDEX_DIR may name the live
+    # checkpoint, which a replay must never overwrite.
+    previous_db, previous_index = db.DB_PATH, os.environ.get("APP_INDEX_DIR")
+    db.DB_PATH = path
+    os.environ["APP_INDEX_DIR"] = str(path.with_suffix(".index"))
+    try:
+        yield
+    finally:
+        db.DB_PATH = previous_db
+        if previous_index is None:
+            os.environ.pop("APP_INDEX_DIR", None)
+        else:
+            os.environ["APP_INDEX_DIR"] = previous_index
+
+
+def _run_partition(archive: str | Path, partition: int, partitions: int, chunk_size: int) -> BacktestReport:
+    db.init_db()
+    seed_profiles_if_missing()
+    REGISTRY.refresh(wait=True)
+
+    report = BacktestReport(partitions=partitions)
+    loop = asyncio.new_event_loop()
+    client = default_async_client()
+    started = time.perf_counter()
+    try:
+        with open(archive, encoding="utf-8") as stream:
+            for chunk in chunked(_time_ordered(iter_ndjson(stream)), chunk_size):
+                with report.timed("ingest", len(chunk)):
+                    responses = ingest_news_many(chunk, enqueue=False)
+                report.news += len(chunk)
+                pending = []
+                for item, response in zip(chunk, responses):
+                    tickers = [
+                        ticker for ticker in response.tickers if in_partition(ticker, partition, partitions)
+                    ]
+                    if response.deduped or response.near_duplicate_of or not tickers:
+                        continue
+                    article = clean_text(f"{item.title} {item.content}")
+                    pending.append(_Pending(item=item, article=article, tickers=tickers))
+                for batch in _micro_batches(pending):
+                    _analyze_batch(batch, report, loop, client)
+    finally:
+        close = getattr(client, "aclose", None)
+        if close is not None:
+            loop.run_until_complete(close())
+        loop.close()
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def run_backtest(
+    archive: str | Path,
+    scratch_dir: str | Path | None = None,
+    partitions: int = 1,
+    chunk_size: int = 1000,
+) -> BacktestReport:
+    scratch = Path(scratch_dir or tempfile.mkdtemp(prefix="backtest-"))
+    scratch.mkdir(parents=True, exist_ok=True)
+    partitions = max(1, partitions)
+    started = time.perf_counter()
+    report = BacktestReport(partitions=partitions)
+    # Partitions always run in fresh child processes, even when there is only
+    # one: a replay swaps the process-wide database and index paths, which the
+    # caller's other threads (e.g. a serving API) must never see. Spawned
+    # rather than forked, so no caches or dead lane threads are inherited.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=partitions, mp_context=context) as pool:
+        futures = [
+            pool.submit(run_partition, archive, scratch / f"part-{idx}.db", idx, partitions, chunk_size)
+            for idx in range(partitions)
+        ]
+        for future in futures:
+            report.merge(future.result())
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def format_report(report: BacktestReport) -> str:
+    lines = [
+        f"news={report.news} analyzed={report.analyzed} partitions={report.partitions} "
+        f"elapsed={report.elapsed:.1f}s"
+    ]
+    for name, stats in report.stages.items():
+        lines.append(f"  {name:<8} items={stats.items} seconds={stats.seconds:.2f} rate={stats.rate:.0f}/s")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a time-ordered NDJSON news archive offline.")
+    parser.add_argument("--ndjson", required=True, help="path to an NDJSON archive sorted by published_at")
+    parser.add_argument("--scratch-dir", help="directory for per-partition scratch databases")
+    parser.add_argument("--partitions", type=int, default=1, help="ticker partitions run as processes")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    report = run_backtest(args.ndjson, args.scratch_dir, args.partitions, args.chunk_size)
+    print(format_report(report), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
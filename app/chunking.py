@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+from app.lexical import tokenize
+from app.utils import hash_text
+
+CHUNK_CHARS = int(os.getenv("APP_CHUNK_CHARS", "560"))
+MIN_CHUNK_CHARS = int(os.getenv("APP_MIN_CHUNK_CHARS", "80"))
+WINDOW_CHARS = 280
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+_WORD_RE = re.compile(r"\S+")
+
+
+@dataclass(frozen=True)
+class Chunk:
+    # chunk_id is stable across edits that leave this part of the document
+    # alone; start/end locate the part in the stored document text. attributes
+    # override document-level metadata (status, severity, ...) for this part.
+    chunk_id: str
+    text: str
+    start: int
+    end: int
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+
+def _sentence_spans(text: str) -> list[tuple[int, int]]:
+    spans = []
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        spans.append((start, match.start()))
+        start = match.end()
+    if start < len(text.rstrip()):
+        spans.append((start, len(text.rstrip())))
+    return [(start, end) for start, end in spans if end > start]
+
+
+def _split_long(text: str, start: int, end: int) -> list[tuple[int, int]]:
+    pieces = []
+    piece_start = piece_end = start
+    for word in _WORD_RE.finditer(text, start, end):
+        if word.end() - piece_start > CHUNK_CHARS and piece_end > piece_start:
+            pieces.append((piece_start, piece_end))
+            piece_start = word.start()
+        piece_end = word.end()
+    if piece_end > piece_start:
+        pieces.append((piece_start, piece_end))
+    return pieces
+
+
+def chunk_text(text: str) -> list[Chunk]:
+    # One chunk per sentence, with short sentences folded into the next one and
+    # long ones split at word boundaries. Ids hash the chunk's own text, so an
+    # edit elsewhere in the document leaves them (and their vectors) alone.
+    spans: list[tuple[int, int]] = []
+    pending: int | None = None
+    for start, end in _sentence_spans(text):
+        if pending is not None:
+            start = pending
+        if end - start < MIN_CHUNK_CHARS:
+            pending = start
+            continue
+        pending = None
+        spans.extend(_split_long(text, start, end) if end - start > CHUNK_CHARS else [(start, end)])
+    if pending is not None:
+        if spans and len(text.rstrip()) - spans[-1][0] <= CHUNK_CHARS:
+            spans[-1] = (spans[-1][0], len(text.rstrip()))
+        else:
+            spans.append((pending, len(text.rstrip())))
+
+    chunks = []
+    seen: dict[str, int] = {}
+    for start, end in spans:
+        body = text[start:end]
+        digest = hash_text(body)[:12]
+        seen[digest] = seen.get(digest, 0) + 1
+        chunk_id = digest if seen[digest] == 1 else f"{digest}-{seen[digest]}"
+        chunks.append(Chunk(chunk_id=chunk_id, text=body, start=start, end=end))
+    return chunks
+
+
+def _span(document: str, value: Any, cursor: int) -> tuple[int, int]:
+    # store_snapshot writes json.dumps with default separators, so every nested
+    # value appears verbatim in the stored text.
+    fragment = json.dumps(value)
+    start = document.find(fragment, cursor)
+    if start < 0:
+        return cursor, cursor
+    return start, start + len(fragment)
+
+
+def _impact(entry: dict[str, Any]) -> str:
+    return f"impact {float(entry.get('impact_score') or 0.0):+.2f}"
+
+
+def chunk_snapshot(state_json: str) -> list[Chunk]:
+    # Field-aware: one chunk per open event and per key risk, keyed by the event
+    # they describe, plus one for the recent catalysts. The volatile
+    # last_updated field is left out so an unrelated write re-embeds nothing.
+    # Open events and key risks carry status only: each event's own text is
+    # already indexed as an event chunk, and a copy here would compete with it.
+    try:
+        state = json.loads(state_json)
+    except ValueError:
+        return chunk_text(state_json)
+    if not isinstance(state, dict):
+        return chunk_text(state_json)
+
+    chunks = []
+    for section, label in (("open_events", "Open"), ("key_risks", "Key risk:")):
+        cursor = state_json.find(f'"{section}"')
+        for entry in state.get(section) or []:
+            start, end = _span(state_json, entry, max(cursor, 0))
+            cursor = end
+            details = [entry.get("severity"), _impact(entry), entry.get("horizon")]
+            if entry.get("start_ts"):
+                details.append(f"since {entry['start_ts']}")
+            status = ", ".join(str(detail) for detail in details if detail)
+            text = f"{label} {entry.get('event_type')} ({status})"
+            chunk_id = f"{section}:{entry.get('event_type')}:{entry.get('source_id')}"
+            attributes = {
+                "status": "open",
+                "severity": entry.get("severity"),
+                "impact_score": entry.get("impact_score"),
+                "effective_at": entry.get("start_ts"),
+            }
+            chunks.append(Chunk(chunk_id=chunk_id, text=text, start=start, end=end, attributes=attributes))
+
+    catalysts = state.get("recent_catalysts") or []
+    if catalysts:
+        start, end = _span(state_json, catalysts, max(state_json.find('"recent_catalysts"'), 0))
+        text = "Recent catalysts: " + "; ".join(
+            f"{entry.get('event_type')} ({entry.get('status')}, {_impact(entry)}): {entry.get('summary', '')}"
+            for entry in catalysts
+        )
+        newest = max((entry.get("start_ts") or "" for entry in catalysts), default="") or None
+        chunks.append(
+            Chunk(
+                chunk_id="recent_catalysts",
+                text=text,
+                start=start,
+                end=end,
+                attributes={"effective_at": newest},
+            )
+        )
+    return chunks
+
+
+def chunk_document(layer: str, text: str) -> list[Chunk]:
+    if layer == "state":
+        return chunk_snapshot(text)
+    return chunk_text(text)
+
+
+def best_window(text: str, query: str, width: int = WINDOW_CHARS) -> str:
+    # The width-character window, starting and ending on word boundaries, that
+    # covers the most distinct query terms; ties keep the earliest window.
+    if len(text) <= width:
+        return text
+    terms = set(tokenize(query))
+    words = [(match.start(), match.end(), set(tokenize(match.group()))) for match in _WORD_RE.finditer(text)]
+    best_start, best_end, best_score = 0, 0, -1
+    for first, (start, _, _) in enumerate(words):
+        covered: set[str] = set()
+        end = start
+        for word_start, word_end, word_terms in words[first:]:
+            if word_end - start > width:
+                break
+            covered |= word_terms & terms
+            end = word_end
+        if len(covered) > best_score:
+            best_start, best_end, best_score = start, end, len(covered)
+    if best_end <= best_start:
+        return text[:width]
+    return text[best_start:best_end]
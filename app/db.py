@@ -2,23 +2,204 @@ from __future__ import annotations
 
 import json
 import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import AbstractContextManager, contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterator
 
 DB_PATH = Path(os.getenv("APP_DB_PATH", "data/app.db"))
+POOL_SIZE = int(os.getenv("APP_DB_POOL_SIZE", "8"))
 
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA mmap_size={int(os.getenv('APP_DB_MMAP_SIZE', str(256 * 1024 * 1024)))}",
+    f"PRAGMA cache_size={int(os.getenv('APP_DB_CACHE_SIZE', '-65536'))}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=30000",
+)
 
-def get_connection() -> sqlite3.Connection:
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+RowListener = Callable[[str, str, "dict[str, Any] | None", int], None]
+_ROW_LISTENERS: list[RowListener] = []
+
+
+def get_connection(path: Path | None = None) -> sqlite3.Connection:
+    path = path or DB_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
+class ConnectionPool:
+    def __init__(self, path: Path, size: int = POOL_SIZE) -> None:
+        self.path = path
+        self.size = max(1, size)
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return get_connection(self.path)
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        # Re-entrant: nested use on one thread shares the connection it already holds.
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            # A write that failed outside a unit of work leaves sqlite3's implicit
+            # BEGIN open; it must not go back to the pool holding the write lock.
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_POOL: ConnectionPool | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _POOL
+
+    pool = _POOL
+    if pool is not None and pool.path == DB_PATH:
+        return pool
+    with _POOL_LOCK:
+        if _POOL is None or _POOL.path != DB_PATH:
+            if _POOL is not None:
+                _POOL.close()
+            _POOL = ConnectionPool(DB_PATH, POOL_SIZE)
+        return _POOL
+
+
+def connection() -> AbstractContextManager[sqlite3.Connection]:
+    return get_pool().connection()
+
+
+_TX = threading.local()
+
+
+def in_transaction() -> bool:
+    return getattr(_TX, "depth", 0) > 0
+
+
+def on_commit(callback: Callable[[], None]) -> None:
+    # Outside a unit of work there is nothing to wait for.
+    if not in_transaction():
+        callback()
+        return
+    _TX.after_commit.append(callback)
+
+
+def before_commit(key: Any, callback: Callable[[], None]) -> None:
+    # Runs callback once per key just before the outermost commit, inside the
+    # transaction, so repeated changes to one object coalesce into one write.
+    if not in_transaction():
+        callback()
+        return
+    _TX.before_commit.setdefault(key, callback)
+
+
+def on_rollback(callback: Callable[[], None]) -> None:
+    if in_transaction():
+        _TX.after_rollback.append(callback)
+
+
+def _reset_callbacks() -> None:
+    _TX.after_commit = []
+    _TX.before_commit = {}
+    _TX.after_rollback = []
+
+
+def _flush_before_commit() -> None:
+    # Callbacks may write and register further callbacks; drain until quiet.
+    while _TX.before_commit:
+        key = next(iter(_TX.before_commit))
+        _TX.before_commit.pop(key)()
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    # Unit of work: nested transactions and every helper used inside join one commit.
+    depth = getattr(_TX, "depth", 0)
+    callbacks: list[Callable[[], None]] = []
+    try:
+        with connection() as conn:
+            if depth == 0:
+                conn.execute("BEGIN IMMEDIATE")
+                _reset_callbacks()
+            _TX.depth = depth + 1
+            try:
+                yield conn
+                if depth == 0:
+                    _flush_before_commit()
+            except BaseException:
+                if depth == 0:
+                    conn.rollback()
+                    callbacks = _TX.after_rollback
+                    _reset_callbacks()
+                raise
+            else:
+                if depth == 0:
+                    conn.commit()
+                    callbacks = _TX.after_commit
+                    _reset_callbacks()
+            finally:
+                _TX.depth = depth
+    finally:
+        # Callbacks run once the connection is back in the pool: they may wait on
+        # locks (e.g. the index's) whose holders are waiting for a connection.
+        for callback in callbacks:
+            callback()
+
+
+_SCHEMA_PATH: Path | None = None
+
+
 def init_db() -> None:
-    conn = get_connection()
+    global _SCHEMA_PATH
+
+    with connection() as conn:
+        _create_schema(conn)
+    _SCHEMA_PATH = DB_PATH
+
+
+def ensure_schema() -> None:
+    if _SCHEMA_PATH != DB_PATH:
+        init_db()
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
     cur = conn.cursor()
     cur.executescript(
         """
@@ -48,6 +229,23 @@ def init_db() -> None:
             evidence TEXT NOT NULL,
             created_at DATETIME NOT NULL
         );
+        CREATE TABLE IF NOT EXISTS state_event_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticker TEXT NOT NULL,
+            event_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            ts TEXT NOT NULL,
+            row_json TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_state_event_log_ticker
+            ON state_event_log (ticker, seq);
+        CREATE TABLE IF NOT EXISTS state_checkpoints (
+            ticker TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            max_ts TEXT NOT NULL,
+            events_json TEXT NOT NULL,
+            PRIMARY KEY (ticker, seq)
+        );
         CREATE TABLE IF NOT EXISTS news_raw (
             id TEXT PRIMARY KEY,
             source TEXT NOT NULL,
@@ -59,8 +257,16 @@ def init_db() -> None:
             id TEXT PRIMARY KEY,
             cleaned_text TEXT NOT NULL,
             hash TEXT NOT NULL,
-            tickers_json TEXT NOT NULL
+            tickers_json TEXT NOT NULL,
+            minhash BLOB,
+            canonical_id TEXT
         );
+        CREATE TABLE IF NOT EXISTS news_lsh (
+            band INTEGER NOT NULL,
+            value INTEGER NOT NULL,
+            news_id TEXT NOT NULL,
+            PRIMARY KEY (band, value, news_id)
+        ) WITHOUT ROWID;
         CREATE TABLE IF NOT EXISTS analysis_runs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             news_id TEXT NOT NULL,
@@ -69,37 +275,187 @@ def init_db() -> None:
             llm_output_json TEXT NOT NULL,
             created_at DATETIME NOT NULL
         );
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            news_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            available_at REAL NOT NULL,
+            lease_owner TEXT,
+            last_error TEXT,
+            result_json TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_analysis_jobs_ready
+            ON analysis_jobs (status, available_at);
+        CREATE TABLE IF NOT EXISTS index_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            layer TEXT NOT NULL,
+            source_id TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS index_checkpoints (
+            name TEXT PRIMARY KEY,
+            high_water INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            payload_json TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_llm_cache_created
+            ON llm_cache (created_at);
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            key TEXT PRIMARY KEY,
+            vector BLOB NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tickers (
+            ticker TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            profile_text TEXT,
+            updated_at DATETIME NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS ticker_aliases (
+            alias TEXT PRIMARY KEY,
+            ticker TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
         CREATE UNIQUE INDEX IF NOT EXISTS idx_state_events_guard
             ON state_events (ticker, event_type, source_id);
+        CREATE INDEX IF NOT EXISTS idx_state_events_open
+            ON state_events (ticker, status, event_type);
+        CREATE INDEX IF NOT EXISTS idx_state_events_recent
+            ON state_events (ticker, created_at);
         CREATE UNIQUE INDEX IF NOT EXISTS idx_news_clean_hash
             ON news_clean (hash);
         """
     )
+    # Columns added after the first release; CREATE TABLE IF NOT EXISTS skips old tables.
+    _ensure_column(conn, "news_clean", "minhash", "BLOB")
+    _ensure_column(conn, "news_clean", "canonical_id", "TEXT")
     conn.commit()
-    conn.close()
 
 
-def execute(query: str, params: tuple[Any, ...] = ()) -> None:
-    conn = get_connection()
-    conn.execute(query, params)
-    conn.commit()
-    conn.close()
+def _ensure_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> None:
+    columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def execute(query: str, params: tuple[Any, ...] = ()) -> int | None:
+    with connection() as conn:
+        cur = conn.execute(query, params)
+        if not in_transaction():
+            conn.commit()
+        return cur.lastrowid
+
+
+def executemany(query: str, rows: list[tuple[Any, ...]]) -> None:
+    with connection() as conn:
+        conn.executemany(query, rows)
+        if not in_transaction():
+            conn.commit()
 
 
 def fetch_one(query: str, params: tuple[Any, ...] = ()) -> sqlite3.Row | None:
-    conn = get_connection()
-    cur = conn.execute(query, params)
-    row = cur.fetchone()
-    conn.close()
-    return row
+    with connection() as conn:
+        return conn.execute(query, params).fetchone()
 
 
 def fetch_all(query: str, params: tuple[Any, ...] = ()) -> list[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(query, params)
-    rows = cur.fetchall()
-    conn.close()
-    return list(rows)
+    with connection() as conn:
+        return list(conn.execute(query, params).fetchall())
+
+
+def add_row_listener(listener: RowListener) -> None:
+    if listener not in _ROW_LISTENERS:
+        _ROW_LISTENERS.append(listener)
+
+
+def notify_row(layer: str, source_id: str, row: dict[str, Any] | None) -> None:
+    # row=None signals that (layer, source_id) was deleted. The change log lets
+    # other processes (and a restarted worker) catch up from a checkpoint.
+    seq = execute(
+        "INSERT INTO index_changes (layer, source_id) VALUES (?, ?)",
+        (layer, source_id),
+    )
+    listeners = list(_ROW_LISTENERS)
+
+    def dispatch() -> None:
+        for listener in listeners:
+            listener(layer, source_id, row, seq)
+
+    on_commit(dispatch)
+
+
+def fetch_changes_since(seq: int) -> list[sqlite3.Row]:
+    return fetch_all(
+        """
+        SELECT layer, source_id, MAX(seq) AS seq
+        FROM index_changes
+        WHERE seq > ?
+        GROUP BY layer, source_id
+        ORDER BY seq
+        """,
+        (seq,),
+    )
+
+
+def record_index_checkpoint(name: str, high_water: int) -> int:
+    # Every checkpoint can replay from its high-water mark, so changes at or
+    # below the oldest one are never read again. Returns the pruned-through seq.
+    with transaction():
+        execute(
+            """
+            INSERT INTO index_checkpoints (name, high_water, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                high_water=excluded.high_water,
+                updated_at=excluded.updated_at
+            """,
+            (name, high_water, time.time()),
+        )
+        oldest = int(fetch_one("SELECT MIN(high_water) AS seq FROM index_checkpoints")["seq"])
+        pruned = index_changes_pruned_through()
+        if oldest > pruned:
+            execute("DELETE FROM index_changes WHERE seq <= ?", (oldest,))
+            set_version("index_changes_pruned", oldest)
+            pruned = oldest
+    return pruned
+
+
+def index_changes_pruned_through() -> int:
+    # A reader whose own mark is below this has lost changes and must reload.
+    return get_version("index_changes_pruned")
+
+
+def bump_version(key: str) -> None:
+    execute(
+        """
+        INSERT INTO app_meta (key, value) VALUES (?, 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+        """,
+        (key,),
+    )
+
+
+def set_version(key: str, value: int) -> None:
+    execute(
+        """
+        INSERT INTO app_meta (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """,
+        (key, value),
+    )
+
+
+def get_version(key: str) -> int:
+    row = fetch_one("SELECT value FROM app_meta WHERE key = ?", (key,))
+    return int(row["value"]) if row else 0
 
 
 def upsert_profile(ticker: str, profile_text: str) -> None:
@@ -114,10 +470,12 @@ def upsert_profile(ticker: str, profile_text: str) -> None:
         """,
         (ticker, profile_text, now),
     )
+    notify_row("profile", ticker, {"ticker": ticker, "profile_text": profile_text, "updated_at": now})
 
 
-def store_snapshot(ticker: str, state_json: dict[str, Any]) -> None:
+def store_snapshot(ticker: str, state_json: dict[str, Any]) -> str:
     now = datetime.utcnow().isoformat()
+    serialized = json.dumps(state_json)
     execute(
         """
         INSERT INTO state_snapshot (ticker, state_json, updated_at)
@@ -126,5 +484,7 @@ def store_snapshot(ticker: str, state_json: dict[str, Any]) -> None:
             state_json=excluded.state_json,
             updated_at=excluded.updated_at
         """,
-        (ticker, json.dumps(state_json), now),
+        (ticker, serialized, now),
     )
+    notify_row("state", ticker, {"ticker": ticker, "state_json": serialized, "updated_at": now})
+    return now
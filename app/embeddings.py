@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+import re
+import sqlite3
+import time
+import zlib
+from array import array
+from pathlib import Path
+from typing import Protocol
+
+from app import db
+from app.utils import hash_text
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except Exception:
+    np = None
+    NUMPY_AVAILABLE = False
+
+try:
+    from sentence_transformers import SentenceTransformer
+
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except Exception:
+    SentenceTransformer = None
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingProvider(Protocol):
+    # name identifies the model and its settings; vectors from providers with
+    # different names are never mixed in one cache or index.
+    name: str
+    dim: int
+
+    def embed(self, text: str) -> list[float]:
+        ...
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        ...
+
+
+class HashedNGramEmbedder:
+    # No-model provider: word unigrams, word bigrams and character trigrams are
+    # hashed into `dim` signed buckets with sublinear term frequency, then L2
+    # normalized. No IDF: corpus statistics drift as documents arrive, which
+    # would silently invalidate every cached vector.
+    def __init__(self, dim: int = 256) -> None:
+        self.dim = dim
+        self.name = f"hashed-ngram-v1-{dim}"
+
+    def _features(self, text: str) -> dict[int, float]:
+        words = _WORD_RE.findall(text.lower())
+        grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            grams.extend(padded[idx : idx + 3] for idx in range(len(padded) - 2))
+        counts: dict[str, int] = {}
+        for gram in grams:
+            counts[gram] = counts.get(gram, 0) + 1
+        buckets: dict[int, float] = {}
+        for gram, count in counts.items():
+            hashed = zlib.crc32(gram.encode("utf-8"))
+            bucket = hashed % self.dim
+            sign = 1.0 if hashed & 0x80000000 else -1.0
+            buckets[bucket] = buckets.get(bucket, 0.0) + sign * (1.0 + math.log(count))
+        return buckets
+
+    def embed(self, text: str) -> list[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        features = [self._features(text) for text in texts]
+        if NUMPY_AVAILABLE:
+            matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+            for row, buckets in enumerate(features):
+                if buckets:
+                    matrix[row, list(buckets)] = list(buckets.values())
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            np.divide(matrix, norms, out=matrix, where=norms > 0)
+            return matrix.tolist()
+        vectors = []
+        for buckets in features:
+            vector = [0.0] * self.dim
+            for bucket, value in buckets.items():
+                vector[bucket] = value
+            norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+            vectors.append([value / norm for value in vector])
+        return vectors
+
+
+class SentenceTransformerEmbedder:
+    # Local CPU model loaded from a path (no network); requires the optional
+    # sentence-transformers package.
+    def __init__(self, model_path: str | Path, batch_size: int = 64) -> None:
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            raise RuntimeError("sentence-transformers is not installed")
+        self.model = SentenceTransformer(str(model_path), device="cpu")
+        self.batch_size = batch_size
+        self.dim = int(self.model.get_sentence_embedding_dimension())
+        self.name = f"st:{Path(model_path).name}:{self.dim}"
+
+    def embed(self, text: str) -> list[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        vectors = self.model.encode(
+            texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True
+        )
+        return vectors.astype("float32").tolist()
+
+
+class CachedEmbedder:
+    # Content-addressed vectors in the embedding_cache table: a document that
+    # was embedded once is never embedded again, across restarts and rebuilds.
+    def __init__(self, provider: EmbeddingProvider) -> None:
+        self.provider = provider
+        self.name = provider.name
+        self.dim = provider.dim
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        return hash_text(f"{self.name}|{text}")
+
+    def embed(self, text: str) -> list[float]:
+        return self.embed_many([text])[0]
+
+    def _lookup(self, keys: list[str]) -> dict[str, list[float]]:
+        found: dict[str, list[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), 900):
+            batch = unique[start : start + 900]
+            rows = db.fetch_all(
+                f"SELECT key, vector FROM embedding_cache WHERE key IN ({', '.join('?' for _ in batch)})",
+                tuple(batch),
+            )
+            for row in rows:
+                vector = array("f")
+                vector.frombytes(row["vector"])
+                found[row["key"]] = vector.tolist()
+        return found
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.key(text) for text in texts]
+        try:
+            found = self._lookup(keys)
+        except sqlite3.Error:
+            found = {}
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        self.hits += len(keys) - sum(1 for key in keys if key not in found)
+        self.misses += len(missing)
+        if missing:
+            text_by_key = dict(zip(keys, texts))
+            computed = self.provider.embed_many([text_by_key[key] for key in missing])
+            now = time.time()
+            found.update(zip(missing, computed))
+            try:
+                db.executemany(
+                    "INSERT OR IGNORE INTO embedding_cache (key, vector, created_at) VALUES (?, ?, ?)",
+                    [(key, array("f", vector).tobytes(), now) for key, vector in zip(missing, computed)],
+                )
+            except sqlite3.Error:
+                pass
+        return [found[key] for key in keys]
+
+
+def default_provider() -> EmbeddingProvider:
+    model_path = os.getenv("APP_EMBEDDING_MODEL")
+    if model_path:
+        if SENTENCE_TRANSFORMERS_AVAILABLE:
+            return SentenceTransformerEmbedder(model_path)
+        logger.warning(
+            "APP_EMBEDDING_MODEL=%s is set but sentence-transformers is not installed; "
+            "falling back to hashed n-gram embeddings",
+            model_path,
+        )
+    return HashedNGramEmbedder(int(os.getenv("APP_EMBEDDING_DIM", "256")))
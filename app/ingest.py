@@ -1,48 +1,152 @@
 from __future__ import annotations
 
+import argparse
 import json
-from datetime import datetime
+import os
+import sys
+import time
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Iterable, Iterator, TextIO
 
-from app import db
+from pydantic import ValidationError
+
+from app import db, jobs
 from app.models import IngestResponse, NewsIn
+from app.near_dup import (
+    MAX_BUCKET,
+    NEAR_DUP_THRESHOLD,
+    bands_many,
+    best_match,
+    ensure_layout,
+    load_candidates,
+    minhash_many,
+    pack,
+)
 from app.ticker_linker import extract_tickers
 from app.utils import clean_text, hash_text
 
 
-def ingest_news(item: NewsIn) -> IngestResponse:
-    db.init_db()
-    cleaned_text = clean_text(f"{item.title} {item.content}")
-    content_hash = hash_text(cleaned_text)
-    deduped = False
-
-    existing = db.fetch_one("SELECT id FROM news_clean WHERE hash = ?", (content_hash,))
-    if existing:
-        deduped = True
-    else:
-        db.execute(
-            """
-            INSERT INTO news_raw (id, source, published_at, title, content)
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (
-                item.id,
-                item.source,
-                item.published_at.isoformat(),
-                item.title,
-                item.content,
-            ),
-        )
+ENQUEUE_ANALYSIS = os.getenv("APP_ENQUEUE_ANALYSIS", "").lower() in {"1", "true", "yes"}
+# Keeps IN (...) lists well under SQLite's bound-parameter limit.
+_IN_BATCH = 900
 
-    tickers = extract_tickers([item.title, item.content])
-    if not deduped:
-        db.execute(
-            """
-            INSERT INTO news_clean (id, cleaned_text, hash, tickers_json)
-            VALUES (?, ?, ?, ?)
-            """,
-            (item.id, cleaned_text, content_hash, json.dumps(tickers)),
+
+def _existing(column: str, values: list[str]) -> set[str]:
+    found: set[str] = set()
+    unique = list(dict.fromkeys(values))
+    for start in range(0, len(unique), _IN_BATCH):
+        batch = unique[start : start + _IN_BATCH]
+        placeholders = ", ".join("?" for _ in batch)
+        rows = db.fetch_all(
+            f"SELECT {column} FROM news_clean WHERE {column} IN ({placeholders})",
+            tuple(batch),
         )
-    return IngestResponse(id=item.id, deduped=deduped, tickers=tickers)
+        found.update(row[column] for row in rows)
+    return found
+
+
+def ingest_news(item: NewsIn, enqueue: bool | None = None) -> IngestResponse:
+    return ingest_news_many([item], enqueue)[0]
+
+
+def ingest_news_many(items: Iterable[NewsIn], enqueue: bool | None = None) -> list[IngestResponse]:
+    # enqueue queues analysis jobs for new, non-duplicate items (default: APP_ENQUEUE_ANALYSIS).
+    enqueue = ENQUEUE_ANALYSIS if enqueue is None else enqueue
+    db.ensure_schema()
+    prepared = []
+    for item in items:
+        cleaned_text = clean_text(f"{item.title} {item.content}")
+        tickers = extract_tickers([cleaned_text])
+        prepared.append((item, cleaned_text, hash_text(cleaned_text), tickers))
+
+    signatures = minhash_many([cleaned_text for _, cleaned_text, _, _ in prepared])
+    band_keys = bands_many(signatures)
+    # The duplicate lookups run inside the write transaction: BEGIN IMMEDIATE
+    # holds the writer lock, so a concurrent batch with overlapping items
+    # cannot insert them between our check and our insert.
+    with db.transaction():
+        ensure_layout()
+        seen_hashes = _existing("hash", [content_hash for _, _, content_hash, _ in prepared])
+        seen_ids = _existing("id", [item.id for item, _, _, _ in prepared])
+        # LSH buckets from the database, extended in place with canonical items
+        # accepted earlier in this batch.
+        buckets = load_candidates(band_keys)
+        responses: list[IngestResponse] = []
+        raw_rows = []
+        clean_rows = []
+        lsh_rows = []
+        queued: list[tuple[int, str]] = []
+        for (item, cleaned_text, content_hash, tickers), signature, keys in zip(
+            prepared, signatures, band_keys
+        ):
+            deduped = content_hash in seen_hashes or item.id in seen_ids
+            canonical_id = None
+            if not deduped:
+                seen_hashes.add(content_hash)
+                seen_ids.add(item.id)
+                canonical_id = best_match(signature, buckets, NEAR_DUP_THRESHOLD, keys)
+                if canonical_id is None:
+                    for key in keys:
+                        bucket = buckets.setdefault(key, [])
+                        if len(bucket) < MAX_BUCKET:
+                            bucket.append((signature, item.id))
+                            lsh_rows.append((key[0], key[1], item.id))
+                    if enqueue:
+                        queued.append((len(responses), item.id))
+                raw_rows.append(
+                    (
+                        item.id,
+                        item.source,
+                        item.published_at.isoformat(),
+                        item.title,
+                        item.content,
+                    )
+                )
+                clean_rows.append(
+                    (
+                        item.id,
+                        cleaned_text,
+                        content_hash,
+                        json.dumps(tickers),
+                        pack(signature),
+                        canonical_id,
+                    )
+                )
+            responses.append(
+                IngestResponse(
+                    id=item.id,
+                    deduped=deduped,
+                    tickers=tickers,
+                    near_duplicate_of=canonical_id,
+                )
+            )
+
+        if raw_rows:
+            db.executemany(
+                """
+                INSERT INTO news_raw (id, source, published_at, title, content)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                raw_rows,
+            )
+            db.executemany(
+                """
+                INSERT INTO news_clean (id, cleaned_text, hash, tickers_json, minhash, canonical_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                clean_rows,
+            )
+            # Key order matches the table's primary key, so inserts append to its B-tree.
+            db.executemany(
+                "INSERT INTO news_lsh (band, value, news_id) VALUES (?, ?, ?)",
+                sorted(lsh_rows),
+            )
+            if queued:
+                job_ids = jobs.enqueue([news_id for _, news_id in queued])
+                for (idx, _), job_id in zip(queued, job_ids):
+                    responses[idx].job_id = job_id
+    return responses
 
 
 def load_clean_news(news_id: str) -> dict[str, str] | None:
@@ -54,6 +158,7 @@ def load_clean_news(news_id: str) -> dict[str, str] | None:
         "cleaned_text": row["cleaned_text"],
         "hash": row["hash"],
         "tickers_json": row["tickers_json"],
+        "canonical_id": row["canonical_id"],
     }
 
 
@@ -68,3 +173,103 @@ def load_raw_news(news_id: str) -> dict[str, str] | None:
         "title": row["title"],
         "content": row["content"],
     }
+
+
+@dataclass
+class IngestStats:
+    read: int = 0
+    inserted: int = 0
+    deduped: int = 0
+    invalid: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+def iter_ndjson(
+    stream: TextIO, on_invalid: Callable[[int, str], None] | None = None
+) -> Iterator[NewsIn]:
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield NewsIn.model_validate_json(line)
+        except ValidationError as exc:
+            if on_invalid is not None:
+                on_invalid(line_no, str(exc))
+
+
+def chunked(items: Iterable[NewsIn], size: int) -> Iterator[list[NewsIn]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def ingest_stream(
+    items: Iterable[NewsIn],
+    chunk_size: int = 1000,
+    progress: Callable[[IngestStats], None] | None = None,
+) -> IngestStats:
+    # Only one chunk is materialised at a time, so memory stays flat on large backfills.
+    stats = IngestStats()
+    started = time.perf_counter()
+    for chunk in chunked(items, chunk_size):
+        for response in ingest_news_many(chunk):
+            stats.read += 1
+            if response.deduped:
+                stats.deduped += 1
+            else:
+                stats.inserted += 1
+        stats.elapsed = time.perf_counter() - started
+        if progress is not None:
+            progress(stats)
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def _format_stats(stats: IngestStats) -> str:
+    return (
+        f"read={stats.read} inserted={stats.inserted} deduped={stats.deduped} "
+        f"invalid={stats.invalid} elapsed={stats.elapsed:.1f}s rate={stats.rate:.0f}/s"
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Stream NDJSON news records into the ingest path.")
+    parser.add_argument("--ndjson", required=True, help="path to an NDJSON file, or - for stdin")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--progress-every", type=float, default=5.0, help="seconds between reports")
+    args = parser.parse_args(argv)
+
+    invalid = 0
+    last_report = time.perf_counter()
+
+    def on_invalid(line_no: int, error: str) -> None:
+        nonlocal invalid
+        invalid += 1
+        print(f"line {line_no}: invalid record: {error.splitlines()[0]}", file=sys.stderr)
+
+    def report(stats: IngestStats) -> None:
+        nonlocal last_report
+        stats.invalid = invalid
+        now = time.perf_counter()
+        if now - last_report >= args.progress_every:
+            last_report = now
+            print(_format_stats(stats), file=sys.stderr)
+
+    stream = sys.stdin if args.ndjson == "-" else open(args.ndjson, encoding="utf-8")
+    try:
+        stats = ingest_stream(iter_ndjson(stream, on_invalid), args.chunk_size, report)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    stats.invalid = invalid
+    print(_format_stats(stats), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app import db
+from app.ingest import chunked, ingest_news_many
+from app.models import NewsIn
+from app.near_dup import bands_many, minhash_many
+
+# Bulk ingest target (items/s on a laptop) for POST /ingest_news/batch.
+TARGET_RATE = 10000
+
+_VOCABULARY = [f"term{idx}" for idx in range(20000)]
+_COMPANIES = ["Apple", "Microsoft", "Tesla", "Nvidia", "Amazon"]
+
+
+def synthetic_news(count: int, duplicate_rate: float = 0.1, seed: int = 0) -> list[NewsIn]:
+    # Headline plus a 60-160 word body; duplicate_rate of the items are wire
+    # copies of an earlier story with a byline and timestamp appended.
+    rng = random.Random(seed)
+    items: list[NewsIn] = []
+    for idx in range(count):
+        if items and rng.random() < duplicate_rate:
+            source = rng.choice(items)
+            title = source.title
+            content = f"{source.content} (Reporting by desk {idx}; {idx % 24:02d}:00 GMT)"
+        else:
+            company = rng.choice(_COMPANIES)
+            title = f"{company} {' '.join(rng.choices(_VOCABULARY, k=8))}"
+            words = rng.choices(_VOCABULARY, k=rng.randint(60, 160))
+            content = f"{company} {' '.join(words)}."
+        items.append(
+            NewsIn(id=f"bench-{idx}", source="wire", published_at="2025-01-01T10:00:00Z", title=title, content=content)
+        )
+    return items
+
+
+def bench(count: int, chunk_size: int) -> tuple[float, list[str]]:
+    items = synthetic_news(count)
+    texts = [f"{item.title} {item.content}" for item in items]
+    started = time.perf_counter()
+    bands_many(minhash_many(texts))
+    sketch = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for chunk in chunked(iter(items), chunk_size):
+        ingest_news_many(chunk, enqueue=False)
+    rate = count / (time.perf_counter() - started)
+    verdict = "ok" if rate >= TARGET_RATE else "below target"
+    return rate, [
+        f"n={count} ingest={rate:.0f} items/s target={TARGET_RATE} {verdict}",
+        f"  near-dup sketch {sketch / count * 1e6:.1f} us/item",
+    ]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk ingest throughput against the batch ingest target.")
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--check", action="store_true", help="exit non-zero when below the target rate")
+    args = parser.parse_args(argv)
+
+    # A throwaway database, so the numbers include real inserts but touch no data.
+    db.DB_PATH = Path(tempfile.mkdtemp(prefix="ingest-bench-")) / "bench.db"
+    db.init_db()
+    rate, lines = bench(args.items, args.chunk_size)
+    for line in lines:
+        print(line, file=sys.stderr)
+    return 1 if args.check and rate < TARGET_RATE else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
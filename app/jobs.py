@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from app import db
+from app.llm_analyzer import AsyncLLMClient, default_async_client
+from app.models import AnalysisJob
+
+MAX_ATTEMPTS = int(os.getenv("APP_JOB_MAX_ATTEMPTS", "5"))
+LEASE_SECONDS = float(os.getenv("APP_JOB_LEASE_SECONDS", "300"))
+BACKOFF_SECONDS = float(os.getenv("APP_JOB_BACKOFF_SECONDS", "2"))
+MAX_BACKOFF_SECONDS = float(os.getenv("APP_JOB_MAX_BACKOFF_SECONDS", "300"))
+# Cap on a worker's pause after a database error; pauses double from poll_interval.
+WORKER_MAX_BACKOFF_SECONDS = float(os.getenv("APP_WORKER_MAX_BACKOFF_SECONDS", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ClaimedJob:
+    id: int
+    news_id: str
+    attempts: int
+    owner: str
+
+
+def enqueue(news_ids: list[str]) -> list[int]:
+    now = time.time()
+    job_ids = []
+    with db.transaction():
+        for news_id in news_ids:
+            job_ids.append(
+                db.execute(
+                    """
+                    INSERT INTO analysis_jobs (news_id, status, attempts, available_at, created_at, updated_at)
+                    VALUES (?, 'queued', 0, ?, ?, ?)
+                    """,
+                    (news_id, now, now, now),
+                )
+            )
+    return job_ids
+
+
+def claim(owner: str, limit: int = 1, lease_seconds: float = LEASE_SECONDS) -> list[ClaimedJob]:
+    # A running job's available_at is its lease expiry, so queued jobs that are
+    # due and running jobs whose worker died are picked up by the same predicate.
+    now = time.time()
+    with db.transaction():
+        db.execute(
+            """
+            UPDATE analysis_jobs
+            SET status = 'failed', lease_owner = NULL, last_error = 'lease expired', updated_at = ?
+            WHERE status = 'running' AND available_at <= ? AND attempts >= ?
+            """,
+            (now, now, MAX_ATTEMPTS),
+        )
+        rows = db.fetch_all(
+            """
+            UPDATE analysis_jobs
+            SET status = 'running', lease_owner = ?, attempts = attempts + 1,
+                available_at = ?, updated_at = ?
+            WHERE id IN (
+                SELECT id FROM analysis_jobs
+                WHERE status IN ('queued', 'running') AND available_at <= ?
+                ORDER BY available_at, id
+                LIMIT ?
+            )
+            RETURNING id, news_id, attempts
+            """,
+            (owner, now + lease_seconds, now, now, limit),
+        )
+    return [ClaimedJob(row["id"], row["news_id"], row["attempts"], owner) for row in rows]
+
+
+def complete(job: ClaimedJob, result: dict[str, Any]) -> bool:
+    # Guarded by the lease owner: a worker whose lease expired cannot overwrite
+    # the outcome of the worker that reclaimed the job.
+    now = time.time()
+    with db.transaction():
+        rows = db.fetch_all(
+            """
+            UPDATE analysis_jobs
+            SET status = 'done', lease_owner = NULL, result_json = ?, last_error = NULL, updated_at = ?
+            WHERE id = ? AND lease_owner = ? AND status = 'running'
+            RETURNING id
+            """,
+            (json.dumps(result), now, job.id, job.owner),
+        )
+    return bool(rows)
+
+
+def backoff(attempts: int) -> float:
+    return min(BACKOFF_SECONDS * 2 ** max(attempts - 1, 0), MAX_BACKOFF_SECONDS)
+
+
+def fail(job: ClaimedJob, error: str, retry: bool = True) -> bool:
+    now = time.time()
+    if retry and job.attempts < MAX_ATTEMPTS:
+        status, available_at = "queued", now + backoff(job.attempts)
+    else:
+        status, available_at = "failed", now
+    with db.transaction():
+        rows = db.fetch_all(
+            """
+            UPDATE analysis_jobs
+            SET status = ?, lease_owner = NULL, available_at = ?, last_error = ?, updated_at = ?
+            WHERE id = ? AND lease_owner = ? AND status = 'running'
+            RETURNING id
+            """,
+            (status, available_at, error, now, job.id, job.owner),
+        )
+    return bool(rows)
+
+
+def _timestamp(value: float) -> datetime:
+    return datetime.fromtimestamp(value, tz=timezone.utc)
+
+
+def get_job(job_id: int) -> AnalysisJob | None:
+    row = db.fetch_one("SELECT * FROM analysis_jobs WHERE id = ?", (job_id,))
+    if not row:
+        return None
+    return AnalysisJob(
+        id=row["id"],
+        news_id=row["news_id"],
+        status=row["status"],
+        attempts=row["attempts"],
+        last_error=row["last_error"],
+        result=json.loads(row["result_json"]) if row["result_json"] else None,
+        created_at=_timestamp(row["created_at"]),
+        updated_at=_timestamp(row["updated_at"]),
+    )
+
+
+class AnalysisWorkerPool:
+    # Each worker thread owns an event loop and an LLM client, so pooled HTTP
+    # sessions and per-ticker request batching survive across jobs. Throughput
+    # scales with threads here, or with processes running `python -m app.jobs`.
+    def __init__(
+        self,
+        workers: int = int(os.getenv("APP_ANALYSIS_WORKERS", "2")),
+        client_factory: Callable[[], AsyncLLMClient] = default_async_client,
+        lease_seconds: float = LEASE_SECONDS,
+        poll_interval: float = 0.5,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.client_factory = client_factory
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def run_once(self, loop: asyncio.AbstractEventLoop, client: AsyncLLMClient, owner: str) -> bool:
+        # Imported here because ingest enqueues jobs and the pipeline imports ingest.
+        from app.pipeline import analyze_news_async
+
+        jobs = claim(owner, 1, self.lease_seconds)
+        if not jobs:
+            return False
+        job = jobs[0]
+        try:
+            response = loop.run_until_complete(analyze_news_async(job.news_id, client=client))
+        except Exception as exc:
+            fail(job, f"{type(exc).__name__}: {exc}")
+        else:
+            if response is None:
+                fail(job, "news item not found", retry=False)
+            else:
+                complete(job, response.model_dump(mode="json"))
+        with self._lock:
+            self.processed += 1
+        return True
+
+    def _run(self, owner: str) -> None:
+        loop = asyncio.new_event_loop()
+        client = self.client_factory()
+        backoff = self.poll_interval
+        try:
+            while not self._stop.is_set():
+                try:
+                    ran = self.run_once(loop, client, owner)
+                except sqlite3.Error:
+                    # A locked or briefly unavailable database must not kill the
+                    # worker; a job claimed before the error is re-leased on expiry.
+                    logger.exception("analysis worker %s: database error, retrying in %.1fs", owner, backoff)
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, WORKER_MAX_BACKOFF_SECONDS)
+                    continue
+                backoff = self.poll_interval
+                if not ran:
+                    self._stop.wait(self.poll_interval)
+        finally:
+            close = getattr(client, "aclose", None)
+            if close is not None:
+                loop.run_until_complete(close())
+            loop.close()
+
+    def drain(self) -> int:
+        # Runs queued jobs that are due on the calling thread until none are left.
+        loop = asyncio.new_event_loop()
+        client = self.client_factory()
+        owner = f"drain-{uuid.uuid4().hex[:8]}"
+        count = 0
+        try:
+            while self.run_once(loop, client, owner):
+                count += 1
+        finally:
+            close = getattr(client, "aclose", None)
+            if close is not None:
+                loop.run_until_complete(close())
+            loop.close()
+        return count
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        prefix = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        for idx in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, args=(f"{prefix}-{idx}",), name=f"analysis-worker-{idx}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run analysis workers against the job queue.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("APP_ANALYSIS_WORKERS", "2")))
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    db.init_db()
+    pool = AnalysisWorkerPool(workers=args.workers, poll_interval=args.poll_interval)
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    pool.start()
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
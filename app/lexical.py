@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import heapq
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Hashable
+
+BM25_K1 = float(os.getenv("APP_BM25_K1", "1.2"))
+BM25_B = float(os.getenv("APP_BM25_B", "0.75"))
+# Queries are whole articles; only their rarest terms in the partition are scored.
+MAX_QUERY_TERMS = int(os.getenv("APP_BM25_MAX_QUERY_TERMS", "32"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or "
+    "that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+@dataclass
+class _Partition:
+    postings: dict[str, dict[Hashable, int]] = field(default_factory=dict)
+    lengths: dict[Hashable, int] = field(default_factory=dict)
+    terms: dict[Hashable, tuple[str, ...]] = field(default_factory=dict)
+    total_length: int = 0
+    # Per-document length normalisation, computed against norm_average and
+    # refreshed only when the partition's average length drifts.
+    norms: dict[Hashable, float] = field(default_factory=dict)
+    norm_average: float = 0.0
+
+
+class BM25Index:
+    # Okapi BM25 with one inverted index per ticker: retrieval is always scoped
+    # to a ticker, so document frequencies and average length are per ticker
+    # too, and a query only walks the postings of its own terms.
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B) -> None:
+        self.k1 = k1
+        self.b = b
+        self.partitions: dict[str, _Partition] = {}
+        self._owners: dict[Hashable, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    def upsert(self, key: Hashable, ticker: str, text: str) -> None:
+        self.delete(key)
+        counts = Counter(tokenize(text))
+        partition = self.partitions.setdefault(ticker, _Partition())
+        for term, count in counts.items():
+            partition.postings.setdefault(term, {})[key] = count
+        length = sum(counts.values())
+        partition.lengths[key] = length
+        partition.terms[key] = tuple(counts)
+        partition.total_length += length
+        if not partition.norm_average:
+            partition.norm_average = float(length or 1)
+        partition.norms[key] = self._norm(length, partition.norm_average)
+        self._owners[key] = ticker
+
+    def _norm(self, length: int, average: float) -> float:
+        return self.k1 * (1.0 - self.b + self.b * length / average)
+
+    def _refresh_norms(self, partition: _Partition) -> None:
+        average = partition.total_length / len(partition.lengths) or 1.0
+        if abs(average - partition.norm_average) <= 0.1 * partition.norm_average:
+            return
+        partition.norm_average = average
+        partition.norms = {key: self._norm(length, average) for key, length in partition.lengths.items()}
+
+    def delete(self, key: Hashable) -> bool:
+        ticker = self._owners.pop(key, None)
+        if ticker is None:
+            return False
+        partition = self.partitions[ticker]
+        for term in partition.terms.pop(key):
+            posting = partition.postings[term]
+            del posting[key]
+            if not posting:
+                del partition.postings[term]
+        partition.total_length -= partition.lengths.pop(key)
+        del partition.norms[key]
+        if not partition.lengths:
+            del self.partitions[ticker]
+        return True
+
+    def clear(self) -> None:
+        self.partitions.clear()
+        self._owners.clear()
+
+    def search(self, ticker: str, query: str, top_k: int = 6) -> list[tuple[float, Hashable]]:
+        partition = self.partitions.get(ticker)
+        if partition is None or top_k <= 0:
+            return []
+        self._refresh_norms(partition)
+        count = len(partition.lengths)
+        matched = [
+            (posting, query_count)
+            for term, query_count in Counter(tokenize(query)).items()
+            if (posting := partition.postings.get(term))
+        ]
+        matched.sort(key=lambda item: len(item[0]))
+        norms = partition.norms
+        scores: dict[Hashable, float] = {}
+        for posting, query_count in matched[:MAX_QUERY_TERMS]:
+            weight = query_count * (self.k1 + 1.0) * math.log(
+                1.0 + (count - len(posting) + 0.5) / (len(posting) + 0.5)
+            )
+            for key, tf in posting.items():
+                scores[key] = scores.get(key, 0.0) + weight * tf / (tf + norms[key])
+        ranked = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(score, key) for key, score in ranked]
+
+
+def reciprocal_rank_fusion(
+    rankings: list[tuple[list[Hashable], float]], k: int = 60
+) -> list[tuple[float, Hashable]]:
+    # Each ranking is (keys best-first, weight); a key scores sum(weight / (k + rank)).
+    fused: dict[Hashable, float] = {}
+    for keys, weight in rankings:
+        for rank, key in enumerate(keys, start=1):
+            fused[key] = fused.get(key, 0.0) + weight / (k + rank)
+    return sorted(((score, key) for key, score in fused.items()), key=lambda item: item[0], reverse=True)
@@ -1,12 +1,30 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Protocol
 
 from pydantic import ValidationError
 
+try:
+    import httpx
+
+    HTTPX_AVAILABLE = True
+except Exception:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+from app import db
 from app.models import LLMImpactResult, RAGChunk
+from app.utils import hash_text
+
+PROMPT_VERSION = "v1"
 
 PROMPT_TEMPLATE = """
 You are a market impact analyst. Return STRICT JSON only with the schema below.
@@ -110,14 +128,288 @@ class OpenAIClient(LLMClient):
         raise NotImplementedError("Connect to OpenAI API here; keep optional for MVP.")
 
 
-def analyze_article(
-    ticker: str,
-    article: str,
-    context: list[RAGChunk],
-    client: LLMClient | None = None,
-) -> LLMImpactResult | None:
-    client = client or LLMClient()
-    response = client.analyze(ticker=ticker, article=article, context=context)
+AnalyzeRequest = tuple[str, str, list[RAGChunk]]
+
+
+class AsyncLLMClient(Protocol):
+    async def analyze(self, ticker: str, article: str, context: list[RAGChunk]) -> LLMResponse:
+        ...
+
+    async def analyze_many(self, requests: list[AnalyzeRequest]) -> list[LLMResponse]:
+        ...
+
+
+class SyncLLMClientAdapter:
+    def __init__(self, client: LLMClient | None = None) -> None:
+        self.client = client or LLMClient()
+        self.cache_id = type(self.client).__name__
+
+    async def analyze(self, ticker: str, article: str, context: list[RAGChunk]) -> LLMResponse:
+        return await asyncio.to_thread(self.client.analyze, ticker, article, context)
+
+    async def analyze_many(self, requests: list[AnalyzeRequest]) -> list[LLMResponse]:
+        return list(await asyncio.gather(*(self.analyze(*request) for request in requests)))
+
+
+class HTTPLLMClient:
+    # Talks to a provider endpoint that accepts {"requests": [...]} and answers
+    # {"results": [...]} in the same order. Concurrent analyze() calls that land
+    # within max_wait seconds are coalesced into one batched POST.
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str | None = None,
+        max_batch: int = 16,
+        max_wait: float = 0.01,
+        max_connections: int = 10,
+        timeout: float = 30.0,
+        transport: Any = None,
+    ) -> None:
+        if not HTTPX_AVAILABLE:
+            raise RuntimeError("HTTPLLMClient requires the httpx package")
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.transport = transport
+        self.cache_id = f"http:{base_url}"
+        self.batches_sent = 0
+        self._session: Any = None
+        self._pending: list[tuple[AnalyzeRequest, asyncio.Future[LLMResponse]]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        # The event loop only holds weak references to tasks.
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def _get_session(self) -> Any:
+        if self._session is None:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._session = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                transport=self.transport,
+            )
+        return self._session
+
+    async def analyze(self, ticker: str, article: str, context: list[RAGChunk]) -> LLMResponse:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[LLMResponse] = loop.create_future()
+        self._pending.append(((ticker, article, context), future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.ensure_future(self._send(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, pending: list[tuple[AnalyzeRequest, asyncio.Future[LLMResponse]]]) -> None:
+        # Every coalesced caller is waiting on its future, so no failure here
+        # may leave one unresolved.
+        try:
+            responses = await self.analyze_many([request for request, _ in pending])
+        except Exception as exc:
+            responses = [LLMResponse(raw_json=None, error=str(exc)) for _ in pending]
+        except BaseException as exc:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(exc)
+            raise
+        for (_, future), response in zip(pending, responses):
+            if not future.done():
+                future.set_result(response)
+
+    async def analyze_many(self, requests: list[AnalyzeRequest]) -> list[LLMResponse]:
+        responses: list[LLMResponse] = []
+        for start in range(0, len(requests), self.max_batch):
+            responses.extend(await self._post(requests[start : start + self.max_batch]))
+        return responses
+
+    async def _post(self, requests: list[AnalyzeRequest]) -> list[LLMResponse]:
+        payload = {
+            "prompt_version": PROMPT_VERSION,
+            "requests": [
+                {
+                    "ticker": ticker,
+                    "article": article,
+                    "context": [chunk.model_dump(mode="json") for chunk in context],
+                }
+                for ticker, article, context in requests
+            ],
+        }
+        self.batches_sent += 1
+        try:
+            resp = await self._get_session().post("/analyze_batch", json=payload)
+            resp.raise_for_status()
+            results = resp.json()["results"]
+            if len(results) != len(requests):
+                return [LLMResponse(raw_json=None, error="batch_size_mismatch") for _ in requests]
+            return [
+                LLMResponse(raw_json=item.get("output"), error=item.get("error"))
+                for item in results
+            ]
+        except Exception as exc:
+            return [LLMResponse(raw_json=None, error=str(exc)) for _ in requests]
+
+    async def aclose(self) -> None:
+        if self._session is not None:
+            await self._session.aclose()
+            self._session = None
+
+
+def stub_transport(client: LLMClient | None = None) -> Any:
+    # Offline stand-in for the provider's batch endpoint, answered by the
+    # deterministic stub client.
+    stub = client or LLMClient()
+
+    def handle(request: Any) -> Any:
+        body = json.loads(request.content)
+        results = []
+        for item in body["requests"]:
+            context = [RAGChunk.model_validate(chunk) for chunk in item["context"]]
+            response = stub.analyze(item["ticker"], item["article"], context)
+            results.append({"output": response.raw_json, "error": response.error})
+        return httpx.Response(200, json={"results": results})
+
+    return httpx.MockTransport(handle)
+
+
+def default_async_client() -> AsyncLLMClient:
+    base_url = os.getenv("APP_LLM_URL")
+    if base_url:
+        return HTTPLLMClient(
+            base_url,
+            api_key=os.getenv("APP_LLM_API_KEY"),
+            max_batch=int(os.getenv("APP_LLM_MAX_BATCH", "16")),
+        )
+    return SyncLLMClientAdapter()
+
+
+class AnalysisCache:
+    # Two tiers: an in-process LRU in front of the llm_cache table. Keys are
+    # content-addressed, so re-sent or re-ingested articles skip the model call.
+    def __init__(
+        self,
+        max_entries: int = int(os.getenv("APP_LLM_CACHE_SIZE", "2048")),
+        ttl_seconds: float = float(os.getenv("APP_LLM_CACHE_TTL", str(7 * 24 * 3600))),
+        max_rows: int = int(os.getenv("APP_LLM_CACHE_MAX_ROWS", "100000")),
+        evict_every: int = 256,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self.db_hits = 0
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._puts = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(content_hash: str, ticker: str, context: list[RAGChunk], client_id: str = "") -> str:
+        fingerprint = hash_text(
+            json.dumps([[chunk.layer, chunk.source_id, chunk.snippet] for chunk in context])
+        )
+        return hash_text(f"{content_hash}|{ticker}|{PROMPT_VERSION}|{client_id}|{fingerprint}")
+
+    def _fresh(self, created_at: float) -> bool:
+        return time.time() - created_at <= self.ttl_seconds
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry[0]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+        try:
+            row = db.fetch_one(
+                "SELECT payload_json, created_at FROM llm_cache WHERE key = ?", (key,)
+            )
+        except sqlite3.Error:
+            row = None
+        with self._lock:
+            if row is None or not self._fresh(row["created_at"]):
+                self.misses += 1
+                return None
+            payload = json.loads(row["payload_json"])
+            self._remember(key, row["created_at"], payload)
+            self.hits += 1
+            self.db_hits += 1
+            return payload
+
+    def _remember(self, key: str, created_at: float, payload: dict[str, Any]) -> None:
+        self._entries[key] = (created_at, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, key: str, payload: dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, payload)
+            self._puts += 1
+            evict = self._puts % self.evict_every == 0
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, payload_json, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(payload), now),
+            )
+            if evict:
+                self.evict()
+        except sqlite3.Error:
+            pass
+
+    def evict(self) -> None:
+        db.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        db.execute(
+            """
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_rows,),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "db_hits": self.db_hits,
+            "memory_entries": len(self._entries),
+        }
+
+
+ANALYSIS_CACHE = AnalysisCache()
+
+
+def _cache_key(ticker: str, article: str, context: list[RAGChunk], client: Any) -> str:
+    # article is the cleaned text, so its hash equals news_clean.hash.
+    client_id = getattr(client, "cache_id", None) or type(client).__name__
+    return AnalysisCache.key(hash_text(article), ticker, context, client_id)
+
+
+def _validate(response: LLMResponse) -> LLMImpactResult | None:
     if response.error:
         return None
     if response.raw_json is None:
@@ -126,3 +418,39 @@ def analyze_article(
         return LLMImpactResult.model_validate(response.raw_json)
     except ValidationError:
         return None
+
+
+def analyze_article(
+    ticker: str,
+    article: str,
+    context: list[RAGChunk],
+    client: LLMClient | None = None,
+    cache: AnalysisCache | None = ANALYSIS_CACHE,
+) -> LLMImpactResult | None:
+    client = client or LLMClient()
+    key = _cache_key(ticker, article, context, client) if cache is not None else ""
+    if cache is not None and (cached := cache.get(key)) is not None:
+        return LLMImpactResult.model_validate(cached)
+    response = client.analyze(ticker=ticker, article=article, context=context)
+    result = _validate(response)
+    if cache is not None and result is not None:
+        cache.put(key, result.model_dump(mode="json"))
+    return result
+
+
+async def analyze_article_async(
+    ticker: str,
+    article: str,
+    context: list[RAGChunk],
+    client: AsyncLLMClient | None = None,
+    cache: AnalysisCache | None = ANALYSIS_CACHE,
+) -> LLMImpactResult | None:
+    client = client or SyncLLMClientAdapter()
+    key = _cache_key(ticker, article, context, client) if cache is not None else ""
+    if cache is not None and (cached := await asyncio.to_thread(cache.get, key)) is not None:
+        return LLMImpactResult.model_validate(cached)
+    response = await client.analyze(ticker=ticker, article=article, context=context)
+    result = _validate(response)
+    if cache is not None and result is not None:
+        await asyncio.to_thread(cache.put, key, result.model_dump(mode="json"))
+    return result
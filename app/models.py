@@ -26,6 +26,7 @@ class RAGChunk(BaseModel):
     source_id: str
     snippet: str
     timestamp: datetime | None = None
+    chunk_id: str | None = None
 
 
 class Citation(BaseModel):
@@ -67,6 +68,18 @@ class AnalyzeResult(BaseModel):
 class AnalyzeResponse(BaseModel):
     news_id: str
     results: list[AnalyzeResult]
+    duplicate_of: str | None = None
+
+
+class AnalysisJob(BaseModel):
+    id: int
+    news_id: str
+    status: Literal["queued", "running", "done", "failed"]
+    attempts: int
+    last_error: str | None = None
+    result: AnalyzeResponse | None = None
+    created_at: datetime
+    updated_at: datetime
 
 
 class StateEvent(BaseModel):
@@ -95,3 +108,5 @@ class IngestResponse(BaseModel):
     id: str
     deduped: bool
     tickers: list[str]
+    near_duplicate_of: str | None = None
+    job_id: int | None = None
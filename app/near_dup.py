@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import operator
+import os
+import struct
+import zlib
+from itertools import chain
+from pathlib import Path
+
+from app import db
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except Exception:
+    np = None
+    NUMPY_AVAILABLE = False
+
+NUM_PERM = 64
+LSH_BANDS = 10
+BAND_ROWS = 6
+# Bumped whenever signatures or band keys change; stored ones are then rebuilt.
+LAYOUT_VERSION = 2
+# Estimated Jaccard similarity of word 1/2-gram sets above which an item is a near-dupe.
+NEAR_DUP_THRESHOLD = float(os.getenv("APP_NEAR_DUP_THRESHOLD", "0.8"))
+# Buckets this full are boilerplate shared by many unrelated items; new members
+# are not indexed so lookups stay bounded.
+MAX_BUCKET = int(os.getenv("APP_NEAR_DUP_MAX_BUCKET", "32"))
+MIN_COLLISIONS = 1
+
+# One-permutation MinHash: each feature is hashed once with a 64-bit mixer; the
+# top 6 bits pick one of NUM_PERM bins and the low 24 bits are the value kept
+# if it is the bin's minimum. Empty bins borrow the next non-empty bin to the
+# right (circularly), offset by the distance, so short texts stay comparable.
+_MASK64 = (1 << 64) - 1
+_EMPTY = (1 << 32) - 1
+_VALUE_BITS = 24
+_VALUE_MASK = (1 << _VALUE_BITS) - 1
+_BIN_SHIFT = 58
+_MIX_A = 0x9E3779B97F4A7C15
+_MIX_B = 0xBF58476D1CE4E5B9
+_BAND_PRIME = 0x100000001B3
+_BAND_MIX = 0x94D049BB133111EB
+_BIGRAM_MIX = 0x9E3779B1
+_BIGRAM_FLAG = 1 << 32
+# Bytes outside [a-z0-9] separate tokens; UTF-8 sequences are all >= 0x80.
+_TOKEN_BYTES = bytes(c if 48 <= c <= 57 or 97 <= c <= 122 else 32 for c in range(256))
+_PACK = struct.Struct(f"<{NUM_PERM}I")
+
+Signature = tuple[int, ...]
+
+
+def _tokens(text: str) -> list[bytes]:
+    return text.encode("utf-8").lower().translate(_TOKEN_BYTES).split()
+
+
+def _mix(value: int) -> int:
+    value = (value * _MIX_A) & _MASK64
+    value ^= value >> 29
+    value = (value * _MIX_B) & _MASK64
+    return value ^ (value >> 32)
+
+
+def _features(hashed: list[int]) -> set[int]:
+    bigrams = (((a * _BIGRAM_MIX) ^ b) & _EMPTY | _BIGRAM_FLAG for a, b in zip(hashed, hashed[1:]))
+    return set(hashed).union(bigrams)
+
+
+def _densify(minima: list[int | None]) -> Signature:
+    filled = [idx for idx, value in enumerate(minima) if value is not None]
+    if not filled:
+        return (_EMPTY,) * NUM_PERM
+    signature = []
+    for idx in range(NUM_PERM):
+        distance = 0
+        while minima[(idx + distance) % NUM_PERM] is None:
+            distance += 1
+        signature.append(minima[(idx + distance) % NUM_PERM] + (distance << _VALUE_BITS))
+    return tuple(signature)
+
+
+def minhash(text: str) -> Signature:
+    return minhash_many([text])[0]
+
+
+def minhash_many(texts: list[str]) -> list[Signature]:
+    # Features are word unigrams plus bigrams mixed from adjacent token hashes.
+    per_text = [_tokens(text) for text in texts]
+    memo = {token: zlib.crc32(token) for token in set(chain.from_iterable(per_text))}
+    if not NUMPY_AVAILABLE:
+        signatures = []
+        for tokens in per_text:
+            minima: list[int | None] = [None] * NUM_PERM
+            for feature in _features(list(map(memo.__getitem__, tokens))):
+                mixed = _mix(feature)
+                slot = mixed >> _BIN_SHIFT
+                value = mixed & _VALUE_MASK
+                if minima[slot] is None or value < minima[slot]:
+                    minima[slot] = value
+            signatures.append(_densify(minima))
+        return signatures
+    return _minhash_numpy(per_text, memo)
+
+
+def _minhash_numpy(per_text: list[list[bytes]], memo: dict[bytes, int]) -> list[Signature]:
+    # The whole batch is one flat feature array tagged with its text's row;
+    # uint64 arithmetic wraps, which is exactly the mod 2**64 the mixer needs.
+    # Repeated features do not change a minimum, so nothing is deduplicated.
+    lengths = np.fromiter(map(len, per_text), dtype=np.int64, count=len(per_text))
+    unigrams = np.fromiter(
+        map(memo.__getitem__, chain.from_iterable(per_text)), dtype=np.uint64, count=int(lengths.sum())
+    )
+    rows = np.repeat(np.arange(len(per_text)), lengths)
+    adjacent = rows[1:] == rows[:-1]
+    bigrams = (unigrams[:-1] * np.uint64(_BIGRAM_MIX) ^ unigrams[1:]) & np.uint64(_EMPTY)
+    features = np.concatenate((unigrams, bigrams[adjacent] | np.uint64(_BIGRAM_FLAG)))
+    feature_rows = np.concatenate((rows, rows[:-1][adjacent]))
+
+    mixed = features * np.uint64(_MIX_A)
+    mixed ^= mixed >> np.uint64(29)
+    mixed *= np.uint64(_MIX_B)
+    mixed ^= mixed >> np.uint64(32)
+    minima = np.full((len(per_text), NUM_PERM), _VALUE_MASK + 1, dtype=np.uint64)
+    np.minimum.at(
+        minima, (feature_rows, (mixed >> np.uint64(_BIN_SHIFT)).astype(np.int64)), mixed & np.uint64(_VALUE_MASK)
+    )
+
+    # For each bin, the nearest filled bin at or after it, over two laps.
+    filled = minima <= _VALUE_MASK
+    slots = np.arange(2 * NUM_PERM)
+    nearest = np.where(np.concatenate((filled, filled), axis=1), slots, 4 * NUM_PERM)
+    nearest = np.minimum.accumulate(nearest[:, ::-1], axis=1)[:, ::-1][:, :NUM_PERM]
+    distance = (nearest - slots[:NUM_PERM]).astype(np.uint64)
+    signatures = np.take_along_axis(minima, nearest % NUM_PERM, axis=1) + (distance << np.uint64(_VALUE_BITS))
+    signatures[~filled.any(axis=1)] = _EMPTY
+    return [tuple(row) for row in signatures.tolist()]
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    return sum(map(operator.eq, a, b)) / NUM_PERM
+
+
+def pack(signature: Signature) -> bytes:
+    return _PACK.pack(*signature)
+
+
+def unpack(blob: bytes) -> Signature:
+    return _PACK.unpack(blob)
+
+
+def bands(signature: Signature) -> list[tuple[int, int]]:
+    return bands_many([signature])[0]
+
+
+def bands_many(signatures: list[Signature]) -> list[list[tuple[int, int]]]:
+    # 63-bit bucket key per band, folded from the band's rows and finalised with
+    # a mixer; bucket members are verified against the full signature, so rare
+    # collisions are harmless. Rows past LSH_BANDS * BAND_ROWS are unbanded.
+    if not signatures:
+        return []
+    if not NUMPY_AVAILABLE:
+        keys = []
+        for signature in signatures:
+            row_keys = []
+            for band in range(LSH_BANDS):
+                folded = 0
+                for value in signature[band * BAND_ROWS : (band + 1) * BAND_ROWS]:
+                    folded = (folded * _BAND_PRIME + value) & _MASK64
+                folded ^= folded >> 31
+                folded = (folded * _BAND_MIX) & _MASK64
+                folded ^= folded >> 29
+                row_keys.append((band, folded >> 1))
+            keys.append(row_keys)
+        return keys
+    matrix = np.asarray(signatures, dtype=np.uint64)[:, : LSH_BANDS * BAND_ROWS]
+    matrix = matrix.reshape(len(signatures), LSH_BANDS, BAND_ROWS)
+    folded = np.zeros((len(signatures), LSH_BANDS), dtype=np.uint64)
+    for row in range(BAND_ROWS):
+        folded *= np.uint64(_BAND_PRIME)
+        folded += matrix[:, :, row]
+    folded ^= folded >> np.uint64(31)
+    folded *= np.uint64(_BAND_MIX)
+    folded ^= folded >> np.uint64(29)
+    folded >>= np.uint64(1)
+    return [list(enumerate(row)) for row in folded.tolist()]
+
+
+def best_match(
+    signature: Signature,
+    candidates: dict[tuple[int, int], list[tuple[Signature, str]]],
+    threshold: float,
+    keys: list[tuple[int, int]] | None = None,
+) -> str | None:
+    # An item at the threshold shares a given band with probability 0.8**6, so it
+    # collides in at least one of the 10 bands ~95% of the time (~99% at 0.85);
+    # a single collision is enough to compare the full signatures.
+    collisions: dict[str, int] = {}
+    stored: dict[str, Signature] = {}
+    for key in keys if keys is not None else bands(signature):
+        for candidate, news_id in candidates.get(key, []):
+            collisions[news_id] = collisions.get(news_id, 0) + 1
+            stored[news_id] = candidate
+    best: tuple[float, str] | None = None
+    for news_id, count in collisions.items():
+        if count < MIN_COLLISIONS:
+            continue
+        score = similarity(signature, stored[news_id])
+        if score >= threshold and (best is None or score > best[0]):
+            best = (score, news_id)
+    return best[1] if best else None
+
+
+def load_candidates(
+    band_keys: list[list[tuple[int, int]]],
+) -> dict[tuple[int, int], list[tuple[Signature, str]]]:
+    wanted: dict[int, set[int]] = {}
+    for keys in band_keys:
+        for band, value in keys:
+            wanted.setdefault(band, set()).add(value)
+
+    candidates: dict[tuple[int, int], list[tuple[Signature, str]]] = {}
+    for band, values in wanted.items():
+        ordered = sorted(values)
+        for start in range(0, len(ordered), 900):
+            batch = ordered[start : start + 900]
+            rows = db.fetch_all(
+                f"""
+                SELECT l.value, l.news_id, c.minhash
+                FROM news_lsh l JOIN news_clean c ON c.id = l.news_id
+                WHERE l.band = ? AND l.value IN ({", ".join("?" for _ in batch)})
+                """,
+                (band, *batch),
+            )
+            for row in rows:
+                candidates.setdefault((band, row["value"]), []).append(
+                    (unpack(row["minhash"]), row["news_id"])
+                )
+    return candidates
+
+
+# Database whose near-dup layout is known to be current.
+_LAYOUT_PATH: Path | None = None
+_REBUILD_BATCH = 5000
+
+
+def ensure_layout() -> None:
+    # Signatures and bucket keys written under an older LAYOUT_VERSION are not
+    # comparable with new ones; rebuild them from the stored cleaned text, once
+    # per database, inside the caller's write transaction.
+    path = db.DB_PATH
+    if _LAYOUT_PATH == path:
+        return
+    if db.get_version("near_dup_layout") != LAYOUT_VERSION:
+        _rebuild_layout()
+        db.set_version("near_dup_layout", LAYOUT_VERSION)
+    db.on_commit(lambda: _mark_layout(path))
+
+
+def _mark_layout(path: Path) -> None:
+    global _LAYOUT_PATH
+
+    _LAYOUT_PATH = path
+
+
+def _rebuild_layout() -> None:
+    db.execute("DELETE FROM news_lsh")
+    sizes: dict[tuple[int, int], int] = {}
+    rows = db.fetch_all("SELECT id, cleaned_text, canonical_id FROM news_clean ORDER BY rowid")
+    for start in range(0, len(rows), _REBUILD_BATCH):
+        batch = rows[start : start + _REBUILD_BATCH]
+        signatures = minhash_many([row["cleaned_text"] for row in batch])
+        lsh_rows = []
+        for row, keys in zip(batch, bands_many(signatures)):
+            if row["canonical_id"] is not None:
+                continue
+            for key in keys:
+                if sizes.get(key, 0) < MAX_BUCKET:
+                    sizes[key] = sizes.get(key, 0) + 1
+                    lsh_rows.append((key[0], key[1], row["id"]))
+        db.executemany(
+            "UPDATE news_clean SET minhash = ? WHERE id = ?",
+            [(pack(signature), row["id"]) for row, signature in zip(batch, signatures)],
+        )
+        db.executemany("INSERT INTO news_lsh (band, value, news_id) VALUES (?, ?, ?)", sorted(lsh_rows))
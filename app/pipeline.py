@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any
+
+from app import db
+from app.ingest import load_clean_news, load_raw_news
+from app.llm_analyzer import AsyncLLMClient, LLMClient, analyze_article, analyze_article_async
+from app.models import AnalyzeResponse, LLMImpactResult, RAGChunk
+from app.rag import retrieve_context
+from app.state_manager import DISPATCHER, STATE_LANES, apply_event_update
+
+ANALYZE_CONCURRENCY = int(os.getenv("APP_ANALYZE_CONCURRENCY", "4"))
+
+
+def _query(raw: dict[str, str], ticker: str) -> str:
+    return f"{raw['title']} {raw['content']} {ticker}"
+
+
+def _load(news_id: str) -> tuple[dict[str, str] | None, dict[str, str] | None]:
+    return load_clean_news(news_id), load_raw_news(news_id)
+
+
+def _analyze_ticker(
+    ticker: str,
+    raw: dict[str, str],
+    cleaned: dict[str, str],
+    client: LLMClient | None,
+) -> tuple[list[RAGChunk], LLMImpactResult | None]:
+    chunks = retrieve_context(ticker=ticker, query=_query(raw, ticker), top_k=6, as_of=raw["published_at"])
+    analysis = analyze_article(
+        ticker=ticker, article=cleaned["cleaned_text"], context=chunks, client=client
+    )
+    return chunks, analysis
+
+
+def _record_run(row: tuple[str, str, str, str, str]) -> None:
+    db.execute(
+        """
+        INSERT INTO analysis_runs (news_id, tickers_json, retrieved_chunks_json, llm_output_json, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        row,
+    )
+
+
+def persist_analysis(
+    news_id: str,
+    published_at: str,
+    tickers: list[str],
+    outcomes: list[tuple[list[RAGChunk], LLMImpactResult | None]],
+) -> AnalyzeResponse:
+    results = []
+    retrieved_payload: dict[str, Any] = {}
+    llm_payload: dict[str, Any] = {}
+    for ticker, (chunks, analysis) in zip(tickers, outcomes):
+        retrieved_payload[ticker] = [chunk.model_dump(mode="json") for chunk in chunks]
+        if analysis is None:
+            llm_payload[ticker] = {"error": "invalid_json"}
+            results.append({"ticker": ticker, "analysis": None, "retrieved_chunks": chunks, "error": "invalid_json"})
+            continue
+        llm_payload[ticker] = analysis.model_dump(mode="json")
+        results.append({"ticker": ticker, "analysis": analysis, "retrieved_chunks": chunks, "error": None})
+
+    updates = [
+        (result["ticker"], news_id, published_at, result["analysis"])
+        for result in results
+        if result["analysis"] is not None
+    ]
+    run_row = (
+        news_id,
+        json.dumps(tickers),
+        json.dumps(retrieved_payload),
+        json.dumps(llm_payload),
+        datetime.utcnow().isoformat(),
+    )
+    if STATE_LANES > 0 and not db.in_transaction() and updates:
+        # The article's updates go through their tickers' lanes as one unit, so
+        # they stay ordered with other updates for those tickers and share a
+        # commit with the audit row; a single-lane unit also batches with other
+        # articles queued on its lane.
+        DISPATCHER.submit_unit(updates, lambda: _record_run(run_row)).result()
+    else:
+        # State writes and the audit row commit together (joining the caller's
+        # unit of work if there is one), in ticker order on this thread.
+        with db.transaction():
+            for update in updates:
+                apply_event_update(*update)
+            _record_run(run_row)
+    return AnalyzeResponse(news_id=news_id, results=results)
+
+
+def analyze_news(
+    news_id: str,
+    client: LLMClient | None = None,
+    concurrency: int | None = None,
+) -> AnalyzeResponse | None:
+    cleaned, raw = _load(news_id)
+    if not cleaned or not raw:
+        return None
+    if cleaned["canonical_id"]:
+        return AnalyzeResponse(news_id=news_id, results=[], duplicate_of=cleaned["canonical_id"])
+
+    tickers = json.loads(cleaned["tickers_json"])
+    limit = min(concurrency or ANALYZE_CONCURRENCY, len(tickers))
+    if limit <= 1:
+        outcomes = [_analyze_ticker(ticker, raw, cleaned, client) for ticker in tickers]
+    else:
+        # Retrieval and the LLM round-trip fan out across tickers; results keep ticker order.
+        with ThreadPoolExecutor(max_workers=limit, thread_name_prefix="analyze") as pool:
+            outcomes = list(
+                pool.map(lambda ticker: _analyze_ticker(ticker, raw, cleaned, client), tickers)
+            )
+    return persist_analysis(news_id, raw["published_at"], tickers, outcomes)
+
+
+async def analyze_news_async(
+    news_id: str,
+    client: AsyncLLMClient | None = None,
+    concurrency: int | None = None,
+) -> AnalyzeResponse | None:
+    cleaned, raw = await asyncio.to_thread(_load, news_id)
+    if not cleaned or not raw:
+        return None
+    if cleaned["canonical_id"]:
+        return AnalyzeResponse(news_id=news_id, results=[], duplicate_of=cleaned["canonical_id"])
+
+    tickers = json.loads(cleaned["tickers_json"])
+    semaphore = asyncio.Semaphore(max(1, concurrency or ANALYZE_CONCURRENCY))
+
+    async def run(ticker: str) -> tuple[list[RAGChunk], LLMImpactResult | None]:
+        async with semaphore:
+            chunks = await asyncio.to_thread(
+                retrieve_context, ticker, _query(raw, ticker), 6, raw["published_at"]
+            )
+            analysis = await analyze_article_async(
+                ticker=ticker, article=cleaned["cleaned_text"], context=chunks, client=client
+            )
+            return chunks, analysis
+
+    # Concurrent analyze() calls let a batching client coalesce them into one request.
+    outcomes = list(await asyncio.gather(*(run(ticker) for ticker in tickers)))
+    return await asyncio.to_thread(
+        persist_analysis, news_id, raw["published_at"], tickers, outcomes
+    )
@@ -1,157 +1,398 @@
 from __future__ import annotations
 
 import json
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Any
-
 import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
 
 from app import db
+from app.chunking import best_window, chunk_document
+from app.embeddings import CachedEmbedder, EmbeddingProvider, default_provider
+from app.lexical import BM25Index, reciprocal_rank_fusion
 from app.models import RAGChunk
+from app.ticker_linker import load_universe_csv
 from app.utils import clean_text
-
-try:
-    import faiss  # type: ignore
-
-    FAISS_AVAILABLE = True
-except Exception:
-    faiss = None
-    FAISS_AVAILABLE = False
-
-
-@dataclass
-class VectorRecord:
-    vector: list[float]
-    metadata: dict[str, Any]
-
-
-class EmbeddingProvider:
-    def __init__(self, dim: int = 16) -> None:
-        self.dim = dim
-
-    def embed(self, text: str) -> list[float]:
-        cleaned = clean_text(text)
-        total = sum(ord(ch) for ch in cleaned)
-        return [((total + i * 31) % 97) / 97.0 for i in range(self.dim)]
-
-
-class VectorStore:
-    def __init__(self, dim: int = 16) -> None:
-        self.dim = dim
-        self.records: list[VectorRecord] = []
-
-    def add(self, vector: list[float], metadata: dict[str, Any]) -> None:
-        self.records.append(VectorRecord(vector=vector, metadata=metadata))
-
-    def search(self, vector: list[float], top_k: int = 6) -> list[VectorRecord]:
-        scored = []
-        for record in self.records:
-            score = cosine_similarity(vector, record.vector)
-            scored.append((score, record))
-        scored.sort(key=lambda item: item[0], reverse=True)
-        return [record for _, record in scored[:top_k]]
-
-
-class FaissVectorStore(VectorStore):
-    def __init__(self, dim: int = 16) -> None:
-        super().__init__(dim=dim)
-        self.index = faiss.IndexFlatIP(dim)
-
-    def add(self, vector: list[float], metadata: dict[str, Any]) -> None:
-        import numpy as np
-
-        self.records.append(VectorRecord(vector=vector, metadata=metadata))
-        self.index.add(np.array([vector], dtype="float32"))
-
-    def search(self, vector: list[float], top_k: int = 6) -> list[VectorRecord]:
-        import numpy as np
-
-        if not self.records:
-            return []
-        distances, indices = self.index.search(np.array([vector], dtype="float32"), top_k)
-        results = []
-        for idx in indices[0]:
-            if idx == -1:
-                continue
-            results.append(self.records[idx])
-        return results
+from app.vector_store import (
+    NUMPY_AVAILABLE,
+    PartitionedVectorStore,
+    RecordKey,
+    VectorRecord,
+    default_store_factory,
+    load_partitioned,
+    np,
+    record_key,
+    save_partitioned,
+)
+
+
+# Queries go straight to the provider; documents go through the cache, which is
+# what makes rebuilds and re-indexing after a restart cheap.
+PROVIDER: EmbeddingProvider = default_provider()
+EMBEDDER = CachedEmbedder(PROVIDER)
+STORE = PartitionedVectorStore(dim=EMBEDDER.dim, factory=default_store_factory())
+# Same chunks as STORE, kept in step with it; rebuilt from STORE on warm start.
+LEXICAL = BM25Index()
+# (layer, source_id) -> keys of the chunks currently indexed for that document.
+_DOC_CHUNKS: dict[RecordKey, set[RecordKey]] = {}
+_STORE_LOCK = threading.RLock()
+# DB path the in-memory index currently mirrors; None until the first full load.
+_LOADED_DB_PATH: Path | None = None
+# index_changes.seq up to which the index is known to be current.
+_HIGH_WATER = 0
+# (layer, source_id) -> newest change seq above the high-water mark applied by
+# this process's listener. Commits dispatch in any order, so an older change
+# arriving after a newer one for the same document is dropped.
+_APPLIED_SEQS: dict[RecordKey, int] = {}
+_CHANGES_SINCE_CHECKPOINT = 0
+CHECKPOINT_EVERY = int(os.getenv("APP_INDEX_CHECKPOINT_EVERY", "500"))
+EMBED_BATCH = int(os.getenv("APP_EMBED_BATCH", "256"))
+# Weight of the BM25 ranking in reciprocal rank fusion; 0 is vector-only retrieval.
+LEXICAL_WEIGHT = float(os.getenv("APP_LEXICAL_WEIGHT", "1.0"))
+RRF_K = int(os.getenv("APP_RRF_K", "60"))
+# Rerank: the index is asked for RERANK_OVERSAMPLE x top_k candidates, which are
+# rescored as relevance plus weighted recency, open-status and severity priors.
+RERANK_OVERSAMPLE = int(os.getenv("APP_RERANK_OVERSAMPLE", "4"))
+RECENCY_HALF_LIFE_DAYS = float(os.getenv("APP_RECENCY_HALF_LIFE_DAYS", "30"))
+RECENCY_WEIGHT = float(os.getenv("APP_RECENCY_WEIGHT", "0.3"))
+STATUS_WEIGHT = float(os.getenv("APP_STATUS_WEIGHT", "0.2"))
+SEVERITY_WEIGHT = float(os.getenv("APP_SEVERITY_WEIGHT", "0.2"))
+# Prior for chunks without a time, status or severity (profiles, catalysts).
+NEUTRAL_PRIOR = 0.5
+_SEVERITY_LEVELS = {"low": 1 / 3, "med": 2 / 3, "high": 1.0}
+NAN = float("nan")
+SEED_TICKERS_CSV = Path(
+    os.getenv("APP_TICKERS_CSV", Path(__file__).resolve().parent.parent / "data" / "tickers.csv")
+)
+
+_LAYER_PRIORITY = {"event": 0, "state": 1, "profile": 2}
+_LAYER_QUERIES = {
+    "profile": "SELECT * FROM profile WHERE ticker IN ({})",
+    "event": "SELECT * FROM state_events WHERE id IN ({})",
+    "state": "SELECT * FROM state_snapshot WHERE ticker IN ({})",
+}
+
+
+def index_dir() -> Path:
+    configured = os.getenv("APP_INDEX_DIR")
+    return Path(configured) if configured else db.DB_PATH.with_suffix(".index")
+
+
+def _document(layer: str, row: dict[str, Any]) -> tuple[str, dict[str, Any]]:
+    attributes: dict[str, Any] = {}
+    if layer == "profile":
+        text = row["profile_text"]
+        source_id = row["ticker"]
+        timestamp = row["updated_at"]
+    elif layer == "event":
+        text = f"{row['summary']} {row['evidence']}"
+        source_id = str(row["id"])
+        timestamp = row["created_at"]
+        attributes = {
+            "status": row["status"],
+            "severity": row["severity"],
+            "impact_score": row["impact_score"],
+            "effective_at": row["start_ts"],
+        }
+    else:
+        text = row["state_json"]
+        source_id = row["ticker"]
+        timestamp = row["updated_at"]
+    return text, {
+        "ticker": row["ticker"],
+        "layer": layer,
+        "source_id": source_id,
+        "timestamp": timestamp,
+        "text": text,
+        **attributes,
+    }
 
 
-def cosine_similarity(vec_a: list[float], vec_b: list[float]) -> float:
-    dot = sum(a * b for a, b in zip(vec_a, vec_b))
-    norm_a = math.sqrt(sum(a * a for a in vec_a))
-    norm_b = math.sqrt(sum(b * b for b in vec_b))
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    return dot / (norm_a * norm_b)
+def _epoch(value: str | datetime | None) -> float | None:
+    if not value:
+        return None
+    try:
+        parsed = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _rank_features(metadata: dict[str, Any]) -> dict[str, Any]:
+    # Reduced once at index time to what the rerank reads, so a query only
+    # gathers floats from the candidates' metadata.
+    severity = _SEVERITY_LEVELS.get(metadata.get("severity") or "")
+    impact = metadata.get("impact_score")
+    if impact is not None:
+        severity = max(severity or 0.0, min(abs(float(impact)), 1.0))
+    return {
+        "status": metadata.get("status"),
+        "effective_ts": _epoch(metadata.get("effective_at")),
+        "severity_score": severity,
+    }
 
 
-EMBEDDER = EmbeddingProvider()
-STORE = FaissVectorStore(dim=EMBEDDER.dim) if FAISS_AVAILABLE else VectorStore(dim=EMBEDDER.dim)
+_FEATURE_FIELDS = ("start", "end", "status", "effective_ts", "severity_score")
+
+
+def _chunk_key(layer: str, source_id: str, chunk_id: str) -> RecordKey:
+    return (layer, f"{source_id}#{chunk_id}")
+
+
+def _apply_rows(layer: str, rows: list[tuple[str, dict[str, Any] | None]]) -> None:
+    # Documents are indexed as chunks. A chunk whose text is unchanged keeps its
+    # vector (and timestamp, i.e. when that part last changed); only new or
+    # edited chunks are embedded, and chunks that disappeared are dropped.
+    global _CHANGES_SINCE_CHECKPOINT
+
+    _CHANGES_SINCE_CHECKPOINT += len(rows)
+    pending: list[tuple[RecordKey, dict[str, Any]]] = []
+    for source_id, row in rows:
+        previous = _DOC_CHUNKS.pop((layer, source_id), set())
+        current: set[RecordKey] = set()
+        if row is not None:
+            text, metadata = _document(layer, row)
+            for chunk in chunk_document(layer, text):
+                key = _chunk_key(layer, source_id, chunk.chunk_id)
+                current.add(key)
+                merged = {**metadata, **chunk.attributes}
+                chunk_metadata = {
+                    "ticker": metadata["ticker"],
+                    "layer": layer,
+                    "source_id": source_id,
+                    "timestamp": metadata["timestamp"],
+                    "text": chunk.text,
+                    "chunk_id": key[1],
+                    "start": chunk.start,
+                    "end": chunk.end,
+                    **_rank_features(merged),
+                }
+                existing = STORE.get(key)
+                if existing is not None and existing.metadata["text"] == chunk.text:
+                    # Same text: keep the vector, refresh offsets or a status change.
+                    changed = {
+                        name: chunk_metadata[name]
+                        for name in _FEATURE_FIELDS
+                        if existing.metadata.get(name) != chunk_metadata[name]
+                    }
+                    if changed:
+                        STORE.upsert(key, existing.vector, {**existing.metadata, **changed})
+                    continue
+                pending.append((key, chunk_metadata))
+        for key in previous - current:
+            STORE.delete(key)
+            LEXICAL.delete(key)
+        if current:
+            _DOC_CHUNKS[(layer, source_id)] = current
+    vectors = EMBEDDER.embed_many([metadata["text"] for _, metadata in pending])
+    for (key, metadata), vector in zip(pending, vectors):
+        STORE.upsert(key, vector, metadata)
+        LEXICAL.upsert(key, metadata["ticker"], metadata["text"])
+
+
+def document_records(layer: str, source_id: str) -> list[VectorRecord]:
+    with _STORE_LOCK:
+        keys = sorted(_DOC_CHUNKS.get((layer, source_id), ()))
+        return [record for record in (STORE.get(key) for key in keys) if record is not None]
+
+
+def _apply_row(layer: str, source_id: str, row: dict[str, Any] | None) -> None:
+    _apply_rows(layer, [(source_id, row)])
+
+
+def index_row(
+    layer: str, source_id: str, row: dict[str, Any] | None, seq: int | None = None
+) -> None:
+    with _STORE_LOCK:
+        if _LOADED_DB_PATH != db.DB_PATH:
+            # Not mirroring this database yet; the next load or catch-up picks the row up.
+            return
+        if seq is not None:
+            if seq <= max(_HIGH_WATER, _APPLIED_SEQS.get((layer, source_id), 0)):
+                return
+            _APPLIED_SEQS[(layer, source_id)] = seq
+        _apply_row(layer, source_id, row)
+
+
+def _max_change_seq() -> int:
+    row = db.fetch_one("SELECT MAX(seq) AS seq FROM index_changes")
+    return int(row["seq"] or 0) if row else 0
+
+
+def _reset_tracking(high_water: int) -> None:
+    global _LOADED_DB_PATH, _HIGH_WATER, _CHANGES_SINCE_CHECKPOINT
+
+    _LOADED_DB_PATH = db.DB_PATH
+    _HIGH_WATER = high_water
+    _APPLIED_SEQS.clear()
+    _CHANGES_SINCE_CHECKPOINT = 0
 
 
 def refresh_store() -> None:
-    STORE.records.clear()
-    if FAISS_AVAILABLE:
-        STORE.index.reset()
-
-    profile_rows = db.fetch_all("SELECT * FROM profile")
-    for row in profile_rows:
-        vector = EMBEDDER.embed(row["profile_text"])
-        STORE.add(
-            vector,
-            {
-                "ticker": row["ticker"],
-                "layer": "profile",
-                "source_id": row["ticker"],
-                "timestamp": row["updated_at"],
-                "text": row["profile_text"],
-            },
-        )
-
-    event_rows = db.fetch_all(
-        "SELECT id, ticker, summary, evidence, created_at FROM state_events"
-    )
-    for row in event_rows:
-        text = f"{row['summary']} {row['evidence']}"
-        vector = EMBEDDER.embed(text)
-        STORE.add(
-            vector,
-            {
-                "ticker": row["ticker"],
-                "layer": "event",
-                "source_id": str(row["id"]),
-                "timestamp": row["created_at"],
-                "text": text,
-            },
-        )
-
-    snapshot_rows = db.fetch_all("SELECT * FROM state_snapshot")
-    for row in snapshot_rows:
-        vector = EMBEDDER.embed(row["state_json"])
-        STORE.add(
-            vector,
-            {
-                "ticker": row["ticker"],
-                "layer": "state",
-                "source_id": row["ticker"],
-                "timestamp": row["updated_at"],
-                "text": row["state_json"],
-            },
-        )
-
-
-def retrieve_context(ticker: str, query: str, top_k: int = 6) -> list[RAGChunk]:
-    refresh_store()
-    query_vector = EMBEDDER.embed(query)
-    results = STORE.search(query_vector, top_k=top_k)
+    with _STORE_LOCK:
+        # Read the mark first so rows written during the rebuild are caught up later.
+        high_water = _max_change_seq()
+        STORE.clear()
+        LEXICAL.clear()
+        _DOC_CHUNKS.clear()
+        for layer, table in (("profile", "profile"), ("event", "state_events"), ("state", "state_snapshot")):
+            rows = [dict(row) for row in db.fetch_all(f"SELECT * FROM {table}")]
+            documents = [(_document(layer, row)[1]["source_id"], row) for row in rows]
+            for start in range(0, len(documents), EMBED_BATCH):
+                _apply_rows(layer, documents[start : start + EMBED_BATCH])
+        _reset_tracking(high_water)
+        checkpoint_store()
+
+
+def checkpoint_store() -> bool:
+    global _CHANGES_SINCE_CHECKPOINT
+
+    if not NUMPY_AVAILABLE:
+        return False
+    with _STORE_LOCK:
+        save_partitioned(STORE, index_dir(), _HIGH_WATER, EMBEDDER.name)
+        db.record_index_checkpoint(str(index_dir().resolve()), _HIGH_WATER)
+        _CHANGES_SINCE_CHECKPOINT = 0
+    return True
+
+
+def _warm_start() -> bool:
+    high_water = load_partitioned(STORE, index_dir(), EMBEDDER.name)
+    if high_water is None:
+        return False
+    LEXICAL.clear()
+    _DOC_CHUNKS.clear()
+    for ticker, partition in STORE.partitions.items():
+        for key, record in partition.records.items():
+            LEXICAL.upsert(key, ticker, record.metadata["text"])
+            _DOC_CHUNKS.setdefault((key[0], record.metadata["source_id"]), set()).add(key)
+    _reset_tracking(high_water)
+    return True
+
+
+def _catch_up() -> None:
+    global _HIGH_WATER
+
+    if _HIGH_WATER < db.index_changes_pruned_through():
+        # Changes this process never saw were pruned after a newer checkpoint;
+        # reload from that checkpoint, or rebuild if it is not usable.
+        if not _warm_start() or _HIGH_WATER < db.index_changes_pruned_through():
+            refresh_store()
+    changes = db.fetch_changes_since(_HIGH_WATER)
+    if not changes:
+        return
+    pending: dict[str, list[str]] = {}
+    for change in changes:
+        if change["seq"] > _APPLIED_SEQS.get((change["layer"], change["source_id"]), 0):
+            pending.setdefault(change["layer"], []).append(change["source_id"])
+    for layer, source_ids in pending.items():
+        rows: dict[str, dict[str, Any]] = {}
+        for start in range(0, len(source_ids), 500):
+            batch = source_ids[start : start + 500]
+            query = _LAYER_QUERIES[layer].format(", ".join("?" for _ in batch))
+            for row in db.fetch_all(query, tuple(batch)):
+                row_dict = dict(row)
+                rows[_document(layer, row_dict)[1]["source_id"]] = row_dict
+        for start in range(0, len(source_ids), EMBED_BATCH):
+            batch = source_ids[start : start + EMBED_BATCH]
+            _apply_rows(layer, [(source_id, rows.get(source_id)) for source_id in batch])
+    _HIGH_WATER = max(change["seq"] for change in changes)
+    for key in [key for key, seq in _APPLIED_SEQS.items() if seq <= _HIGH_WATER]:
+        del _APPLIED_SEQS[key]
+
+
+def ensure_store() -> None:
+    # Reloading app.db resets its listener list, so re-register on every call.
+    db.add_row_listener(index_row)
+    with _STORE_LOCK:
+        if _LOADED_DB_PATH != db.DB_PATH and not _warm_start():
+            refresh_store()
+        _catch_up()
+        if _CHANGES_SINCE_CHECKPOINT >= CHECKPOINT_EVERY:
+            checkpoint_store()
+
+
+def rerank(
+    candidates: list[tuple[float, VectorRecord]], as_of: float, top_k: int
+) -> list[tuple[float, VectorRecord]]:
+    # Relevance is scaled by the best candidate's so the priors sit on the same
+    # [0, 1] footing whether it came from cosine or fused ranks. Candidates are
+    # already the most relevant by similarity, so priors decide among them.
+    if not candidates:
+        return []
+    relevance = [score for score, _ in candidates]
+    ages = []
+    opened = []
+    severe = []
+    for _, record in candidates:
+        effective = record.metadata.get("effective_ts")
+        ages.append(NAN if effective is None else max(as_of - effective, 0.0) / 86400.0)
+        status = record.metadata.get("status")
+        opened.append(1.0 if status == "open" else 0.0 if status == "closed" else NEUTRAL_PRIOR)
+        severity = record.metadata.get("severity_score")
+        severe.append(NEUTRAL_PRIOR if severity is None else severity)
+    if NUMPY_AVAILABLE:
+        scaled = np.maximum(np.asarray(relevance, dtype=np.float64), 0.0)
+        scaled = scaled / scaled.max() if scaled.max() > 0 else np.ones_like(scaled)
+        age_days = np.asarray(ages, dtype=np.float64)
+        recency = np.where(np.isnan(age_days), NEUTRAL_PRIOR, 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS))
+        scores = (
+            scaled
+            + RECENCY_WEIGHT * recency
+            + STATUS_WEIGHT * np.asarray(opened)
+            + SEVERITY_WEIGHT * np.asarray(severe)
+        ).tolist()
+    else:
+        best = max(relevance)
+        scores = [
+            (max(score, 0.0) / best if best > 0 else 1.0)
+            + RECENCY_WEIGHT * (NEUTRAL_PRIOR if math.isnan(age) else 0.5 ** (age / RECENCY_HALF_LIFE_DAYS))
+            + STATUS_WEIGHT * status_prior
+            + SEVERITY_WEIGHT * severity_prior
+            for score, age, status_prior, severity_prior in zip(relevance, ages, opened, severe)
+        ]
+    # Ties go to the more specific layer, then to a stable id, so equal scores
+    # never leave the order to hashing or index insertion order.
+    order = sorted(
+        range(len(candidates)),
+        key=lambda idx: (
+            -scores[idx],
+            _LAYER_PRIORITY.get(candidates[idx][1].metadata.get("layer"), len(_LAYER_PRIORITY)),
+            str(candidates[idx][1].metadata.get("source_id", "")),
+            candidates[idx][1].metadata.get("chunk_id") or "",
+        ),
+    )[:top_k]
+    return [(scores[idx], candidates[idx][1]) for idx in order]
+
+
+def retrieve_context(
+    ticker: str, query: str, top_k: int = 6, as_of: str | datetime | None = None
+) -> list[RAGChunk]:
+    # as_of anchors recency (the article's publication time); defaults to now.
+    ensure_store()
+    query_vector = PROVIDER.embed(query)
+    depth = max(RERANK_OVERSAMPLE * top_k, top_k)
+    with _STORE_LOCK:
+        if LEXICAL_WEIGHT <= 0:
+            candidates = STORE.search_scored(query_vector, top_k=depth, ticker=ticker)
+        else:
+            # Fuse ranks rather than scores: cosine and BM25 live on different scales.
+            dense = [
+                record_key(record.metadata)
+                for _, record in STORE.search_scored(query_vector, depth, ticker=ticker)
+            ]
+            sparse = [key for _, key in LEXICAL.search(ticker, query, depth)]
+            fused = reciprocal_rank_fusion([(dense, 1.0), (sparse, LEXICAL_WEIGHT)], k=RRF_K)
+            candidates = [(score, STORE.get(key)) for score, key in fused[:depth]]
+    results = rerank(candidates, _epoch(as_of) or time.time(), top_k)
     chunks: list[RAGChunk] = []
-    for record in results:
-        if record.metadata.get("ticker") != ticker:
-            continue
-        text = record.metadata.get("text", "")
-        snippet = clean_text(text)[:280]
+    for _, record in results:
+        snippet = best_window(clean_text(record.metadata.get("text", "")), query)
         timestamp = record.metadata.get("timestamp")
         timestamp_dt = datetime.fromisoformat(timestamp) if timestamp else None
         chunks.append(
@@ -160,18 +401,24 @@ def retrieve_context(ticker: str, query: str, top_k: int = 6) -> list[RAGChunk]:
                 source_id=record.metadata["source_id"],
                 snippet=snippet,
                 timestamp=timestamp_dt,
+                chunk_id=record.metadata.get("chunk_id"),
             )
         )
     return chunks
 
 
+db.add_row_listener(index_row)
+
+
 def seed_profiles_if_missing() -> None:
     rows = db.fetch_all("SELECT ticker FROM profile")
     if rows:
         return
-    profiles = {
-        "AAPL": "Apple designs consumer electronics and services with a focus on iPhone, Mac, wearables, and recurring services revenue. Key risks include supply chain disruption and regulatory scrutiny.",
-        "TSLA": "Tesla develops electric vehicles, energy storage, and software-led vehicle platforms. Key risks include demand volatility, regulatory changes, and manufacturing ramp constraints.",
-    }
-    for ticker, text in profiles.items():
-        db.upsert_profile(ticker, text)
+    universe = db.fetch_all("SELECT ticker, profile_text FROM tickers WHERE profile_text IS NOT NULL")
+    if not universe:
+        if SEED_TICKERS_CSV.exists():
+            load_universe_csv(SEED_TICKERS_CSV)
+        return
+    with db.transaction():
+        for row in universe:
+            db.upsert_profile(row["ticker"], row["profile_text"])
@@ -1,11 +1,25 @@
 from __future__ import annotations
 
+import bisect
 import json
-from datetime import datetime
+import os
+import queue
+import threading
+import zlib
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable
 
 from app import db
 from app.models import LLMImpactResult
 
+STATE_LANES = int(os.getenv("APP_STATE_LANES", "4"))
+STATE_MAX_BATCH = int(os.getenv("APP_STATE_MAX_BATCH", "64"))
+# Log entries per ticker between state checkpoints.
+CHECKPOINT_EVERY = int(os.getenv("APP_STATE_CHECKPOINT_EVERY", "200"))
+
 
 def _parse_ts(value: str | datetime) -> datetime:
     if isinstance(value, datetime):
@@ -13,14 +27,6 @@ def _parse_ts(value: str | datetime) -> datetime:
     return datetime.fromisoformat(value)
 
 
-def _summary_similarity(a: str, b: str) -> float:
-    tokens_a = set(a.lower().split())
-    tokens_b = set(b.lower().split())
-    if not tokens_a or not tokens_b:
-        return 0.0
-    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
-
-
 def _is_closure(summary: str, contradiction_flags: list[str]) -> bool:
     lowered = summary.lower()
     closure_terms = ["resolved", "settled", "closed", "withdrawn", "ended"]
@@ -29,11 +35,197 @@ def _is_closure(summary: str, contradiction_flags: list[str]) -> bool:
     return "conflicts_with_state" in contradiction_flags
 
 
+def _utc_iso(value: datetime) -> str:
+    # Log timestamps compare as strings, so aware values are normalized to naive UTC.
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+
+def _publish_event(event_id: int | None, op: str, effective_at: datetime) -> None:
+    if event_id is None:
+        return
+    row = db.fetch_one("SELECT * FROM state_events WHERE id = ?", (event_id,))
+    if row:
+        event = dict(row)
+        ts = _utc_iso(effective_at)
+        seq = db.execute(
+            """
+            INSERT INTO state_event_log (ticker, event_id, op, ts, row_json)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (event["ticker"], event_id, op, ts, json.dumps(event)),
+        )
+        db.notify_row("event", str(event_id), event)
+        _apply_snapshot_delta(event, seq, ts)
+
+
 def apply_event_update(
     ticker: str,
     news_id: str,
     published_at: str | datetime,
     analysis: LLMImpactResult,
+) -> dict[str, str]:
+    with db.transaction():
+        return _apply_event_update(ticker, news_id, published_at, analysis)
+
+
+StateUpdate = tuple[str, str, "str | datetime", LLMImpactResult]
+# A unit of work for a lane: state updates plus an optional callback that
+# writes alongside them (e.g. the analysis_runs audit row), committed together.
+_Unit = tuple[list[StateUpdate], "Callable[[], None] | None", bool]
+
+
+@dataclass
+class _Join:
+    # A unit spanning several lanes. It is queued on each of them; every lane
+    # commits what was ahead of it and parks, the lowest lane applies the unit
+    # in one transaction, and the barrier's second round releases the rest.
+    unit: _Unit
+    owner: int
+    barrier: threading.Barrier
+
+
+class StateUpdateDispatcher:
+    # Routes each ticker to one of `lanes` serial worker threads by a stable
+    # hash, so updates for a ticker apply in submission order and never race.
+    # A lane applies every unit queued behind it in one transaction, which
+    # batches different articles' updates into a shared commit. A unit whose
+    # tickers hash to several lanes holds all of them while it applies.
+    def __init__(self, lanes: int = STATE_LANES, max_batch: int = STATE_MAX_BATCH) -> None:
+        self.lanes = max(1, lanes)
+        self.max_batch = max(1, max_batch)
+        self.commits = 0
+        self._queues: list[queue.SimpleQueue[tuple[_Unit | _Join, Future]]] = [
+            queue.SimpleQueue() for _ in range(self.lanes)
+        ]
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def lane(self, ticker: str) -> int:
+        return zlib.crc32(ticker.encode("utf-8")) % self.lanes
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for idx, lane_queue in enumerate(self._queues):
+                thread = threading.Thread(
+                    target=self._run, args=(idx, lane_queue), name=f"state-lane-{idx}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _put(self, tickers: Iterable[str], unit: _Unit) -> Future:
+        future: Future = Future()
+        if not self._threads:
+            self._start()
+        lanes = sorted({self.lane(ticker) for ticker in tickers})
+        if len(lanes) == 1:
+            self._queues[lanes[0]].put((unit, future))
+            return future
+        join = _Join(unit, lanes[0], threading.Barrier(len(lanes)))
+        # Joins are queued on all their lanes at once, so any two of them are in
+        # the same order on every lane they share and cannot wait on each other.
+        with self._lock:
+            for lane in lanes:
+                self._queues[lane].put((join, future))
+        return future
+
+    def submit(
+        self,
+        ticker: str,
+        news_id: str,
+        published_at: str | datetime,
+        analysis: LLMImpactResult,
+    ) -> Future:
+        return self._put([ticker], ([(ticker, news_id, published_at, analysis)], None, True))
+
+    def submit_unit(
+        self,
+        updates: list[StateUpdate],
+        finalize: Callable[[], None] | None = None,
+    ) -> Future:
+        # Updates may span tickers; each goes through its ticker's lane, and the
+        # future resolves to their results once they commit together.
+        if not updates:
+            raise ValueError("submit_unit needs at least one update")
+        return self._put([update[0] for update in updates], (updates, finalize, False))
+
+    def _run(self, lane: int, lane_queue: queue.SimpleQueue[tuple[_Unit | _Join, Future]]) -> None:
+        pending = None
+        while True:
+            item = pending or lane_queue.get()
+            pending = None
+            if isinstance(item[0], _Join):
+                self._apply_join(lane, item[0], item[1])
+                continue
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = lane_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item[0], _Join):
+                    pending = item
+                    break
+                batch.append(item)
+            self._apply_batch(batch)
+
+    def _apply_join(self, lane: int, join: _Join, future: Future) -> None:
+        join.barrier.wait()
+        try:
+            if lane != join.owner:
+                return
+            try:
+                with db.transaction():
+                    result = self._apply_unit(join.unit)
+            except Exception as exc:
+                future.set_exception(exc)
+                return
+            with self._lock:
+                self.commits += 1
+            future.set_result(result)
+        finally:
+            join.barrier.wait()
+
+    @staticmethod
+    def _apply_unit(unit: _Unit) -> Any:
+        updates, finalize, single = unit
+        results = [_apply_event_update(*update) for update in updates]
+        if finalize is not None:
+            finalize()
+        return results[0] if single else results
+
+    def _apply_batch(self, batch: list[tuple[_Unit, Future]]) -> None:
+        try:
+            with db.transaction():
+                results = [self._apply_unit(unit) for unit, _ in batch]
+        except Exception:
+            # One bad unit must not fail its neighbours: retry each on its own.
+            for unit, future in batch:
+                try:
+                    with db.transaction():
+                        result = self._apply_unit(unit)
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(result)
+            return
+        with self._lock:
+            self.commits += 1
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+DISPATCHER = StateUpdateDispatcher()
+
+
+def _apply_event_update(
+    ticker: str,
+    news_id: str,
+    published_at: str | datetime,
+    analysis: LLMImpactResult,
 ) -> dict[str, str]:
     published_dt = _parse_ts(published_at)
     existing = db.fetch_one(
@@ -43,19 +235,7 @@ def apply_event_update(
     if existing:
         return {"status": "idempotent"}
 
-    open_events = db.fetch_all(
-        "SELECT * FROM state_events WHERE ticker = ? AND status = 'open'",
-        (ticker,),
-    )
-    matched_event = None
-    for row in open_events:
-        if row["event_type"] == analysis.event_type:
-            matched_event = row
-            break
-        similarity = _summary_similarity(row["summary"], analysis.summary)
-        if similarity > 0.4:
-            matched_event = row
-            break
+    matched_event = _cached(ticker).open_events.match(analysis.event_type, analysis.summary)
 
     closing = _is_closure(analysis.summary, analysis.contradiction_flags)
     if closing and matched_event:
@@ -67,9 +247,10 @@ def apply_event_update(
             """,
             (published_dt.isoformat(), matched_event["id"]),
         )
+        _publish_event(matched_event["id"], "close", published_dt)
 
     if closing:
-        db.execute(
+        event_id = db.execute(
             """
             INSERT INTO state_events (
                 ticker, event_type, status, severity, impact_score, horizon, summary,
@@ -91,7 +272,7 @@ def apply_event_update(
                 datetime.utcnow().isoformat(),
             ),
         )
-        rebuild_snapshot(ticker)
+        _publish_event(event_id, "insert", published_dt)
         return {"status": "closed"}
 
     if matched_event:
@@ -118,10 +299,10 @@ def apply_event_update(
                     matched_event["id"],
                 ),
             )
-            rebuild_snapshot(ticker)
+            _publish_event(matched_event["id"], "update", published_dt)
             return {"status": "updated"}
 
-    db.execute(
+    event_id = db.execute(
         """
         INSERT INTO state_events (
             ticker, event_type, status, severity, impact_score, horizon, summary,
@@ -142,20 +323,206 @@ def apply_event_update(
             datetime.utcnow().isoformat(),
         ),
     )
-    rebuild_snapshot(ticker)
+    _publish_event(event_id, "insert", published_dt)
     return {"status": "inserted"}
 
 
-def rebuild_snapshot(ticker: str) -> None:
-    rows = db.fetch_all(
+# Snapshots cover the most recent events by created_at.
+SNAPSHOT_WINDOW = 50
+# Summary token-set Jaccard above which an open event of another type matches.
+SUMMARY_MATCH_THRESHOLD = 0.4
+
+
+def _tokens(summary: str) -> frozenset[str]:
+    return frozenset(summary.lower().split())
+
+
+class OpenEventIndex:
+    # A ticker's open events with pre-tokenized summaries, bucketed by
+    # event_type and indexed by summary token. match() returns the same event
+    # as scanning open events in id order for the first with the same
+    # event_type or a summary similarity above the threshold: Jaccard above
+    # zero needs a shared token, so the inverted index misses no candidate.
+    def __init__(self, rows: Iterable[dict[str, Any]] = ()) -> None:
+        self.events: dict[int, tuple[dict[str, Any], frozenset[str]]] = {}
+        self.by_type: dict[str, list[int]] = {}
+        self.postings: dict[str, set[int]] = {}
+        for row in rows:
+            self.add(row)
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def add(self, row: dict[str, Any]) -> None:
+        self.discard(row["id"])
+        tokens = _tokens(row["summary"])
+        self.events[row["id"]] = (row, tokens)
+        bisect.insort(self.by_type.setdefault(row["event_type"], []), row["id"])
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(row["id"])
+
+    def discard(self, event_id: int) -> None:
+        entry = self.events.pop(event_id, None)
+        if entry is None:
+            return
+        row, tokens = entry
+        same_type = self.by_type[row["event_type"]]
+        same_type.remove(event_id)
+        if not same_type:
+            del self.by_type[row["event_type"]]
+        for token in tokens:
+            ids = self.postings[token]
+            ids.discard(event_id)
+            if not ids:
+                del self.postings[token]
+
+    def match(self, event_type: str, summary: str) -> dict[str, Any] | None:
+        same_type = self.by_type.get(event_type)
+        best = same_type[0] if same_type else None
+        tokens = _tokens(summary)
+        overlaps: dict[int, int] = {}
+        for token in tokens:
+            for event_id in self.postings.get(token, ()):
+                if best is None or event_id < best:
+                    overlaps[event_id] = overlaps.get(event_id, 0) + 1
+        for event_id, overlap in overlaps.items():
+            if best is not None and event_id > best:
+                continue
+            union = len(tokens) + len(self.events[event_id][1]) - overlap
+            if overlap / union > SUMMARY_MATCH_THRESHOLD:
+                best = event_id
+        return self.events[best][0] if best is not None else None
+
+
+@dataclass
+class _TickerCache:
+    # Newest-first copy of the events a ticker's snapshot is built from, its
+    # open events, and the state_snapshot.updated_at they correspond to; plus
+    # the ticker's event-log position and entries since its last checkpoint.
+    events: list[dict[str, Any]]
+    open_events: OpenEventIndex
+    version: str | None
+    log_seq: int = 0
+    log_max_ts: str = ""
+    since_checkpoint: int = 0
+
+
+_CACHES: dict[str, _TickerCache] = {}
+_CACHES_DB: Path | None = None
+_CACHES_LOCK = threading.Lock()
+
+
+def _load_cache(ticker: str, version: str | None) -> _TickerCache:
+    window = db.fetch_all(
         """
         SELECT * FROM state_events
         WHERE ticker = ?
         ORDER BY created_at DESC
-        LIMIT 50
+        LIMIT ?
         """,
+        (ticker, SNAPSHOT_WINDOW),
+    )
+    open_rows = db.fetch_all(
+        "SELECT * FROM state_events WHERE ticker = ? AND status = 'open' ORDER BY id",
+        (ticker,),
+    )
+    checkpoint = db.fetch_one(
+        "SELECT seq, max_ts FROM state_checkpoints WHERE ticker = ? ORDER BY seq DESC LIMIT 1",
         (ticker,),
     )
+    checkpoint_seq = checkpoint["seq"] if checkpoint else 0
+    tail = db.fetch_one(
+        """
+        SELECT COUNT(*) AS n, MAX(seq) AS seq, MAX(ts) AS ts
+        FROM state_event_log
+        WHERE ticker = ? AND seq > ?
+        """,
+        (ticker, checkpoint_seq),
+    )
+    return _TickerCache(
+        events=[dict(row) for row in window],
+        open_events=OpenEventIndex([dict(row) for row in open_rows]),
+        version=version,
+        log_seq=tail["seq"] or checkpoint_seq,
+        log_max_ts=max(tail["ts"] or "", checkpoint["max_ts"] if checkpoint else ""),
+        since_checkpoint=tail["n"],
+    )
+
+
+def _cached(ticker: str) -> _TickerCache:
+    # Callers hold the database write lock, so the stored version cannot move
+    # underneath us; a mismatch means another process wrote this ticker.
+    global _CACHES_DB
+
+    stored = db.fetch_one("SELECT updated_at FROM state_snapshot WHERE ticker = ?", (ticker,))
+    version = stored["updated_at"] if stored else None
+    with _CACHES_LOCK:
+        if _CACHES_DB != db.DB_PATH:
+            _CACHES.clear()
+            _CACHES_DB = db.DB_PATH
+        cache = _CACHES.get(ticker)
+        if cache is not None and cache.version == version:
+            return cache
+    cache = _load_cache(ticker, version)
+    with _CACHES_LOCK:
+        _CACHES[ticker] = cache
+    return cache
+
+
+def _forget(ticker: str) -> None:
+    with _CACHES_LOCK:
+        _CACHES.pop(ticker, None)
+
+
+def _apply_to_window(events: list[dict[str, Any]], event: dict[str, Any]) -> None:
+    for idx, current in enumerate(events):
+        if current["id"] == event["id"]:
+            events[idx] = event
+            return
+    # Not in the window: a new event, or an update to one older than it.
+    position = len(events)
+    for idx, current in enumerate(events):
+        if event["created_at"] >= current["created_at"]:
+            position = idx
+            break
+    if position < SNAPSHOT_WINDOW:
+        events.insert(position, event)
+        del events[SNAPSHOT_WINDOW:]
+
+
+def _apply_snapshot_delta(event: dict[str, Any], seq: int, ts: str) -> None:
+    ticker = event["ticker"]
+    cache = _cached(ticker)
+    if event["status"] == "open":
+        cache.open_events.add(event)
+    else:
+        cache.open_events.discard(event["id"])
+    _apply_to_window(cache.events, event)
+    cache.log_seq = seq
+    cache.log_max_ts = max(cache.log_max_ts, ts)
+    cache.since_checkpoint += 1
+    # Undo the delta if the transaction rolls back, and write the snapshot once
+    # per ticker per commit however many events changed.
+    db.on_rollback(lambda: _forget(ticker))
+    db.before_commit(("snapshot", ticker), lambda: _persist_snapshot(ticker, cache))
+
+
+def _persist_snapshot(ticker: str, cache: _TickerCache) -> None:
+    cache.version = db.store_snapshot(ticker, build_snapshot(ticker, cache.events))
+    if cache.since_checkpoint >= CHECKPOINT_EVERY:
+        db.execute(
+            """
+            INSERT OR REPLACE INTO state_checkpoints (ticker, seq, max_ts, events_json)
+            VALUES (?, ?, ?, ?)
+            """,
+            (ticker, cache.log_seq, cache.log_max_ts, json.dumps(cache.events)),
+        )
+        cache.since_checkpoint = 0
+
+
+def build_snapshot(
+    ticker: str, rows: list[dict[str, Any]], last_updated: str | None = None
+) -> dict[str, Any]:
     open_events = [row for row in rows if row["status"] == "open"]
     recent_catalysts = []
     key_risks = []
@@ -201,6 +568,46 @@ def rebuild_snapshot(ticker: str) -> None:
         ],
         "recent_catalysts": recent_catalysts,
         "key_risks": key_risks,
-        "last_updated": datetime.utcnow().isoformat(),
+        "last_updated": last_updated or datetime.utcnow().isoformat(),
     }
-    db.store_snapshot(ticker, snapshot)
+    return snapshot
+
+
+def rebuild_snapshot(ticker: str) -> None:
+    # Repair path: rebuild from state_events and reset the cached state.
+    with db.transaction():
+        cache = _load_cache(ticker, None)
+        _persist_snapshot(ticker, cache)
+        db.on_rollback(lambda: _forget(ticker))
+    with _CACHES_LOCK:
+        _CACHES[ticker] = cache
+
+
+def get_state_as_of(ticker: str, ts: str | datetime) -> dict[str, Any] | None:
+    # State after every logged change effective at or before ts, applied in log
+    # order: start from the newest checkpoint whose changes are all that old and
+    # replay only the log tail after it.
+    as_of = _utc_iso(_parse_ts(ts))
+    checkpoint = db.fetch_one(
+        """
+        SELECT seq, events_json FROM state_checkpoints
+        WHERE ticker = ? AND max_ts <= ?
+        ORDER BY seq DESC
+        LIMIT 1
+        """,
+        (ticker, as_of),
+    )
+    events = json.loads(checkpoint["events_json"]) if checkpoint else []
+    tail = db.fetch_all(
+        """
+        SELECT row_json FROM state_event_log
+        WHERE ticker = ? AND seq > ? AND ts <= ?
+        ORDER BY seq
+        """,
+        (ticker, checkpoint["seq"] if checkpoint else 0, as_of),
+    )
+    if checkpoint is None and not tail:
+        return None
+    for row in tail:
+        _apply_to_window(events, json.loads(row["row_json"]))
+    return build_snapshot(ticker, events, last_updated=as_of)
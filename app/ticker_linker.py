@@ -1,8 +1,18 @@
 from __future__ import annotations
 
+import csv
+import os
 import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
 from typing import Iterable
 
+from app import db
+from app.utils import clean_text, utc_now_iso
+
 ALIAS_MAP = {
     "APPLE": "AAPL",
     "APPLE INC": "AAPL",
@@ -12,14 +22,213 @@ ALIAS_MAP = {
 }
 
 TICKER_RE = re.compile(r"\$([A-Z]{1,5})")
+# Runs of letters and digits; punctuation inside an alias ("AT&T") splits words.
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+def normalize_alias(alias: str) -> str:
+    return clean_text(alias).upper()
+
+
+class AliasMatcher:
+    # Aho-Corasick automaton over the alias table, keyed by word token rather
+    # than by character: one pass over the text's words finds every alias
+    # occurrence, and a match can only start and end on a word boundary.
+    def __init__(self, aliases: dict[str, str]) -> None:
+        self.size = 0
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[str]] = [[]]
+        for alias, ticker in aliases.items():
+            self._insert(WORD_RE.findall(normalize_alias(alias)), ticker)
+        self._build_failure_links()
+
+    def _insert(self, words: list[str], ticker: str) -> None:
+        if not words:
+            return
+        state = 0
+        for word in words:
+            nxt = self._goto[state].get(word)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][word] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append(ticker)
+        self.size += 1
+
+    def _build_failure_links(self) -> None:
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for word, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(word, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> set[str]:
+        # text must already be normalized (uppercase, single spaces).
+        found: set[str] = set()
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        state = 0
+        for word in WORD_RE.findall(text):
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+def load_alias_table(path: str | Path) -> dict[str, str]:
+    aliases: dict[str, str] = {}
+    with open(path, newline="", encoding="utf-8") as handle:
+        for row in csv.DictReader(handle):
+            alias = normalize_alias(row["alias"])
+            ticker = row["ticker"].strip().upper()
+            if alias and ticker:
+                aliases[alias] = ticker
+    return aliases
+
+
+@dataclass(frozen=True)
+class MatcherSnapshot:
+    version: int
+    db_path: Path | None
+    matcher: AliasMatcher
+
+
+class AliasRegistry:
+    # Serves an immutable, versioned matcher snapshot. When the alias tables'
+    # version moves, a replacement is compiled on a background thread and
+    # swapped in with a single reference assignment, so readers never wait.
+    def __init__(self, base: dict[str, str], check_interval: float = 5.0) -> None:
+        self.base = dict(base)
+        self.check_interval = check_interval
+        self.snapshot = MatcherSnapshot(version=0, db_path=None, matcher=AliasMatcher(self.base))
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._rebuilding: threading.Thread | None = None
+
+    def matcher(self) -> AliasMatcher:
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            self.refresh(wait=False)
+        return self.snapshot.matcher
+
+    def _stale(self) -> bool:
+        try:
+            version = db.get_version(ALIAS_VERSION_KEY)
+        except sqlite3.Error:
+            return False
+        snapshot = self.snapshot
+        return snapshot.db_path != db.DB_PATH or snapshot.version != version
+
+    def _build(self) -> MatcherSnapshot:
+        db_path = db.DB_PATH
+        aliases = dict(self.base)
+        with db.connection() as conn:
+            row = conn.execute("SELECT value FROM app_meta WHERE key = ?", (ALIAS_VERSION_KEY,)).fetchone()
+            version = int(row["value"]) if row else 0
+            for alias_row in conn.execute("SELECT alias, ticker FROM ticker_aliases"):
+                aliases[alias_row["alias"]] = alias_row["ticker"]
+        return MatcherSnapshot(version=version, db_path=db_path, matcher=AliasMatcher(aliases))
+
+    def _rebuild(self) -> None:
+        try:
+            self.snapshot = self._build()
+        except sqlite3.Error:
+            pass
+        finally:
+            with self._lock:
+                self._rebuilding = None
+
+    def refresh(self, wait: bool = True) -> None:
+        if not self._stale():
+            return
+        with self._lock:
+            thread = self._rebuilding
+            if thread is None:
+                thread = threading.Thread(target=self._rebuild, name="alias-rebuild", daemon=True)
+                self._rebuilding = thread
+                thread.start()
+        if wait:
+            thread.join()
+
+    def set_base(self, base: dict[str, str]) -> None:
+        self.base = dict(base)
+        self.snapshot = MatcherSnapshot(version=-1, db_path=None, matcher=AliasMatcher(self.base))
+        self.refresh(wait=True)
+
+
+ALIAS_VERSION_KEY = "alias_version"
+REGISTRY = AliasRegistry(ALIAS_MAP, float(os.getenv("APP_ALIAS_REFRESH_SECONDS", "5")))
+
+
+def set_aliases(aliases: dict[str, str]) -> None:
+    REGISTRY.set_base(aliases)
+
+
+if os.getenv("APP_ALIAS_CSV"):
+    set_aliases({**ALIAS_MAP, **load_alias_table(os.environ["APP_ALIAS_CSV"])})
+
+
+def load_universe_csv(path: str | Path) -> int:
+    # Columns: ticker,name[,aliases][,profile_text]; aliases are "|"-separated.
+    ticker_rows = []
+    alias_rows = []
+    profiles = []
+    now = utc_now_iso()
+    with open(path, newline="", encoding="utf-8") as handle:
+        for row in csv.DictReader(handle):
+            ticker = row["ticker"].strip().upper()
+            if not ticker:
+                continue
+            name = (row.get("name") or "").strip()
+            profile_text = (row.get("profile_text") or "").strip() or None
+            ticker_rows.append((ticker, name, profile_text, now))
+            aliases = {ticker, normalize_alias(name)}
+            aliases.update(normalize_alias(alias) for alias in (row.get("aliases") or "").split("|"))
+            alias_rows.extend((alias, ticker) for alias in aliases if alias)
+            if profile_text:
+                profiles.append((ticker, profile_text))
+    with db.transaction():
+        db.executemany(
+            """
+            INSERT INTO tickers (ticker, name, profile_text, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(ticker) DO UPDATE SET
+                name=excluded.name,
+                profile_text=COALESCE(excluded.profile_text, tickers.profile_text),
+                updated_at=excluded.updated_at
+            """,
+            ticker_rows,
+        )
+        db.executemany(
+            "INSERT OR REPLACE INTO ticker_aliases (alias, ticker) VALUES (?, ?)",
+            alias_rows,
+        )
+        for ticker, profile_text in profiles:
+            db.upsert_profile(ticker, profile_text)
+        db.bump_version(ALIAS_VERSION_KEY)
+    return len(ticker_rows)
 
 
 def extract_tickers(texts: Iterable[str]) -> list[str]:
-    joined = " ".join(texts).upper()
+    joined = clean_text(" ".join(texts)).upper()
     tickers = set()
     for match in TICKER_RE.findall(joined):
         tickers.add(match)
-    for alias, ticker in ALIAS_MAP.items():
-        if alias in joined:
-            tickers.add(ticker)
+    tickers.update(REGISTRY.matcher().find(joined))
     return sorted(tickers)
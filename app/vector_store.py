@@ -0,0 +1,772 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except Exception:
+    np = None
+    NUMPY_AVAILABLE = False
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are not serialised across processes.
+    fcntl = None
+
+try:
+    import faiss  # type: ignore
+
+    FAISS_AVAILABLE = True
+except Exception:
+    faiss = None
+    FAISS_AVAILABLE = False
+
+
+RecordKey = tuple[str, str]
+
+ANN_MIN_TRAIN = int(os.getenv("APP_ANN_MIN_TRAIN", "4096"))
+ANN_NLIST = int(os.getenv("APP_ANN_NLIST", "0"))
+ANN_NPROBE = int(os.getenv("APP_ANN_NPROBE", "8"))
+# Share of rows changed since the last build that triggers a rebuild.
+ANN_REBUILD_FRACTION = float(os.getenv("APP_ANN_REBUILD_FRACTION", "0.1"))
+
+
+@dataclass
+class VectorRecord:
+    vector: list[float]
+    metadata: dict[str, Any]
+
+
+def record_key(metadata: dict[str, Any]) -> RecordKey:
+    # Chunked documents are keyed per chunk ("<source_id>#<chunk>").
+    return (metadata["layer"], metadata.get("chunk_id") or metadata["source_id"])
+
+
+class VectorStore:
+    def __init__(self, dim: int = 16) -> None:
+        self.dim = dim
+        self.records: dict[RecordKey, VectorRecord] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, vector: list[float], metadata: dict[str, Any]) -> None:
+        self.upsert(record_key(metadata), vector, metadata)
+
+    def upsert(self, key: RecordKey, vector: list[float], metadata: dict[str, Any]) -> None:
+        self.records[key] = VectorRecord(vector=vector, metadata=metadata)
+
+    def delete(self, key: RecordKey) -> bool:
+        return self.records.pop(key, None) is not None
+
+    def clear(self) -> None:
+        self.records.clear()
+
+    def get(self, key: RecordKey) -> VectorRecord | None:
+        return self.records.get(key)
+
+    def export(self) -> tuple[Any, list[dict[str, Any]]]:
+        records = list(self.records.values())
+        return [record.vector for record in records], [record.metadata for record in records]
+
+    def search_scored(
+        self, vector: list[float], top_k: int = 6
+    ) -> list[tuple[float, VectorRecord]]:
+        scored = []
+        for record in self.records.values():
+            score = cosine_similarity(vector, record.vector)
+            scored.append((score, record))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:top_k]
+
+    def search_many_scored(
+        self, vectors: list[list[float]], top_k: int = 6
+    ) -> list[list[tuple[float, VectorRecord]]]:
+        return [self.search_scored(vector, top_k) for vector in vectors]
+
+    def search(self, vector: list[float], top_k: int = 6) -> list[VectorRecord]:
+        return [record for _, record in self.search_scored(vector, top_k)]
+
+
+class NumpyVectorStore(VectorStore):
+    def __init__(self, dim: int = 16, capacity: int = 64) -> None:
+        super().__init__(dim=dim)
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        self._keys: list[RecordKey] = []
+        self._rows: dict[RecordKey, int] = {}
+
+    @classmethod
+    def from_arrays(
+        cls,
+        dim: int,
+        matrix: "np.ndarray",
+        norms: "np.ndarray",
+        metadatas: list[dict[str, Any]],
+    ) -> "NumpyVectorStore":
+        # Keeps the (possibly read-only, memory-mapped) arrays as-is; the first
+        # write copies them, so untouched partitions stay shared between processes.
+        store = cls(dim=dim, capacity=0)
+        store._matrix = matrix
+        store._norms = norms
+        for row, metadata in enumerate(metadatas):
+            key = record_key(metadata)
+            store._keys.append(key)
+            store._rows[key] = row
+            store.records[key] = VectorRecord(vector=matrix[row], metadata=metadata)
+        return store
+
+    @property
+    def matrix(self) -> "np.ndarray":
+        return self._matrix[: len(self._keys)]
+
+    @property
+    def norms(self) -> "np.ndarray":
+        return self._norms[: len(self._keys)]
+
+    def _ensure_writable(self) -> None:
+        if not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix, dtype=np.float32)
+            self._norms = np.array(self._norms, dtype=np.float32)
+
+    def _grow(self) -> None:
+        capacity = max(2 * self._matrix.shape[0], 64)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        norms = np.zeros(capacity, dtype=np.float32)
+        size = len(self._keys)
+        matrix[:size] = self._matrix[:size]
+        norms[:size] = self._norms[:size]
+        self._matrix = matrix
+        self._norms = norms
+
+    def upsert(self, key: RecordKey, vector: list[float], metadata: dict[str, Any]) -> None:
+        self._ensure_writable()
+        row = self._rows.get(key)
+        if row is None:
+            if len(self._keys) == self._matrix.shape[0]:
+                self._grow()
+            row = len(self._keys)
+            self._keys.append(key)
+            self._rows[key] = row
+        self._matrix[row] = vector
+        self._norms[row] = np.linalg.norm(self._matrix[row])
+        self.records[key] = VectorRecord(vector=vector, metadata=metadata)
+
+    def delete(self, key: RecordKey) -> bool:
+        row = self._rows.pop(key, None)
+        if row is None:
+            return False
+        self._ensure_writable()
+        del self.records[key]
+        last = len(self._keys) - 1
+        if row != last:
+            moved = self._keys[last]
+            self._matrix[row] = self._matrix[last]
+            self._norms[row] = self._norms[last]
+            self._keys[row] = moved
+            self._rows[moved] = row
+        self._keys.pop()
+        return True
+
+    def clear(self) -> None:
+        super().clear()
+        self._keys.clear()
+        self._rows.clear()
+
+    def export(self) -> tuple[Any, list[dict[str, Any]]]:
+        return self.matrix, [self.records[key].metadata for key in self._keys]
+
+    def _top_k(self, scores: "np.ndarray", top_k: int) -> list[tuple[float, VectorRecord]]:
+        if top_k < len(scores):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(float(scores[row]), self.records[self._keys[row]]) for row in ordered]
+
+    def _cosine(self, queries: "np.ndarray") -> "np.ndarray":
+        query_norms = np.linalg.norm(queries, axis=1)
+        denom = np.outer(query_norms, self.norms)
+        dots = queries @ self.matrix.T
+        return np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+
+    def search_scored(
+        self, vector: list[float], top_k: int = 6
+    ) -> list[tuple[float, VectorRecord]]:
+        if not self._keys or top_k <= 0:
+            return []
+        scores = self._cosine(np.asarray([vector], dtype=np.float32))[0]
+        return self._top_k(scores, top_k)
+
+    def search_many_scored(
+        self, vectors: list[list[float]], top_k: int = 6
+    ) -> list[list[tuple[float, VectorRecord]]]:
+        if not self._keys or top_k <= 0:
+            return [[] for _ in vectors]
+        scores = self._cosine(np.asarray(vectors, dtype=np.float32))
+        return [self._top_k(row, top_k) for row in scores]
+
+
+class FaissVectorStore(VectorStore):
+    def __init__(self, dim: int = 16) -> None:
+        super().__init__(dim=dim)
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self._ids: dict[RecordKey, int] = {}
+        self._keys: dict[int, RecordKey] = {}
+        self._next_id = 0
+
+    def upsert(self, key: RecordKey, vector: list[float], metadata: dict[str, Any]) -> None:
+        self.delete(key)
+        faiss_id = self._next_id
+        self._next_id += 1
+        self.records[key] = VectorRecord(vector=vector, metadata=metadata)
+        self._ids[key] = faiss_id
+        self._keys[faiss_id] = key
+        self.index.add_with_ids(
+            np.array([vector], dtype="float32"), np.array([faiss_id], dtype="int64")
+        )
+
+    def delete(self, key: RecordKey) -> bool:
+        faiss_id = self._ids.pop(key, None)
+        if faiss_id is None:
+            return False
+        del self._keys[faiss_id]
+        del self.records[key]
+        self.index.remove_ids(np.array([faiss_id], dtype="int64"))
+        return True
+
+    def clear(self) -> None:
+        super().clear()
+        self.index.reset()
+        self._ids.clear()
+        self._keys.clear()
+
+    def search_scored(
+        self, vector: list[float], top_k: int = 6
+    ) -> list[tuple[float, VectorRecord]]:
+        if not self.records:
+            return []
+        distances, indices = self.index.search(np.array([vector], dtype="float32"), top_k)
+        results = []
+        for score, idx in zip(distances[0], indices[0]):
+            if idx == -1:
+                continue
+            results.append((float(score), self.records[self._keys[int(idx)]]))
+        return results
+
+
+def _unit_rows(matrix: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix, dtype=np.float32), where=norms > 0)
+
+
+def _permute_rows(matrix: "np.ndarray", order: "np.ndarray") -> "np.ndarray":
+    # matrix[:] = matrix[order] with one row of scratch space, by following the
+    # permutation's cycles; about 2s per million rows.
+    targets = order.tolist()
+    done = bytearray(len(targets))
+    scratch = np.empty_like(matrix[0])
+    for start, source in enumerate(targets):
+        if done[start] or source == start:
+            continue
+        scratch[:] = matrix[start]
+        row = start
+        while True:
+            done[row] = 1
+            source = targets[row]
+            if source == start:
+                matrix[row] = scratch
+                break
+            matrix[row] = matrix[source]
+            row = source
+    return matrix
+
+
+class IVFIndex:
+    # Pure-NumPy inverted file over unit vectors: spherical k-means centroids,
+    # rows stored contiguously per list so probing a list is a single slice.
+    def __init__(
+        self,
+        vectors: "np.ndarray",
+        nlist: int = ANN_NLIST,
+        nprobe: int = ANN_NPROBE,
+        iterations: int = 10,
+        seed: int = 0,
+        in_place: bool = False,
+    ) -> None:
+        # in_place reorders the caller's array instead of keeping a sorted copy,
+        # for corpora where a second copy would not fit in memory.
+        count = len(vectors)
+        self.nlist = max(1, min(nlist or int(math.sqrt(count)), count))
+        self.nprobe = max(1, min(nprobe, self.nlist))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(count, size=min(count, self.nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            centroids = self._update(sample, self._assign(sample, centroids), centroids)
+        assign = self._assign(vectors, centroids)
+        self.order = np.argsort(assign, kind="stable")
+        if in_place:
+            self.vectors = _permute_rows(vectors, self.order)
+        else:
+            self.vectors = vectors[self.order]
+        self.offsets = np.searchsorted(assign[self.order], np.arange(self.nlist + 1))
+        self.centroids = centroids
+
+    @staticmethod
+    def _assign(vectors: "np.ndarray", centroids: "np.ndarray", chunk: int = 65536) -> "np.ndarray":
+        return np.concatenate(
+            [
+                np.argmax(vectors[start : start + chunk] @ centroids.T, axis=1)
+                for start in range(0, len(vectors), chunk)
+            ]
+        )
+
+    @staticmethod
+    def _update(sample: "np.ndarray", assign: "np.ndarray", centroids: "np.ndarray") -> "np.ndarray":
+        order = np.argsort(assign, kind="stable")
+        clusters, starts = np.unique(assign[order], return_index=True)
+        updated = centroids.copy()
+        # Empty lists keep their previous centroid.
+        updated[clusters] = _unit_rows(np.add.reduceat(sample[order], starts, axis=0))
+        return updated
+
+    def search(self, queries: "np.ndarray", top_k: int) -> tuple["np.ndarray", "np.ndarray"]:
+        scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        positions = np.full((len(queries), top_k), -1, dtype=np.int64)
+        probes = np.argpartition(-(queries @ self.centroids.T), self.nprobe - 1, axis=1)[:, : self.nprobe]
+        for row, (query, probe) in enumerate(zip(queries, probes)):
+            ranges = [
+                (self.offsets[c], self.offsets[c + 1]) for c in probe if self.offsets[c + 1] > self.offsets[c]
+            ]
+            if not ranges:
+                continue
+            candidate = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+            dots = np.concatenate([self.vectors[start:stop] @ query for start, stop in ranges])
+            take = min(top_k, len(dots))
+            best = np.argpartition(-dots, take - 1)[:take]
+            best = best[np.argsort(-dots[best], kind="stable")]
+            scores[row, :take] = dots[best]
+            positions[row, :take] = self.order[candidate[best]]
+        return scores, positions
+
+
+class FaissANNIndex:
+    # Any faiss.index_factory spec over unit vectors with inner product, e.g.
+    # "HNSW32" or "IVF1024,PQ32"; trained on (a sample of) the snapshot itself.
+    def __init__(self, vectors: "np.ndarray", spec: str, nprobe: int = ANN_NPROBE) -> None:
+        self.index = faiss.index_factory(vectors.shape[1], spec, faiss.METRIC_INNER_PRODUCT)
+        if not self.index.is_trained:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), size=min(len(vectors), 256 * 1024), replace=False)]
+            self.index.train(sample)
+        self.index.add(vectors)
+        self.spec = spec
+        self.nprobe = nprobe
+
+    def search(self, queries: "np.ndarray", top_k: int) -> tuple["np.ndarray", "np.ndarray"]:
+        params = faiss.ParameterSpace()
+        if "IVF" in self.spec:
+            params.set_index_parameter(self.index, "nprobe", self.nprobe)
+        if "HNSW" in self.spec:
+            params.set_index_parameter(self.index, "efSearch", max(64, top_k))
+        return self.index.search(np.ascontiguousarray(queries, dtype=np.float32), top_k)
+
+
+class ANNVectorStore(NumpyVectorStore):
+    # The flat matrix stays the source of truth (upserts, deletes, checkpoints
+    # work as before). An approximate index is built from a snapshot of it in a
+    # background thread; rows changed since that snapshot are scored exactly on
+    # every query and their stale index entries are dropped, so writes are
+    # visible immediately. Small partitions are never indexed and stay exact.
+    def __init__(
+        self,
+        dim: int = 16,
+        capacity: int = 64,
+        build_index: Callable[["np.ndarray"], Any] | None = None,
+        min_train: int = ANN_MIN_TRAIN,
+    ) -> None:
+        super().__init__(dim=dim, capacity=capacity)
+        self.build_index = build_index or IVFIndex
+        self.min_train = min_train
+        self._ann: tuple[Any, list[RecordKey]] | None = None
+        self._built_size = 0
+        self._dirty: set[RecordKey] = set()
+        self._since_snapshot: set[RecordKey] | None = None
+        self._generation = 0
+        self._builder: threading.Thread | None = None
+        self._ann_lock = threading.Lock()
+
+    def _touch(self, key: RecordKey) -> None:
+        with self._ann_lock:
+            self._dirty.add(key)
+            if self._since_snapshot is not None:
+                self._since_snapshot.add(key)
+
+    def upsert(self, key: RecordKey, vector: list[float], metadata: dict[str, Any]) -> None:
+        super().upsert(key, vector, metadata)
+        self._touch(key)
+
+    def delete(self, key: RecordKey) -> bool:
+        removed = super().delete(key)
+        if removed:
+            self._touch(key)
+        return removed
+
+    def clear(self) -> None:
+        super().clear()
+        with self._ann_lock:
+            self._generation += 1
+            self._ann = None
+            self._built_size = 0
+            self._dirty = set()
+
+    @property
+    def building(self) -> bool:
+        return self._builder is not None
+
+    def _needs_build(self) -> bool:
+        size = len(self._keys)
+        if size < self.min_train or self._builder is not None:
+            return False
+        if self._ann is None:
+            return True
+        return size > 2 * self._built_size or len(self._dirty) > ANN_REBUILD_FRACTION * self._built_size
+
+    def train(self, background: bool = True) -> None:
+        # Snapshot on the calling thread (callers serialize writes), build off it.
+        vectors = _unit_rows(np.asarray(self.matrix, dtype=np.float32))
+        keys = list(self._keys)
+        with self._ann_lock:
+            self._since_snapshot = set()
+            generation = self._generation
+
+        def build() -> None:
+            try:
+                index = self.build_index(vectors)
+                with self._ann_lock:
+                    if generation == self._generation:
+                        self._ann = (index, keys)
+                        self._built_size = len(keys)
+                        self._dirty = self._since_snapshot or set()
+            finally:
+                with self._ann_lock:
+                    self._since_snapshot = None
+                    self._builder = None
+
+        if not background:
+            build()
+            return
+        self._builder = threading.Thread(target=build, name="ann-build", daemon=True)
+        self._builder.start()
+
+    def wait_for_build(self, timeout: float | None = None) -> None:
+        builder = self._builder
+        if builder is not None:
+            builder.join(timeout)
+
+    def search_scored(
+        self, vector: list[float], top_k: int = 6
+    ) -> list[tuple[float, VectorRecord]]:
+        return self.search_many_scored([vector], top_k)[0]
+
+    def search_many_scored(
+        self, vectors: list[list[float]], top_k: int = 6
+    ) -> list[list[tuple[float, VectorRecord]]]:
+        if not self._keys or top_k <= 0:
+            return [[] for _ in vectors]
+        if self._needs_build():
+            self.train()
+        ann = self._ann
+        if ann is None:
+            return super().search_many_scored(vectors, top_k)
+        index, snapshot_keys = ann
+        with self._ann_lock:
+            dirty = set(self._dirty)
+        queries = _unit_rows(np.asarray(vectors, dtype=np.float32))
+        # Stale entries are filtered after the search, so ask for enough spares.
+        scores, positions = index.search(queries, top_k + min(len(dirty), 4 * top_k))
+        delta_rows = np.asarray([self._rows[key] for key in dirty if key in self._rows], dtype=np.int64)
+        delta_scores = None
+        if len(delta_rows):
+            norms = self.norms[delta_rows]
+            dots = queries @ self.matrix[delta_rows].T
+            delta_scores = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+        results = []
+        for row in range(len(queries)):
+            merged = [
+                (float(score), self.records[snapshot_keys[position]])
+                for score, position in zip(scores[row], positions[row])
+                if position >= 0
+                and snapshot_keys[position] not in dirty
+                and snapshot_keys[position] in self._rows
+            ]
+            if delta_scores is not None:
+                merged.extend(
+                    (float(score), self.records[self._keys[delta_row]])
+                    for score, delta_row in zip(delta_scores[row], delta_rows)
+                )
+            merged.sort(key=lambda item: item[0], reverse=True)
+            results.append(merged[:top_k])
+        return results
+
+
+@dataclass(frozen=True)
+class ANNStoreFactory:
+    # backend is "ivf" (NumPy) or a faiss.index_factory spec such as "HNSW32".
+    backend: str = "ivf"
+    nprobe: int = ANN_NPROBE
+    min_train: int = ANN_MIN_TRAIN
+
+    def build_index(self, vectors: "np.ndarray") -> Any:
+        if self.backend == "ivf":
+            return IVFIndex(vectors, nprobe=self.nprobe)
+        return FaissANNIndex(vectors, self.backend, nprobe=self.nprobe)
+
+    def __call__(self, dim: int) -> ANNVectorStore:
+        return ANNVectorStore(dim=dim, build_index=self.build_index, min_train=self.min_train)
+
+    def from_arrays(
+        self,
+        dim: int,
+        matrix: "np.ndarray",
+        norms: "np.ndarray",
+        metadatas: list[dict[str, Any]],
+    ) -> ANNVectorStore:
+        store = ANNVectorStore.from_arrays(dim, matrix, norms, metadatas)
+        store.build_index = self.build_index
+        store.min_train = self.min_train
+        return store
+
+
+class PartitionedVectorStore:
+    def __init__(self, dim: int, factory: Callable[[int], VectorStore]) -> None:
+        self.dim = dim
+        self.factory = factory
+        self.partitions: dict[str, VectorStore] = {}
+        self._owners: dict[RecordKey, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    def partition(self, ticker: str) -> VectorStore | None:
+        return self.partitions.get(ticker)
+
+    def attach(self, ticker: str, store: VectorStore) -> None:
+        self.partitions[ticker] = store
+        for key in store.records:
+            self._owners[key] = ticker
+
+    def add(self, vector: list[float], metadata: dict[str, Any]) -> None:
+        self.upsert(record_key(metadata), vector, metadata)
+
+    def upsert(self, key: RecordKey, vector: list[float], metadata: dict[str, Any]) -> None:
+        ticker = metadata["ticker"]
+        if self._owners.get(key, ticker) != ticker:
+            self.delete(key)
+        store = self.partitions.get(ticker)
+        if store is None:
+            store = self.partitions[ticker] = self.factory(self.dim)
+        store.upsert(key, vector, metadata)
+        self._owners[key] = ticker
+
+    def delete(self, key: RecordKey) -> bool:
+        ticker = self._owners.pop(key, None)
+        if ticker is None:
+            return False
+        store = self.partitions[ticker]
+        store.delete(key)
+        if not len(store):
+            del self.partitions[ticker]
+        return True
+
+    def clear(self) -> None:
+        self.partitions.clear()
+        self._owners.clear()
+
+    def get(self, key: RecordKey) -> VectorRecord | None:
+        ticker = self._owners.get(key)
+        if ticker is None:
+            return None
+        return self.partitions[ticker].get(key)
+
+    def search_scored(
+        self, vector: list[float], top_k: int = 6, ticker: str | None = None
+    ) -> list[tuple[float, VectorRecord]]:
+        if ticker is not None:
+            store = self.partitions.get(ticker)
+            return store.search_scored(vector, top_k) if store else []
+        scored = []
+        for store in self.partitions.values():
+            scored.extend(store.search_scored(vector, top_k))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:top_k]
+
+    def search_many_scored(
+        self, vectors: list[list[float]], top_k: int = 6, ticker: str | None = None
+    ) -> list[list[tuple[float, VectorRecord]]]:
+        if ticker is not None:
+            store = self.partitions.get(ticker)
+            return store.search_many_scored(vectors, top_k) if store else [[] for _ in vectors]
+        return [self.search_scored(vector, top_k) for vector in vectors]
+
+    def search(
+        self, vector: list[float], top_k: int = 6, ticker: str | None = None
+    ) -> list[VectorRecord]:
+        return [record for _, record in self.search_scored(vector, top_k, ticker=ticker)]
+
+
+def cosine_similarity(vec_a: list[float], vec_b: list[float]) -> float:
+    dot = sum(a * b for a, b in zip(vec_a, vec_b))
+    norm_a = math.sqrt(sum(a * a for a in vec_a))
+    norm_b = math.sqrt(sum(b * b for b in vec_b))
+    if norm_a == 0 or norm_b == 0:
+        return 0.0
+    return dot / (norm_a * norm_b)
+
+
+def default_store_factory() -> Callable[[int], VectorStore]:
+    # APP_VECTOR_INDEX: "flat" (exact), "ivf" (NumPy), or a faiss index_factory
+    # spec such as "HNSW32" / "IVF1024,PQ32" (falls back to "ivf" without faiss).
+    backend = os.getenv("APP_VECTOR_INDEX", "flat")
+    if backend != "flat" and NUMPY_AVAILABLE:
+        return ANNStoreFactory(backend if backend == "ivf" or FAISS_AVAILABLE else "ivf")
+    if FAISS_AVAILABLE:
+        return FaissVectorStore
+    if NUMPY_AVAILABLE:
+        return NumpyVectorStore
+    return VectorStore
+
+
+INDEX_FORMAT_VERSION = 2
+
+
+def _write_atomic(path: Path, write: Callable[[Path], None]) -> None:
+    # Per-writer temp name, so concurrent savers never write into each other's file.
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+@contextmanager
+def _save_lock(directory: Path) -> Iterator[None]:
+    # Serialises checkpoint writers across processes sharing the directory.
+    with open(directory / ".lock", "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _referenced_files(meta_path: Path) -> set[str]:
+    try:
+        meta = json.loads(meta_path.read_text())
+        return {meta["vectors"], meta["norms"]}
+    except (OSError, ValueError, KeyError):
+        return set()
+
+
+def save_partitioned(
+    store: PartitionedVectorStore, directory: Path, high_water: int, embedder: str | None = None
+) -> None:
+    # Rows are laid out partition by partition so a loader can hand every ticker
+    # a zero-copy slice of one memory-mapped matrix.
+    directory.mkdir(parents=True, exist_ok=True)
+    blocks = []
+    partitions: dict[str, list[int]] = {}
+    metadatas: list[dict[str, Any]] = []
+    for ticker, sub in store.partitions.items():
+        vectors, sub_metadatas = sub.export()
+        partitions[ticker] = [len(metadatas), len(sub_metadatas)]
+        blocks.append(np.asarray(vectors, dtype=np.float32).reshape(-1, store.dim))
+        metadatas.extend(sub_metadatas)
+    matrix = np.concatenate(blocks) if blocks else np.zeros((0, store.dim), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1).astype(np.float32)
+
+    meta_path = directory / "meta.json"
+    with _save_lock(directory):
+        # New generations get fresh file names: other workers may still map the old ones.
+        generation = f"{time.time_ns()}-{os.getpid()}"
+        vectors_name = f"vectors-{generation}.f32"
+        norms_name = f"norms-{generation}.f32"
+        _write_atomic(directory / vectors_name, matrix.tofile)
+        _write_atomic(directory / norms_name, norms.tofile)
+
+        previous = _referenced_files(meta_path)
+        meta = {
+            "format": INDEX_FORMAT_VERSION,
+            "dim": store.dim,
+            "embedder": embedder,
+            "high_water": high_water,
+            "count": len(metadatas),
+            "vectors": vectors_name,
+            "norms": norms_name,
+            "partitions": partitions,
+            "records": metadatas,
+        }
+        _write_atomic(meta_path, lambda path: path.write_text(json.dumps(meta)))
+
+        # Only generations no sidecar references are removed; any other writer's
+        # in-flight files are behind the lock, so none can be caught here.
+        keep = previous | {vectors_name, norms_name}
+        for path in list(directory.glob("vectors-*.f32")) + list(directory.glob("norms-*.f32")):
+            if path.name not in keep:
+                path.unlink(missing_ok=True)
+
+
+def load_partitioned(
+    store: PartitionedVectorStore, directory: Path, embedder: str | None = None
+) -> int | None:
+    meta_path = directory / "meta.json"
+    if not NUMPY_AVAILABLE or not meta_path.exists():
+        return None
+    try:
+        meta = json.loads(meta_path.read_text())
+        if meta["format"] != INDEX_FORMAT_VERSION or meta["dim"] != store.dim:
+            return None
+        # Vectors from another model (or model settings) are not comparable to
+        # the queries this process will embed, even when the dimension matches.
+        if meta.get("embedder") != embedder:
+            return None
+        count = meta["count"]
+        if count:
+            shape = (count, store.dim)
+            matrix = np.memmap(directory / meta["vectors"], dtype=np.float32, mode="r", shape=shape)
+            norms = np.memmap(directory / meta["norms"], dtype=np.float32, mode="r", shape=(count,))
+        else:
+            matrix = np.zeros((0, store.dim), dtype=np.float32)
+            norms = np.zeros(0, dtype=np.float32)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    store.clear()
+    records = meta["records"]
+    from_arrays = getattr(store.factory, "from_arrays", None)
+    for ticker, (offset, size) in meta["partitions"].items():
+        metadatas = records[offset : offset + size]
+        if from_arrays is not None:
+            sub = from_arrays(
+                store.dim, matrix[offset : offset + size], norms[offset : offset + size], metadatas
+            )
+        else:
+            sub = store.factory(store.dim)
+            for row, metadata in enumerate(metadatas):
+                sub.add(matrix[offset + row].tolist(), metadata)
+        store.attach(ticker, sub)
+    return int(meta["high_water"])
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import importlib
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+
+def setup_jobs(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "test.db"))
+    import app.db as db
+
+    importlib.reload(db)
+    db.init_db()
+    import app.rag as rag
+
+    importlib.reload(rag)
+    rag.seed_profiles_if_missing()
+    import app.jobs as jobs
+
+    return db, jobs
+
+
+def news(news_id, content):
+    from app.models import NewsIn
+
+    return NewsIn(
+        id=news_id,
+        source="mock",
+        published_at="2025-01-01T10:00:00Z",
+        title="Apple update",
+        content=content,
+    )
+
+
+def test_ingest_enqueues_and_workers_complete_jobs(tmp_path, monkeypatch):
+    db, jobs = setup_jobs(tmp_path, monkeypatch)
+    from app.ingest import ingest_news_many
+
+    responses = ingest_news_many(
+        [
+            news("news-1", "Apple faces a new lawsuit over App Store fees."),
+            news("news-2", "Apple faces a new lawsuit over App Store fees."),
+        ],
+        enqueue=True,
+    )
+    assert responses[0].job_id is not None
+    assert responses[1].deduped and responses[1].job_id is None
+    assert jobs.get_job(responses[0].job_id).status == "queued"
+
+    pool = jobs.AnalysisWorkerPool(workers=1)
+    assert pool.drain() == 1
+
+    job = jobs.get_job(responses[0].job_id)
+    assert job.status == "done" and job.attempts == 1
+    assert job.result.news_id == "news-1"
+    assert job.result.results[0].ticker == "AAPL"
+    assert db.fetch_one("SELECT COUNT(*) AS n FROM analysis_runs")["n"] == 1
+
+
+def test_failures_back_off_then_fail_permanently(tmp_path, monkeypatch):
+    db, jobs = setup_jobs(tmp_path, monkeypatch)
+    from app.ingest import ingest_news
+    from app.llm_analyzer import LLMClient, SyncLLMClientAdapter
+
+    class BrokenClient(LLMClient):
+        def analyze(self, ticker, article, context):
+            raise ConnectionError("provider unavailable")
+
+    job_id = ingest_news(news("news-1", "Apple faces a new lawsuit."), enqueue=True).job_id
+    pool = jobs.AnalysisWorkerPool(client_factory=lambda: SyncLLMClientAdapter(BrokenClient()))
+
+    assert pool.drain() == 1
+    job = jobs.get_job(job_id)
+    assert job.status == "queued" and job.attempts == 1
+    assert "provider unavailable" in job.last_error
+    # Backing off: nothing is due yet.
+    assert pool.drain() == 0
+
+    monkeypatch.setattr(jobs, "BACKOFF_SECONDS", 0.0)
+    db.execute("UPDATE analysis_jobs SET available_at = 0")
+    assert pool.drain() == jobs.MAX_ATTEMPTS - 1
+    job = jobs.get_job(job_id)
+    assert job.status == "failed" and job.attempts == jobs.MAX_ATTEMPTS
+
+
+def test_expired_lease_is_reclaimed_and_stale_worker_is_fenced(tmp_path, monkeypatch):
+    db, jobs = setup_jobs(tmp_path, monkeypatch)
+    (job_id,) = jobs.enqueue(["news-1"])
+
+    (stale,) = jobs.claim("worker-a", lease_seconds=0.0)
+    assert jobs.claim("worker-b", lease_seconds=60.0)[0].id == job_id
+    assert jobs.claim("worker-c") == []
+
+    assert not jobs.complete(stale, {"news_id": "news-1", "results": []})
+    (current,) = db.fetch_all("SELECT lease_owner, attempts FROM analysis_jobs")
+    assert current["lease_owner"] == "worker-b" and current["attempts"] == 2
+
+
+def test_worker_survives_database_errors(tmp_path, monkeypatch):
+    import sqlite3
+    import time
+
+    db, jobs = setup_jobs(tmp_path, monkeypatch)
+    from app.ingest import ingest_news
+
+    job_id = ingest_news(news("news-1", "Apple faces a new lawsuit."), enqueue=True).job_id
+    original_claim = jobs.claim
+    failures = []
+
+    def flaky_claim(*args, **kwargs):
+        if len(failures) < 2:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return original_claim(*args, **kwargs)
+
+    monkeypatch.setattr(jobs, "claim", flaky_claim)
+    pool = jobs.AnalysisWorkerPool(workers=1, poll_interval=0.01)
+    pool.start()
+    try:
+        deadline = time.monotonic() + 5
+        while jobs.get_job(job_id).status != "done" and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        pool.stop(timeout=5)
+    assert len(failures) == 2
+    assert jobs.get_job(job_id).status == "done"
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import importlib
+import json
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+STORIES = [
+    ("Apple sued", "Apple faces a patent lawsuit over iPhone modems."),
+    ("Tesla recall", "Tesla recalls vehicles after a steering defect."),
+    ("Apple earnings", "Apple reported record services earnings this quarter."),
+    ("Apple and Tesla", "Apple and Tesla both face new regulatory probes in Europe."),
+    ("Tesla earnings", "Tesla earnings missed estimates on weaker margins."),
+    ("Apple settles", "Apple lawsuit settled with the patent holder."),
+]
+
+
+def write_archive(path, stories):
+    with open(path, "w", encoding="utf-8") as handle:
+        for idx, (title, content) in enumerate(stories):
+            record = {
+                "id": f"news-{idx}",
+                "source": "archive",
+                "published_at": f"2025-01-0{idx + 1}T10:00:00Z",
+                "title": title,
+                "content": content,
+            }
+            handle.write(json.dumps(record) + "\n")
+    return path
+
+
+def setup_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "live.db"))
+    import app.db as db
+
+    importlib.reload(db)
+    import app.rag as rag
+
+    importlib.reload(rag)
+    import app.backtest as backtest
+
+    return db, backtest
+
+
+def final_state(db):
+    rows = db.fetch_all("SELECT ticker, event_type, status, source_id FROM state_events")
+    return sorted(tuple(row) for row in rows)
+
+
+def test_replay_matches_sequential_pipeline_without_lookahead(tmp_path, monkeypatch):
+    db, backtest = setup_db(tmp_path, monkeypatch)
+    archive = write_archive(tmp_path / "archive.ndjson", STORIES)
+
+    monkeypatch.setenv("APP_INDEX_DIR", str(tmp_path / "live.index"))
+    report = backtest.run_backtest(archive, tmp_path / "scratch", chunk_size=4)
+    # The caller's database and index are untouched by the replay.
+    assert db.DB_PATH == tmp_path / "live.db"
+    assert not (tmp_path / "live.index").exists()
+    if importlib.import_module("app.vector_store").NUMPY_AVAILABLE:
+        assert (tmp_path / "scratch" / "part-0.index" / "meta.json").exists()
+    assert report.news == len(STORIES) and report.analyzed == len(STORIES)
+    assert report.stages["ingest"].items == len(STORIES)
+    assert report.stages["retrieve"].items == report.stages["analyze"].items == 7
+    assert "rate=" in backtest.format_report(report)
+    db.DB_PATH = tmp_path / "scratch" / "part-0.db"
+    replayed = final_state(db)
+    first_run = db.fetch_one("SELECT retrieved_chunks_json FROM analysis_runs WHERE news_id = 'news-0'")
+    assert "event" not in {chunk["layer"] for chunk in json.loads(first_run[0])["AAPL"]}
+
+    # The online path, one article at a time, ends in the same state.
+    from app.ingest import ingest_news
+    from app.ingest import iter_ndjson
+    from app.pipeline import analyze_news
+
+    db.DB_PATH = tmp_path / "sequential.db"
+    db.init_db()
+    rag = importlib.import_module("app.rag")
+    rag.seed_profiles_if_missing()
+    with open(archive, encoding="utf-8") as stream:
+        for item in iter_ndjson(stream):
+            ingest_news(item, enqueue=False)
+            analyze_news(item.id)
+    assert final_state(db) == replayed
+
+
+def test_single_partition_never_repoints_the_calling_process(tmp_path, monkeypatch):
+    db, backtest = setup_db(tmp_path, monkeypatch)
+    archive = write_archive(tmp_path / "archive.ndjson", STORIES[:2])
+
+    def swapped_in_caller(path):
+        raise AssertionError("the replay repointed the calling process")
+
+    # A spawned child imports the module afresh and never sees this patch.
+    monkeypatch.setattr(backtest, "_scratch_database", swapped_in_caller)
+    report = backtest.run_backtest(archive, tmp_path / "scratch")
+    assert report.partitions == 1 and report.news == 2
+    assert db.DB_PATH == tmp_path / "live.db"
+
+
+def test_partitions_split_tickers_across_processes(tmp_path, monkeypatch):
+    db, backtest = setup_db(tmp_path, monkeypatch)
+    archive = write_archive(tmp_path / "archive.ndjson", STORIES)
+
+    report = backtest.run_backtest(archive, tmp_path / "scratch", partitions=2)
+    assert report.partitions == 2
+    assert report.stages["analyze"].items == 7
+    per_partition = []
+    for idx in range(2):
+        db.DB_PATH = tmp_path / "scratch" / f"part-{idx}.db"
+        per_partition.append({row[0] for row in final_state(db)})
+    assert per_partition[0].isdisjoint(per_partition[1])
+    assert per_partition[0] | per_partition[1] == {"AAPL", "TSLA"}
+
+
+def test_out_of_order_archive_is_rejected(tmp_path, monkeypatch):
+    db, backtest = setup_db(tmp_path, monkeypatch)
+    archive = write_archive(tmp_path / "archive.ndjson", STORIES)
+    lines = archive.read_text().splitlines()
+    archive.write_text("\n".join([lines[1], lines[0]]) + "\n")
+
+    with pytest.raises(ValueError, match="time-ordered"):
+        backtest.run_backtest(archive, tmp_path / "scratch")
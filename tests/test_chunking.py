@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import importlib
+import json
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+PROFILE = (
+    "Apple designs the iPhone, Mac, iPad and wearables, and sells them to consumers worldwide. "
+    "Services such as the App Store, iCloud and Apple Music are a growing share of revenue. "
+    "It is based in Cupertino."
+)
+
+
+def test_sentence_chunks_keep_their_ids_when_other_sentences_change():
+    from app.chunking import chunk_text
+
+    chunks = chunk_text(PROFILE)
+    assert [PROFILE[chunk.start : chunk.end] for chunk in chunks] == [chunk.text for chunk in chunks]
+    assert len(chunks) == 2 and chunks[-1].text.endswith("Cupertino.")
+
+    edited = "Apple is a consumer electronics company with a very large and loyal installed base. " + PROFILE
+    edited_chunks = chunk_text(edited)
+    assert {chunk.chunk_id for chunk in chunks} < {chunk.chunk_id for chunk in edited_chunks}
+    moved = {chunk.chunk_id: chunk for chunk in edited_chunks}[chunks[0].chunk_id]
+    assert edited[moved.start : moved.end] == chunks[0].text
+
+
+def test_snapshot_chunks_follow_events_and_locate_their_json():
+    from app.chunking import chunk_snapshot
+
+    event = {
+        "event_type": "lawsuit",
+        "summary": "Apple sued over App Store fees.",
+        "start_ts": "2025-01-01T10:00:00",
+        "severity": "high",
+        "impact_score": -0.4,
+        "horizon": "long",
+        "confidence": 0.7,
+        "source_id": "news-1",
+    }
+    state = {
+        "ticker": "AAPL",
+        "open_events": [event],
+        "recent_catalysts": [{**event, "status": "open"}],
+        "key_risks": [event],
+        "last_updated": "2025-01-01T10:00:00",
+    }
+    document = json.dumps(state)
+    chunks = chunk_snapshot(document)
+    assert [chunk.chunk_id for chunk in chunks] == [
+        "open_events:lawsuit:news-1",
+        "key_risks:lawsuit:news-1",
+        "recent_catalysts",
+    ]
+    assert json.loads(document[chunks[0].start : chunks[0].end]) == event
+    assert chunks[0].text == "Open lawsuit (high, impact -0.40, long, since 2025-01-01T10:00:00)"
+    # The event's own text is indexed as an event chunk, not repeated here.
+    assert "App Store" not in chunks[0].text and "App Store" not in chunks[1].text
+
+    state["last_updated"] = "2025-02-01T00:00:00"
+    assert chunk_snapshot(json.dumps(state)) == chunks
+
+
+def test_best_window_prefers_the_span_matching_the_query():
+    from app.chunking import best_window
+
+    filler = " ".join(["filler"] * 60)
+    text = f"{filler} the antitrust lawsuit over App Store fees {filler}"
+    window = best_window(text, "App Store lawsuit", width=80)
+    assert len(window) <= 80 and "lawsuit" in window and "App Store" in window
+    assert best_window("short text", "anything") == "short text"
+
+
+def test_snapshot_updates_reembed_only_changed_chunks(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "test.db"))
+    import app.db as db
+
+    importlib.reload(db)
+    db.init_db()
+    import app.rag as rag
+
+    importlib.reload(rag)
+    rag.seed_profiles_if_missing()
+    rag.ensure_store()
+    import app.state_manager as state_manager
+    from app.models import LLMImpactResult
+
+    def analysis(event_type, summary):
+        return LLMImpactResult.model_validate(
+            {
+                "ticker": "AAPL",
+                "event_type": event_type,
+                "is_new_information": True,
+                "impact_score": -0.3,
+                "horizon": "long",
+                "severity": "high",
+                "confidence": 0.7,
+                "risk_flags": [],
+                "contradiction_flags": ["none"],
+                "summary": summary,
+                "evidence": "Court filing.",
+                "citations": [],
+            }
+        )
+
+    state_manager.apply_event_update(
+        "AAPL", "news-1", datetime.utcnow(), analysis("lawsuit", "Apple sued over App Store fees.")
+    )
+    before = {record.metadata["chunk_id"] for record in rag.document_records("state", "AAPL")}
+    assert "AAPL#open_events:lawsuit:news-1" in before
+
+    misses = rag.EMBEDDER.misses
+    state_manager.apply_event_update(
+        "AAPL", "news-2", datetime.utcnow(), analysis("regulatory", "EU opens a probe into Apple.")
+    )
+    after = {record.metadata["chunk_id"] for record in rag.document_records("state", "AAPL")}
+    assert before - {"AAPL#recent_catalysts"} < after
+    # New event (summary + evidence), its open-event and key-risk chunks, and the catalyst list.
+    assert rag.EMBEDDER.misses - misses == 4
+
+    chunks = rag.retrieve_context("AAPL", "EU regulatory probe", top_k=6)
+    state_chunks = [chunk for chunk in chunks if chunk.layer == "state"]
+    assert state_chunks and all(chunk.source_id == "AAPL" and chunk.chunk_id for chunk in state_chunks)
+    assert all(len(chunk.snippet) <= 280 for chunk in chunks)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import importlib
+import sqlite3
+import threading
+
+import pytest
+
+
+def setup_db(tmp_path, monkeypatch, pool_size="2"):
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setenv("APP_DB_POOL_SIZE", pool_size)
+    import app.db as db
+
+    importlib.reload(db)
+    db.init_db()
+    return db
+
+
+def test_connections_are_reused_with_pragmas(tmp_path, monkeypatch):
+    db = setup_db(tmp_path, monkeypatch)
+    db.upsert_profile("AAPL", "Apple")
+    assert db.fetch_one("SELECT ticker FROM profile")["ticker"] == "AAPL"
+
+    pool = db.get_pool()
+    assert pool._created == 1
+    with db.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        with db.connection() as nested:
+            assert nested is conn
+
+
+def test_pool_is_bounded_across_threads(tmp_path, monkeypatch):
+    db = setup_db(tmp_path, monkeypatch)
+    errors = []
+
+    def worker(idx):
+        try:
+            for step in range(20):
+                db.upsert_profile(f"T{idx}", f"profile {step}")
+                db.fetch_all("SELECT * FROM profile")
+        except Exception as exc:  # pragma: no cover - surfaced by the assert below
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker, args=(idx,)) for idx in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert db.get_pool()._created <= 2
+    assert len(db.fetch_all("SELECT * FROM profile")) == 6
+
+
+def test_after_commit_callbacks_do_not_hold_a_connection(tmp_path, monkeypatch):
+    # Listeners take locks whose holders may be waiting for a pooled connection
+    # (retrieval holds the index lock, then reads); that must not deadlock.
+    db = setup_db(tmp_path, monkeypatch)
+    index_lock = threading.Lock()
+    in_callback = threading.Semaphore(0)
+
+    def listener():
+        in_callback.release()
+        with index_lock:
+            pass
+
+    def writer(idx):
+        with db.transaction():
+            db.upsert_profile(f"T{idx}", "profile")
+            db.on_commit(listener)
+
+    with index_lock:
+        writers = [threading.Thread(target=writer, args=(idx,), daemon=True) for idx in range(2)]
+        for thread in writers:
+            thread.start()
+        for _ in writers:
+            assert in_callback.acquire(timeout=5)
+        reader = threading.Thread(target=db.fetch_one, args=("SELECT COUNT(*) FROM profile",), daemon=True)
+        reader.start()
+        reader.join(timeout=5)
+        assert not reader.is_alive()
+    for thread in writers:
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+
+
+def test_failed_autocommit_write_releases_the_write_lock(tmp_path, monkeypatch):
+    db = setup_db(tmp_path, monkeypatch)
+    db.execute("INSERT INTO app_meta (key, value) VALUES ('k', 1)")
+    with pytest.raises(sqlite3.IntegrityError):
+        db.executemany("INSERT INTO app_meta (key, value) VALUES (?, ?)", [("j", 1), ("k", 2)])
+    with db.connection() as conn:
+        assert not conn.in_transaction
+
+    # Another connection can take the write lock straight away.
+    other = db.get_connection()
+    other.execute("PRAGMA busy_timeout=100")
+    other.execute("INSERT INTO app_meta (key, value) VALUES ('m', 1)")
+    other.commit()
+    other.close()
+    assert db.fetch_one("SELECT COUNT(*) AS n FROM app_meta")["n"] == 2
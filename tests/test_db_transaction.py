@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import importlib
+
+import pytest
+
+
+def setup_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "test.db"))
+    import app.db as db
+
+    importlib.reload(db)
+    db.init_db()
+    return db
+
+
+def test_transaction_commits_once_and_defers_notifications(tmp_path, monkeypatch):
+    db = setup_db(tmp_path, monkeypatch)
+    seen = []
+    db.add_row_listener(lambda layer, source_id, row, seq: seen.append(source_id))
+
+    with db.transaction():
+        db.upsert_profile("AAPL", "Apple")
+        with db.transaction():
+            db.upsert_profile("TSLA", "Tesla")
+        assert seen == []
+        assert db.in_transaction()
+
+    assert seen == ["AAPL", "TSLA"]
+    assert not db.in_transaction()
+    assert len(db.fetch_all("SELECT * FROM profile")) == 2
+
+
+def test_transaction_rolls_back_everything(tmp_path, monkeypatch):
+    db = setup_db(tmp_path, monkeypatch)
+    seen = []
+    db.add_row_listener(lambda layer, source_id, row, seq: seen.append(source_id))
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.upsert_profile("AAPL", "Apple")
+            db.store_snapshot("AAPL", {"ticker": "AAPL"})
+            raise RuntimeError("crash mid-run")
+
+    assert seen == []
+    assert db.fetch_all("SELECT * FROM profile") == []
+    assert db.fetch_all("SELECT * FROM index_changes") == []
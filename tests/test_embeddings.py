@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import importlib
+import math
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+
+def setup_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "test.db"))
+    import app.db as db
+
+    importlib.reload(db)
+    db.init_db()
+    return db
+
+
+def cosine(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+def test_hashed_ngrams_rank_related_text_higher():
+    from app import embeddings
+    from app.embeddings import HashedNGramEmbedder
+
+    embedder = HashedNGramEmbedder(dim=256)
+    query, related, unrelated = embedder.embed_many(
+        [
+            "Apple faces an antitrust lawsuit over App Store fees",
+            "Regulators filed a lawsuit against Apple over its App Store",
+            "Tesla recalls vehicles after a steering defect",
+        ]
+    )
+    assert math.isclose(math.sqrt(cosine(query, query)), 1.0, rel_tol=1e-5)
+    assert cosine(query, related) > cosine(query, unrelated)
+    assert embedder.embed("") == [0.0] * 256
+
+    if embeddings.NUMPY_AVAILABLE:
+        text = "Apple faces an antitrust lawsuit"
+        vectorized = embedder.embed(text)
+        embeddings.NUMPY_AVAILABLE = False
+        try:
+            fallback = embedder.embed(text)
+        finally:
+            embeddings.NUMPY_AVAILABLE = True
+        assert all(math.isclose(a, b, abs_tol=1e-6) for a, b in zip(vectorized, fallback))
+
+
+def test_cache_embeds_each_text_once_per_provider(tmp_path, monkeypatch):
+    db = setup_db(tmp_path, monkeypatch)
+    from app.embeddings import CachedEmbedder, HashedNGramEmbedder
+
+    class CountingEmbedder(HashedNGramEmbedder):
+        calls: list[int] = []
+
+        def embed_many(self, texts):
+            self.calls.append(len(texts))
+            return super().embed_many(texts)
+
+    provider = CountingEmbedder(dim=32)
+    cached = CachedEmbedder(provider)
+    first = cached.embed_many(["alpha beta", "gamma", "alpha beta"])
+    assert provider.calls == [2]
+    assert first[0] == first[2]
+
+    again = CachedEmbedder(provider).embed_many(["gamma", "alpha beta", "delta"])
+    assert provider.calls == [2, 1]
+    assert [round(value, 5) for value in again[0]] == [round(value, 5) for value in first[1]]
+
+    CachedEmbedder(CountingEmbedder(dim=16)).embed("gamma")
+    assert db.fetch_one("SELECT COUNT(*) AS n FROM embedding_cache")["n"] == 4
+
+
+def test_checkpoint_from_another_embedder_is_not_loaded(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    db = setup_db(tmp_path, monkeypatch)
+    import app.rag as rag
+
+    importlib.reload(rag)
+    rag.seed_profiles_if_missing()
+    rag.ensure_store()
+    meta = (tmp_path / "test.index" / "meta.json").read_text()
+    assert rag.EMBEDDER.name in meta
+
+    store = rag.PartitionedVectorStore(dim=rag.EMBEDDER.dim, factory=rag.default_store_factory())
+    assert rag.load_partitioned(store, tmp_path / "test.index", rag.EMBEDDER.name) is not None
+    assert rag.load_partitioned(store, tmp_path / "test.index", "other-model") is None
+
+
+def test_configured_model_without_package_warns(monkeypatch, caplog):
+    from app import embeddings
+
+    monkeypatch.setenv("APP_EMBEDDING_MODEL", "/models/minilm")
+    monkeypatch.setattr(embeddings, "SENTENCE_TRANSFORMERS_AVAILABLE", False)
+    with caplog.at_level("WARNING", logger="app.embeddings"):
+        provider = embeddings.default_provider()
+    assert isinstance(provider, embeddings.HashedNGramEmbedder)
+    assert "/models/minilm" in caplog.text
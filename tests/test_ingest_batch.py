@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import importlib
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+
+def setup_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "test.db"))
+    import app.db as db
+
+    importlib.reload(db)
+    db.init_db()
+    return db
+
+
+def make_item(news_id, title, content="Body text."):
+    from app.models import NewsIn
+
+    return NewsIn(
+        id=news_id,
+        source="wire",
+        published_at="2025-01-01T10:00:00Z",
+        title=title,
+        content=content,
+    )
+
+
+def test_ingest_news_many_dedupes_within_batch_and_against_db(tmp_path, monkeypatch):
+    db = setup_db(tmp_path, monkeypatch)
+    from app.ingest import ingest_news, ingest_news_many
+
+    assert not ingest_news(make_item("old-1", "Apple earnings")).deduped
+
+    responses = ingest_news_many(
+        [
+            make_item("new-1", "Tesla launches truck"),
+            make_item("new-2", "Tesla   launches truck"),
+            make_item("new-3", "Apple earnings"),
+            make_item("old-1", "Different text, same id"),
+            make_item("new-4", "Macro outlook"),
+        ]
+    )
+
+    assert [response.deduped for response in responses] == [False, True, True, True, False]
+    assert responses[0].tickers == ["TSLA"]
+    assert len(db.fetch_all("SELECT * FROM news_clean")) == 3
+    assert len(db.fetch_all("SELECT * FROM news_raw")) == 3
+
+
+def test_batch_endpoint(tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+
+    setup_db(tmp_path, monkeypatch)
+    import app.main as main
+
+    importlib.reload(main)
+    client = TestClient(main.app)
+    payload = [
+        {
+            "id": f"news-{idx}",
+            "source": "wire",
+            "published_at": "2025-01-01T10:00:00Z",
+            "title": "Apple earnings" if idx % 2 else f"Tesla update {idx}",
+            "content": "Body",
+        }
+        for idx in range(4)
+    ]
+    resp = client.post("/ingest_news/batch", json=payload)
+    assert resp.status_code == 200
+    assert [item["deduped"] for item in resp.json()] == [False, False, False, True]
+
+
+def test_ndjson_cli_streams_in_chunks(tmp_path, monkeypatch, capsys):
+    import json
+
+    db = setup_db(tmp_path, monkeypatch)
+    import app.ingest as ingest
+
+    path = tmp_path / "news.ndjson"
+    lines = [
+        json.dumps(
+            {
+                "id": f"news-{idx}",
+                "source": "wire",
+                "published_at": "2025-01-01T10:00:00Z",
+                "title": f"Tesla update {idx % 5}",
+                "content": "Body",
+            }
+        )
+        for idx in range(12)
+    ]
+    lines.insert(3, "{not json")
+    path.write_text("\n".join(lines) + "\n")
+
+    chunk_sizes = []
+    original = ingest.ingest_news_many
+
+    def spy(items):
+        chunk_sizes.append(len(items))
+        return original(items)
+
+    monkeypatch.setattr(ingest, "ingest_news_many", spy)
+    assert ingest.main(["--ndjson", str(path), "--chunk-size", "4"]) == 0
+
+    assert chunk_sizes == [4, 4, 4]
+    assert len(db.fetch_all("SELECT * FROM news_clean")) == 5
+    assert "read=12 inserted=5 deduped=7 invalid=1" in capsys.readouterr().err
+
+
+def test_concurrent_overlapping_batches_insert_each_item_once(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    db = setup_db(tmp_path, monkeypatch)
+    from app.ingest import ingest_news_many
+
+    # Batches of 20 starting at 0, 10 and 5 share most of their items.
+    batches = [
+        [make_item(f"news-{idx}", f"Tesla update {idx}") for idx in range(start, start + 20)]
+        for start in (0, 10, 5)
+    ]
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        results = list(pool.map(ingest_news_many, batches))
+
+    assert sum(not response.deduped for responses in results for response in responses) == 30
+    assert db.fetch_one("SELECT COUNT(*) AS n FROM news_clean")["n"] == 30
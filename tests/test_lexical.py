@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+
+def test_bm25_updates_in_place_and_stays_per_ticker():
+    from app.lexical import BM25Index
+
+    index = BM25Index()
+    index.upsert(("event", "1"), "AAPL", "Apple faces an antitrust lawsuit over App Store fees.")
+    index.upsert(("event", "2"), "AAPL", "Apple raises full-year revenue guidance.")
+    index.upsert(("profile", "AAPL"), "AAPL", "Apple designs the iPhone, Mac and services.")
+    index.upsert(("event", "3"), "MSFT", "Microsoft faces a lawsuit over licensing.")
+
+    assert [key for _, key in index.search("AAPL", "new lawsuit filed", top_k=3)] == [("event", "1")]
+    assert [key for _, key in index.search("AAPL", "guidance cut", top_k=3)] == [("event", "2")]
+
+    index.upsert(("event", "2"), "AAPL", "Apple settles the lawsuit.")
+    assert index.search("AAPL", "guidance", top_k=3) == []
+    assert {key for _, key in index.search("AAPL", "lawsuit", top_k=3)} == {("event", "1"), ("event", "2")}
+
+    assert index.delete(("event", "3"))
+    assert index.search("MSFT", "lawsuit") == [] and "MSFT" not in index.partitions
+    assert len(index) == 3
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    from app.lexical import reciprocal_rank_fusion
+
+    fused = reciprocal_rank_fusion([(["a", "b", "c"], 1.0), (["c", "b"], 1.0)])
+    assert [key for _, key in fused] == ["c", "b", "a"]
+    assert [key for _, key in reciprocal_rank_fusion([(["a"], 1.0), (["b"], 0.0)])] == ["a", "b"]
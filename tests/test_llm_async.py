@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("pydantic")
+pytest.importorskip("httpx")
+
+
+def test_http_client_coalesces_concurrent_requests():
+    from app.llm_analyzer import HTTPLLMClient, analyze_article_async, stub_transport
+
+    async def run():
+        client = HTTPLLMClient("http://llm.local", transport=stub_transport(), max_batch=8)
+        try:
+            results = await asyncio.gather(
+                *(
+                    analyze_article_async(ticker, "Company reported earnings.", [], client=client)
+                    for ticker in ["AAPL", "MSFT", "NVDA", "TSLA"]
+                )
+            )
+            many = await client.analyze_many([("AAPL", "Lawsuit filed.", [])] * 10)
+        finally:
+            await client.aclose()
+        return client, results, many
+
+    client, results, many = asyncio.run(run())
+    assert [result.ticker for result in results] == ["AAPL", "MSFT", "NVDA", "TSLA"]
+    assert all(result.event_type == "earnings" for result in results)
+    assert len(many) == 10
+    assert client.batches_sent == 3
+
+
+def test_http_client_reports_transport_errors():
+    import httpx
+
+    from app.llm_analyzer import HTTPLLMClient, analyze_article_async
+
+    transport = httpx.MockTransport(lambda request: httpx.Response(503))
+
+    async def run():
+        client = HTTPLLMClient("http://llm.local", transport=transport)
+        try:
+            return await analyze_article_async("AAPL", "text", [], client=client)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) is None
+
+
+def test_http_client_resolves_coalesced_calls_on_malformed_results():
+    import httpx
+
+    from app.llm_analyzer import HTTPLLMClient
+
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"results": ["oops", "oops"]}))
+
+    async def run():
+        client = HTTPLLMClient("http://llm.local", transport=transport)
+        try:
+            return await asyncio.wait_for(
+                asyncio.gather(client.analyze("AAPL", "text", []), client.analyze("MSFT", "text", [])),
+                timeout=5,
+            )
+        finally:
+            await client.aclose()
+
+    responses = asyncio.run(run())
+    assert [response.raw_json for response in responses] == [None, None]
+    assert all(response.error for response in responses)
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import importlib
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+
+def setup_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "test.db"))
+    import app.db as db
+
+    importlib.reload(db)
+    db.init_db()
+    return db
+
+
+def make_client():
+    from app.llm_analyzer import LLMClient
+
+    class CountingClient(LLMClient):
+        calls = 0
+
+        def analyze(self, ticker, article, context):
+            CountingClient.calls += 1
+            return super().analyze(ticker, article, context)
+
+    return CountingClient()
+
+
+def test_identical_analyses_skip_the_model(tmp_path, monkeypatch):
+    db = setup_db(tmp_path, monkeypatch)
+    from app.llm_analyzer import AnalysisCache, analyze_article
+    from app.models import RAGChunk
+
+    client = make_client()
+    cache = AnalysisCache(max_entries=8)
+    context = [RAGChunk(layer="profile", source_id="AAPL", snippet="Apple profile")]
+    article = "Apple reported earnings above expectations."
+
+    first = analyze_article("AAPL", article, context, client=client, cache=cache)
+    second = analyze_article("AAPL", article, context, client=client, cache=cache)
+    assert first == second
+    assert type(client).calls == 1
+    assert cache.stats()["hits"] == 1
+
+    other_context = [RAGChunk(layer="state", source_id="AAPL", snippet="new state")]
+    analyze_article("AAPL", article, other_context, client=client, cache=cache)
+    analyze_article("TSLA", article, context, client=client, cache=cache)
+    assert type(client).calls == 3
+
+    # A fresh process-local tier still hits the SQLite tier.
+    warm = AnalysisCache(max_entries=8)
+    analyze_article("AAPL", article, context, client=client, cache=warm)
+    assert type(client).calls == 3
+    assert warm.stats()["db_hits"] == 1
+    assert len(db.fetch_all("SELECT * FROM llm_cache")) == 3
+
+
+def test_cache_ttl_and_size_eviction(tmp_path, monkeypatch):
+    db = setup_db(tmp_path, monkeypatch)
+    from app.llm_analyzer import AnalysisCache
+
+    cache = AnalysisCache(max_entries=2, ttl_seconds=60, max_rows=3, evict_every=1000)
+    for idx in range(5):
+        cache.put(f"key-{idx}", {"idx": idx})
+    assert cache.get("key-0") == {"idx": 0}
+    cache.evict()
+    assert len(db.fetch_all("SELECT * FROM llm_cache")) == 3
+
+    expired = AnalysisCache(ttl_seconds=-1)
+    assert expired.get("key-4") is None
+    assert expired.stats()["misses"] == 1
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import importlib
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+STORY = (
+    "Apple reported quarterly earnings above expectations on Thursday, driven by strong "
+    "iPhone demand in China and record services revenue. The company also raised its "
+    "guidance for the holiday quarter and announced a larger share buyback program, "
+    "sending the stock higher in after-hours trading."
+)
+RECALL = (
+    "Tesla recalled about 200,000 vehicles in Europe on Monday after regulators found a "
+    "steering defect that could reduce control at high speed. Owners will receive a free "
+    "software update and inspection at service centers."
+)
+
+
+def setup_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "test.db"))
+    import app.db as db
+
+    importlib.reload(db)
+    db.init_db()
+    return db
+
+
+def make_item(news_id, title, content):
+    from app.models import NewsIn
+
+    return NewsIn(
+        id=news_id,
+        source="wire",
+        published_at="2025-01-01T10:00:00Z",
+        title=title,
+        content=content,
+    )
+
+
+def test_minhash_similarity():
+    from app.near_dup import minhash, pack, similarity, unpack
+
+    base = minhash(STORY)
+    assert similarity(base, minhash(STORY + " By Jane Doe, Reuters")) >= 0.8
+    assert similarity(base, minhash(RECALL)) < 0.2
+    assert unpack(pack(base)) == base
+
+
+def test_syndicated_copies_link_to_canonical(tmp_path, monkeypatch):
+    db = setup_db(tmp_path, monkeypatch)
+    from app.ingest import ingest_news, ingest_news_many
+    from app.pipeline import analyze_news
+
+    first = ingest_news(make_item("wire-1", "Apple beats", STORY))
+    assert first.near_duplicate_of is None
+
+    responses = ingest_news_many(
+        [
+            make_item("wire-2", "Apple beats", STORY + " (Reporting by Jane Doe; 10:02 GMT)"),
+            make_item("other-1", "Tesla recall", RECALL),
+            make_item("other-2", "Tesla recall", RECALL + " Updated 11:00 GMT"),
+        ]
+    )
+    assert responses[0].near_duplicate_of == "wire-1"
+    assert not responses[0].deduped
+    assert responses[1].near_duplicate_of is None
+    assert responses[2].near_duplicate_of == "other-1"
+
+    row = db.fetch_one("SELECT canonical_id FROM news_clean WHERE id = 'wire-2'")
+    assert row["canonical_id"] == "wire-1"
+
+    skipped = analyze_news("wire-2")
+    assert skipped.duplicate_of == "wire-1"
+    assert skipped.results == []
+    assert db.fetch_all("SELECT * FROM analysis_runs") == []
+
+
+def test_stale_layout_is_rebuilt_before_matching(tmp_path, monkeypatch):
+    db = setup_db(tmp_path, monkeypatch)
+    import app.near_dup as near_dup
+    from app.ingest import ingest_news
+
+    ingest_news(make_item("wire-1", "Apple beats", STORY))
+    # Simulate a database written under an older signature layout.
+    with db.transaction():
+        db.execute("DELETE FROM news_lsh")
+        db.set_version("near_dup_layout", near_dup.LAYOUT_VERSION - 1)
+    monkeypatch.setattr(near_dup, "_LAYOUT_PATH", None)
+
+    response = ingest_news(make_item("wire-2", "Apple beats", STORY + " (Reporting by Jane Doe)"))
+    assert response.near_duplicate_of == "wire-1"
+    assert db.get_version("near_dup_layout") == near_dup.LAYOUT_VERSION
+
+
+def test_bands_many_matches_single_signature():
+    from app.near_dup import bands, bands_many, minhash_many
+
+    signatures = minhash_many([STORY, RECALL, ""])
+    assert bands_many(signatures) == [bands(signature) for signature in signatures]
+
+
+def test_ingest_bench_reports_rate(tmp_path, monkeypatch):
+    setup_db(tmp_path, monkeypatch)
+    from app.ingest_bench import TARGET_RATE, bench
+
+    rate, lines = bench(200, 50)
+    assert rate > 0
+    assert f"target={TARGET_RATE}" in lines[0]
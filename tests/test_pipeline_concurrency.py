@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import importlib
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+
+def setup_pipeline(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "test.db"))
+    import app.db as db
+
+    importlib.reload(db)
+    db.init_db()
+    import app.rag as rag
+
+    importlib.reload(rag)
+    rag.seed_profiles_if_missing()
+    import app.pipeline as pipeline
+
+    importlib.reload(pipeline)
+    return db, pipeline
+
+
+def test_tickers_are_analyzed_concurrently_and_written_in_order(tmp_path, monkeypatch):
+    db, pipeline = setup_pipeline(tmp_path, monkeypatch)
+    from app.ingest import ingest_news
+    from app.llm_analyzer import LLMClient
+    from app.models import NewsIn
+
+    class SlowClient(LLMClient):
+        def __init__(self):
+            self.active = 0
+            self.peak = 0
+            self.lock = threading.Lock()
+
+        def analyze(self, ticker, article, context):
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(0.1)
+            with self.lock:
+                self.active -= 1
+            return super().analyze(ticker, article, context)
+
+    ingest_news(
+        NewsIn(
+            id="news-1",
+            source="mock",
+            published_at="2025-01-01T10:00:00Z",
+            title="Apple and Tesla earnings",
+            content="Earnings from $MSFT and $NVDA as well.",
+        )
+    )
+    client = SlowClient()
+    started = time.perf_counter()
+    response = pipeline.analyze_news("news-1", client=client, concurrency=4)
+    elapsed = time.perf_counter() - started
+
+    assert [result.ticker for result in response.results] == ["AAPL", "MSFT", "NVDA", "TSLA"]
+    assert client.peak == 4
+    assert elapsed < 0.35
+    # State lanes order writes per ticker only; across tickers commit order may vary.
+    rows = db.fetch_all("SELECT ticker FROM state_events ORDER BY ticker")
+    assert [row["ticker"] for row in rows] == ["AAPL", "MSFT", "NVDA", "TSLA"]
+    assert pipeline.analyze_news("missing") is None
+
+
+def test_failed_audit_insert_rolls_back_state_updates(tmp_path, monkeypatch):
+    db, pipeline = setup_pipeline(tmp_path, monkeypatch)
+    from app.ingest import ingest_news
+    from app.models import NewsIn
+
+    def failing_record_run(row):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(pipeline, "_record_run", failing_record_run)
+    assert pipeline.STATE_LANES > 0
+    # One ticker goes through its state lane, several through the inline transaction.
+    for news_id, title in (("news-1", "Apple earnings"), ("news-2", "Apple and Tesla earnings")):
+        ingest_news(
+            NewsIn(id=news_id, source="mock", published_at="2025-01-01T10:00:00Z", title=title, content="Beat.")
+        )
+        with pytest.raises(RuntimeError):
+            pipeline.analyze_news(news_id)
+
+    assert db.fetch_one("SELECT COUNT(*) AS n FROM state_events")["n"] == 0
+    assert db.fetch_one("SELECT COUNT(*) AS n FROM state_snapshot")["n"] == 0
+    assert db.fetch_one("SELECT COUNT(*) AS n FROM analysis_runs")["n"] == 0
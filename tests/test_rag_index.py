@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import importlib
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+
+def setup_rag(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "test.db"))
+    import app.db as db
+
+    importlib.reload(db)
+    db.init_db()
+    import app.rag as rag
+
+    importlib.reload(rag)
+    rag.seed_profiles_if_missing()
+    return db, rag
+
+
+def test_writes_are_indexed_without_full_rebuild(tmp_path, monkeypatch):
+    db, rag = setup_rag(tmp_path, monkeypatch)
+    assert rag.retrieve_context("AAPL", "Apple iPhone", top_k=6)
+
+    def fail_refresh():
+        raise AssertionError("retrieval must not rebuild the store")
+
+    monkeypatch.setattr(rag, "refresh_store", fail_refresh)
+
+    db.upsert_profile("MSFT", "Microsoft builds cloud and productivity software.")
+    chunks = rag.retrieve_context("MSFT", "Microsoft cloud", top_k=6)
+    assert [(chunk.layer, chunk.source_id) for chunk in chunks] == [("profile", "MSFT")]
+
+    db.upsert_profile("MSFT", "Microsoft sells Azure and Office subscriptions.")
+    assert len(rag.STORE.partition("MSFT")) == 1
+    (record,) = rag.document_records("profile", "MSFT")
+    assert "Azure" in record.metadata["text"]
+
+    import app.state_manager as state_manager
+    from app.models import LLMImpactResult
+
+    analysis = LLMImpactResult.model_validate(
+        {
+            "ticker": "MSFT",
+            "event_type": "lawsuit",
+            "is_new_information": True,
+            "impact_score": -0.4,
+            "horizon": "long",
+            "severity": "high",
+            "confidence": 0.7,
+            "risk_flags": [],
+            "contradiction_flags": ["none"],
+            "summary": "Microsoft sued over licensing.",
+            "evidence": "A lawsuit was filed.",
+            "citations": [],
+        }
+    )
+    state_manager.apply_event_update("MSFT", "news-1", datetime.utcnow(), analysis)
+    layers = {chunk.layer for chunk in rag.retrieve_context("MSFT", "lawsuit", top_k=6)}
+    assert {"profile", "event", "state"} <= layers
+
+    db.notify_row("profile", "MSFT", None)
+    assert rag.document_records("profile", "MSFT") == []
+
+
+def test_search_is_scoped_to_ticker_partition(tmp_path, monkeypatch):
+    db, rag = setup_rag(tmp_path, monkeypatch)
+    for idx in range(20):
+        db.upsert_profile(f"T{idx:02d}", f"Filler company number {idx} making widgets.")
+    rag.refresh_store()
+    db.upsert_profile("AAPL", "Apple designs the iPhone.")
+
+    chunks = rag.retrieve_context("AAPL", "Filler company number 3 making widgets", top_k=6)
+    assert chunks
+    assert all(chunk.source_id == "AAPL" for chunk in chunks)
+    assert len(rag.STORE.partition("AAPL")) == 1
+
+
+def test_warm_start_maps_checkpoint_and_catches_up(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    db, rag = setup_rag(tmp_path, monkeypatch)
+    rag.ensure_store()
+    assert (tmp_path / "test.index" / "meta.json").exists()
+
+    # Simulate a restarted worker: fresh module state, rows written since the checkpoint.
+    importlib.reload(rag)
+    db.upsert_profile("MSFT", "Microsoft builds cloud software.")
+
+    def fail_refresh():
+        raise AssertionError("warm start must not rebuild the store")
+
+    monkeypatch.setattr(rag, "refresh_store", fail_refresh)
+    rag.ensure_store()
+
+    assert rag.document_records("profile", "AAPL")
+    assert rag.document_records("profile", "MSFT")
+    from app.vector_store import NumpyVectorStore
+
+    if isinstance(rag.STORE.partition("AAPL"), NumpyVectorStore):
+        assert not rag.STORE.partition("AAPL").matrix.flags.writeable
+    assert rag.retrieve_context("TSLA", "Tesla vehicles", top_k=6)
+
+
+def test_exact_terms_are_retrieved_through_the_lexical_index(tmp_path, monkeypatch):
+    db, rag = setup_rag(tmp_path, monkeypatch)
+    rag.ensure_store()
+    import app.state_manager as state_manager
+    from app.models import LLMImpactResult
+
+    for idx, (event_type, summary) in enumerate(
+        [
+            ("earnings", "Quarterly results were broadly in line with estimates."),
+            ("guidance", "Management raised full-year guidance on strong Vision Pro demand."),
+            ("product_launch", "A new accessory lineup shipped to stores in several regions."),
+        ]
+    ):
+        analysis = LLMImpactResult.model_validate(
+            {
+                "ticker": "AAPL",
+                "event_type": event_type,
+                "is_new_information": True,
+                "impact_score": 0.2,
+                "horizon": "swing",
+                "severity": "low",
+                "confidence": 0.6,
+                "risk_flags": [],
+                "contradiction_flags": ["none"],
+                "summary": summary,
+                "evidence": "Company statement.",
+                "citations": [],
+            }
+        )
+        state_manager.apply_event_update("AAPL", f"news-{idx}", datetime.utcnow(), analysis)
+
+    ((_, key),) = rag.LEXICAL.search("AAPL", "Vision Pro", top_k=1)
+    assert "Vision Pro" in rag.STORE.get(key).metadata["text"]
+    top = rag.retrieve_context("AAPL", "Vision Pro guidance", top_k=1)[0]
+    assert top.layer == "event" and "Vision Pro" in top.snippet
+
+    # Warm start rebuilds the lexical index from the mapped checkpoint.
+    pytest.importorskip("numpy")
+    rag.checkpoint_store()
+    importlib.reload(rag)
+    rag.ensure_store()
+    assert len(rag.LEXICAL) == len(rag.STORE)
+
+
+def test_rerank_prefers_recent_open_severe_events(tmp_path, monkeypatch):
+    db, rag = setup_rag(tmp_path, monkeypatch)
+    from app.vector_store import VectorRecord
+
+    now = datetime(2025, 6, 1).timestamp()
+
+    def candidate(score, source_id, **metadata):
+        return score, VectorRecord(vector=[], metadata={"source_id": source_id, **metadata})
+
+    old_closed = candidate(0.9, "old", status="closed", effective_ts=now - 5 * 365 * 86400, severity_score=0.4)
+    fresh_open = candidate(0.7, "fresh", status="open", effective_ts=now - 86400, severity_score=1.0)
+    profile = candidate(0.8, "profile")
+    ranked = rag.rerank([old_closed, profile, fresh_open], now, top_k=2)
+    assert [record.metadata["source_id"] for _, record in ranked] == ["fresh", "profile"]
+
+    import app.state_manager as state_manager
+    from app.models import LLMImpactResult
+
+    def analysis(event_type, severity, summary):
+        return LLMImpactResult.model_validate(
+            {
+                "ticker": "AAPL",
+                "event_type": event_type,
+                "is_new_information": True,
+                "impact_score": -0.5 if severity == "high" else -0.1,
+                "horizon": "long",
+                "severity": severity,
+                "confidence": 0.7,
+                "risk_flags": [],
+                "contradiction_flags": ["none"],
+                "summary": summary,
+                "evidence": "Court filing.",
+                "citations": [],
+            }
+        )
+
+    rag.ensure_store()
+    state_manager.apply_event_update(
+        "AAPL", "news-old", datetime(2020, 3, 1), analysis("lawsuit", "low", "Apple lawsuit over patents.")
+    )
+    state_manager.apply_event_update(
+        "AAPL", "news-old-2", datetime(2020, 9, 1), analysis("lawsuit", "low", "Apple patent lawsuit settled.")
+    )
+    state_manager.apply_event_update(
+        "AAPL", "news-new", datetime(2025, 5, 31), analysis("regulatory", "high", "EU fines Apple.")
+    )
+    events = [
+        chunk
+        for chunk in rag.retrieve_context("AAPL", "Apple lawsuit", top_k=6, as_of="2025-06-01T00:00:00")
+        if chunk.layer == "event"
+    ]
+    statuses = {
+        record.metadata["source_id"]: record.metadata["status"]
+        for record in rag.STORE.partition("AAPL").records.values()
+        if record.metadata["layer"] == "event"
+    }
+    assert "closed" in statuses.values()
+    assert statuses[events[0].source_id] == "open"
+
+
+def test_checkpoint_prunes_change_log_and_stale_readers_reload(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    db, rag = setup_rag(tmp_path, monkeypatch)
+    rag.ensure_store()
+    db.upsert_profile("MSFT", "Microsoft builds cloud software.")
+    rag.ensure_store()
+    rag.checkpoint_store()
+    high_water = rag._HIGH_WATER
+    assert db.index_changes_pruned_through() == high_water
+    assert db.fetch_one("SELECT COUNT(*) AS n FROM index_changes WHERE seq <= ?", (high_water,))["n"] == 0
+
+    # A worker restored from an older mark cannot replay the pruned changes.
+    rag._HIGH_WATER = 0
+    db.upsert_profile("NVDA", "Nvidia designs GPUs.")
+    rag.ensure_store()
+    assert rag._HIGH_WATER > high_water
+    assert rag.document_records("profile", "MSFT")
+    assert rag.document_records("profile", "NVDA")
+
+    rag.checkpoint_store()
+    index = tmp_path / "test.index"
+    # The newest and the previous generation remain; no temp files leak.
+    assert len(list(index.glob("vectors-*.f32"))) == 2
+    assert not list(index.glob(".*.tmp"))
+
+
+def test_out_of_order_dispatch_keeps_the_newest_row(tmp_path, monkeypatch):
+    db, rag = setup_rag(tmp_path, monkeypatch)
+    rag.ensure_store()
+
+    # Two writers of one document commit v1 then v2, but their post-commit
+    # dispatches run in the opposite order.
+    dispatches = []
+    with monkeypatch.context() as patch:
+        patch.setattr(db, "on_commit", dispatches.append)
+        db.upsert_profile("MSFT", "Microsoft v1 sells Windows licences.")
+        db.upsert_profile("MSFT", "Microsoft v2 sells Azure subscriptions.")
+    for dispatch in reversed(dispatches):
+        dispatch()
+
+    rag.ensure_store()
+    (record,) = rag.document_records("profile", "MSFT")
+    assert "v2" in record.metadata["text"]
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import importlib
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+
+def setup_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "test.db"))
+    import app.db as db
+
+    importlib.reload(db)
+    db.init_db()
+    import app.state_manager as state_manager
+
+    return db, state_manager
+
+
+def build_analysis(ticker, event_type, summary):
+    from app.models import LLMImpactResult
+
+    return LLMImpactResult.model_validate(
+        {
+            "ticker": ticker,
+            "event_type": event_type,
+            "is_new_information": True,
+            "impact_score": 0.1,
+            "horizon": "swing",
+            "severity": "low",
+            "confidence": 0.5,
+            "risk_flags": [],
+            "contradiction_flags": ["none"],
+            "summary": summary,
+            "evidence": "Evidence.",
+            "citations": [],
+        }
+    )
+
+
+def test_lanes_keep_ticker_order_and_group_commits(tmp_path, monkeypatch):
+    db, state_manager = setup_db(tmp_path, monkeypatch)
+    dispatcher = state_manager.StateUpdateDispatcher(lanes=2)
+    event_types = ["lawsuit", "earnings", "guidance", "product_launch"]
+    tickers = ["AAPL", "MSFT", "NVDA", "TSLA", "AMZN"]
+
+    # Holding the writer lock makes the lanes queue up behind it, as under load.
+    with db.transaction():
+        futures = [
+            dispatcher.submit(
+                ticker,
+                f"news-{idx}",
+                "2025-01-01T10:00:00",
+                build_analysis(ticker, event_type, f"Distinct {event_type} story {idx} for {ticker}."),
+            )
+            for idx, event_type in enumerate(event_types)
+            for ticker in tickers
+        ]
+    assert all(future.result(timeout=10)["status"] == "inserted" for future in futures)
+    assert dispatcher.commits <= 4
+
+    for ticker in tickers:
+        rows = db.fetch_all(
+            "SELECT source_id FROM state_events WHERE ticker = ? ORDER BY id", (ticker,)
+        )
+        assert [row["source_id"] for row in rows] == [f"news-{idx}" for idx in range(4)]
+        assert db.fetch_one("SELECT 1 FROM state_snapshot WHERE ticker = ?", (ticker,))
+
+
+def test_failed_update_does_not_fail_its_batch(tmp_path, monkeypatch):
+    db, state_manager = setup_db(tmp_path, monkeypatch)
+    dispatcher = state_manager.StateUpdateDispatcher(lanes=1)
+
+    with db.transaction():
+        good = dispatcher.submit(
+            "AAPL", "news-1", "2025-01-01T10:00:00", build_analysis("AAPL", "lawsuit", "Apple sued.")
+        )
+        bad = dispatcher.submit(
+            "TSLA", "news-2", "not-a-date", build_analysis("TSLA", "earnings", "Tesla earnings.")
+        )
+        also_good = dispatcher.submit(
+            "TSLA", "news-3", "2025-01-01T11:00:00", build_analysis("TSLA", "guidance", "Tesla guidance.")
+        )
+
+    assert good.result(timeout=10)["status"] == "inserted"
+    assert also_good.result(timeout=10)["status"] == "inserted"
+    with pytest.raises(ValueError):
+        bad.result(timeout=10)
+    rows = db.fetch_all("SELECT source_id FROM state_events ORDER BY id")
+    assert [row["source_id"] for row in rows] == ["news-1", "news-3"]
+
+
+def test_multi_lane_unit_keeps_order_and_commits_atomically(tmp_path, monkeypatch):
+    db, state_manager = setup_db(tmp_path, monkeypatch)
+    dispatcher = state_manager.StateUpdateDispatcher(lanes=2)
+    assert dispatcher.lane("AAPL") != dispatcher.lane("MSFT")
+    ts = "2025-01-01T10:00:00"
+
+    def update(ticker, news_id, event_type):
+        return (ticker, news_id, ts, build_analysis(ticker, event_type, f"{ticker} {event_type} in {news_id}."))
+
+    def record(news_id):
+        db.execute("INSERT INTO app_meta (key, value) VALUES (?, '1')", (f"run-{news_id}",))
+
+    def fail():
+        raise RuntimeError("audit write failed")
+
+    with db.transaction():
+        before = dispatcher.submit_unit([update("AAPL", "news-1", "lawsuit")])
+        joined = dispatcher.submit_unit(
+            [update("AAPL", "news-2", "earnings"), update("MSFT", "news-2", "earnings")],
+            lambda: record("news-2"),
+        )
+        failed = dispatcher.submit_unit(
+            [update("AAPL", "news-3", "guidance"), update("MSFT", "news-3", "guidance")], fail
+        )
+        after = dispatcher.submit_unit([update("MSFT", "news-4", "lawsuit")])
+
+    assert before.result(timeout=10) == [{"status": "inserted"}]
+    assert [result["status"] for result in joined.result(timeout=10)] == ["inserted", "inserted"]
+    with pytest.raises(RuntimeError):
+        failed.result(timeout=10)
+    assert after.result(timeout=10) == [{"status": "inserted"}]
+
+    for ticker, expected in (("AAPL", ["news-1", "news-2"]), ("MSFT", ["news-2", "news-4"])):
+        rows = db.fetch_all("SELECT source_id FROM state_events WHERE ticker = ? ORDER BY id", (ticker,))
+        assert [row["source_id"] for row in rows] == expected
+    assert db.get_version("run-news-2") == 1
@@ -108,3 +108,43 @@ def test_idempotency_on_rerun(tmp_path, monkeypatch):
     assert result["status"] == "idempotent"
     rows = db.fetch_all("SELECT * FROM state_events")
     assert len(rows) == 1
+
+
+def test_open_event_index_matches_first_by_id_scan(tmp_path, monkeypatch):
+    import random
+
+    db, state_manager = setup_db(tmp_path, monkeypatch)
+    rng = random.Random(7)
+    vocab = [f"w{idx}" for idx in range(12)]
+    event_types = ["lawsuit", "earnings", "guidance", "macro"]
+
+    def summary():
+        return " ".join(rng.sample(vocab, rng.randint(0, 5)))
+
+    def scan(rows, event_type, text):
+        tokens = set(text.lower().split())
+        for row in rows:
+            if row["event_type"] == event_type:
+                return row
+            other = set(row["summary"].lower().split())
+            if tokens and other and len(tokens & other) / len(tokens | other) > 0.4:
+                return row
+        return None
+
+    rows = [
+        {"id": idx, "event_type": rng.choice(event_types), "summary": summary()}
+        for idx in range(1, 60)
+    ]
+    index = state_manager.OpenEventIndex(rows)
+    for row in rng.sample(rows, 20):
+        index.discard(row["id"])
+        rows.remove(row)
+    for _ in range(300):
+        event_type, text = rng.choice(event_types + ["other"]), summary()
+        assert index.match(event_type, text) == scan(rows, event_type, text)
+
+    plan = db.fetch_all(
+        "EXPLAIN QUERY PLAN SELECT * FROM state_events WHERE ticker = ? AND status = 'open'",
+        ("AAPL",),
+    )
+    assert "idx_state_events_open" in " ".join(row["detail"] for row in plan)
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import importlib
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+
+def setup_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "test.db"))
+    import app.db as db
+
+    importlib.reload(db)
+    db.init_db()
+    import app.state_manager as state_manager
+
+    importlib.reload(state_manager)
+    return db, state_manager
+
+
+def build_analysis(event_type, summary, **overrides):
+    from app.models import LLMImpactResult
+
+    base = {
+        "ticker": "AAPL",
+        "event_type": event_type,
+        "is_new_information": True,
+        "impact_score": -0.3,
+        "horizon": "swing",
+        "severity": "high",
+        "confidence": 0.6,
+        "risk_flags": [],
+        "contradiction_flags": ["none"],
+        "summary": summary,
+        "evidence": "Evidence.",
+        "citations": [],
+    }
+    base.update(overrides)
+    return LLMImpactResult.model_validate(base)
+
+
+def stored_state(db, ticker="AAPL"):
+    row = db.fetch_one("SELECT state_json FROM state_snapshot WHERE ticker = ?", (ticker,))
+    state = json.loads(row["state_json"])
+    state.pop("last_updated")
+    return state
+
+
+def test_incremental_snapshot_matches_rebuild_and_writes_once_per_commit(tmp_path, monkeypatch):
+    db, state_manager = setup_db(tmp_path, monkeypatch)
+    writes = []
+    store_snapshot = db.store_snapshot
+
+    def counting_store(ticker, state):
+        writes.append(ticker)
+        return store_snapshot(ticker, state)
+
+    monkeypatch.setattr(db, "store_snapshot", counting_store)
+    now = datetime(2025, 1, 1, 10, 0)
+
+    with db.transaction():
+        for ticker, news_id, event_type, summary in [
+            ("AAPL", "news-1", "lawsuit", "Apple sued over patents."),
+            ("AAPL", "news-2", "earnings", "Quarterly results beat."),
+            ("TSLA", "news-3", "guidance", "Guidance cut."),
+        ]:
+            state_manager.apply_event_update(ticker, news_id, now, build_analysis(event_type, summary))
+    assert sorted(writes) == ["AAPL", "TSLA"]
+
+    later = now + timedelta(hours=1)
+    state_manager.apply_event_update(
+        "AAPL", "news-4", later, build_analysis("earnings", "Quarterly results beat again.", confidence=0.9)
+    )
+    state_manager.apply_event_update(
+        "AAPL", "news-5", later, build_analysis("lawsuit", "Patent lawsuit settled.")
+    )
+    incremental = stored_state(db)
+
+    state_manager.rebuild_snapshot("AAPL")
+    assert stored_state(db) == incremental
+    assert [event["event_type"] for event in incremental["open_events"]] == ["earnings"]
+    assert incremental["open_events"][0]["confidence"] == 0.9
+
+
+def test_rollback_and_foreign_writes_invalidate_cached_window(tmp_path, monkeypatch):
+    db, state_manager = setup_db(tmp_path, monkeypatch)
+    now = datetime(2025, 1, 1, 10, 0)
+    state_manager.apply_event_update("AAPL", "news-1", now, build_analysis("lawsuit", "Apple sued."))
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            state_manager.apply_event_update(
+                "AAPL", "news-2", now, build_analysis("earnings", "Results beat.")
+            )
+            raise RuntimeError("abort")
+
+    # Another process adds an event and rewrites the snapshot behind our cache.
+    db.execute(
+        """
+        INSERT INTO state_events (
+            ticker, event_type, status, severity, impact_score, horizon, summary,
+            source_id, start_ts, end_ts, confidence, evidence, created_at
+        ) VALUES (
+            'AAPL', 'regulatory', 'open', 'low', 0.1, 'long', 'Probe opened.',
+            'news-x', ?, NULL, 0.5, 'e', ?
+        )
+        """,
+        (now.isoformat(), datetime.utcnow().isoformat()),
+    )
+    db.store_snapshot("AAPL", {"ticker": "AAPL"})
+
+    state_manager.apply_event_update(
+        "AAPL", "news-3", now, build_analysis("product_launch", "New phone.")
+    )
+    sources = [event["source_id"] for event in stored_state(db)["open_events"]]
+    assert sources == ["news-3", "news-x", "news-1"]
+
+
+def test_state_as_of_replays_from_nearest_checkpoint(tmp_path, monkeypatch):
+    db, state_manager = setup_db(tmp_path, monkeypatch)
+    monkeypatch.setattr(state_manager, "CHECKPOINT_EVERY", 3)
+    start = datetime(2025, 1, 1, 9, 0)
+    event_types = ["lawsuit", "earnings", "guidance", "product_launch", "regulatory"]
+    for idx in range(12):
+        event_type = event_types[idx % len(event_types)]
+        summary = f"Story {idx} about {event_type}."
+        if idx >= 10:
+            summary = f"The {event_type} matter was resolved."
+        published_at = start + timedelta(minutes=10 * idx)
+        state_manager.apply_event_update(
+            "AAPL", f"news-{idx}", published_at, build_analysis(event_type, summary)
+        )
+    checkpoints = db.fetch_all("SELECT seq FROM state_checkpoints WHERE ticker = 'AAPL'")
+    assert len(checkpoints) >= 3
+
+    assert state_manager.get_state_as_of("AAPL", start - timedelta(minutes=1)) is None
+    latest = state_manager.get_state_as_of("AAPL", start + timedelta(days=1))
+    latest.pop("last_updated")
+    assert latest == stored_state(db)
+
+    at_0945 = start + timedelta(minutes=45)
+    with_checkpoints = state_manager.get_state_as_of("AAPL", at_0945)
+    assert [event["source_id"] for event in with_checkpoints["recent_catalysts"]] == [
+        "news-4",
+        "news-3",
+        "news-2",
+        "news-1",
+        "news-0",
+    ]
+    db.execute("DELETE FROM state_checkpoints")
+    assert state_manager.get_state_as_of("AAPL", at_0945) == with_checkpoints
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import random
+import string
+
+
+def test_aliases_respect_word_boundaries():
+    from app.ticker_linker import extract_tickers
+
+    assert extract_tickers(["Pineapple growers rally"]) == []
+    assert extract_tickers(["Apple's iPhone", "Tesla, $NVDA and APPLE INC."]) == [
+        "AAPL",
+        "NVDA",
+        "TSLA",
+    ]
+    assert extract_tickers(["TESLAS are everywhere"]) == []
+
+
+def test_matcher_agrees_with_naive_scan_on_large_universe(tmp_path):
+    from app.ticker_linker import AliasMatcher, load_alias_table, normalize_alias
+
+    rng = random.Random(3)
+    rows = ["alias,ticker"]
+    for idx in range(5000):
+        name = "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(3, 8)))
+        rows.append(f"{name} corp,T{idx}")
+        rows.append(f"{name},T{idx}")
+    path = tmp_path / "aliases.csv"
+    path.write_text("\n".join(rows) + "\n")
+    aliases = load_alias_table(path)
+    matcher = AliasMatcher(aliases)
+    assert matcher.size == len(aliases)
+
+    words = [alias for alias in list(aliases)[:200]] + ["THE", "SAID", "SHARES"]
+    text = normalize_alias(" ".join(rng.choice(words) for _ in range(300)))
+    tokens = f" {text} "
+    expected = {ticker for alias, ticker in aliases.items() if f" {alias} " in tokens}
+    assert matcher.find(text) == expected
+
+
+def test_universe_table_hot_reload(tmp_path, monkeypatch):
+    import importlib
+
+    monkeypatch.setenv("APP_DB_PATH", str(tmp_path / "test.db"))
+    import app.db as db
+
+    importlib.reload(db)
+    db.init_db()
+    from app import ticker_linker
+
+    registry = ticker_linker.AliasRegistry(ticker_linker.ALIAS_MAP, check_interval=0)
+    monkeypatch.setattr(ticker_linker, "REGISTRY", registry)
+
+    path = tmp_path / "universe.csv"
+    path.write_text(
+        "ticker,name,aliases,profile_text\n"
+        "MSFT,Microsoft,MICROSOFT CORP|AZURE,Microsoft builds cloud software.\n"
+        "NVDA,Nvidia,,\n"
+    )
+    assert ticker_linker.load_universe_csv(path) == 2
+    assert db.get_version(ticker_linker.ALIAS_VERSION_KEY) == 1
+
+    registry.refresh(wait=True)
+    assert ticker_linker.extract_tickers(["Azure growth lifts Microsoft Corp and NVIDIA"]) == [
+        "MSFT",
+        "NVDA",
+    ]
+    assert db.fetch_one("SELECT profile_text FROM profile WHERE ticker = 'MSFT'") is not None
+
+    old = registry.snapshot
+    db.execute("INSERT INTO ticker_aliases (alias, ticker) VALUES ('GEFORCE', 'NVDA')")
+    db.bump_version(ticker_linker.ALIAS_VERSION_KEY)
+    # Readers keep the current snapshot while the replacement compiles.
+    assert registry.matcher() in (old.matcher, registry.snapshot.matcher)
+    registry.refresh(wait=True)
+    assert registry.snapshot.version == 2
+    assert ticker_linker.extract_tickers(["GeForce demand"]) == ["NVDA"]
+
+
+def test_matcher_follows_failure_links_across_words():
+    from app.ticker_linker import AliasMatcher, normalize_alias
+
+    matcher = AliasMatcher({"BANK OF AMERICA": "BAC", "AMERICA MOVIL": "AMX", "AT&T": "T"})
+    text = normalize_alias("Bank of Bank of America Movil and AT&T")
+    assert matcher.find(text) == {"BAC", "AMX", "T"}
+    assert matcher.find(normalize_alias("Bank of the America")) == set()
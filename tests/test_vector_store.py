@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+
+def build_stores(count: int, dim: int = 8):
+    from app.vector_store import NumpyVectorStore, VectorStore
+
+    rng = random.Random(7)
+    reference = VectorStore(dim=dim)
+    fast = NumpyVectorStore(dim=dim, capacity=4)
+    for idx in range(count):
+        vector = [rng.uniform(-1, 1) for _ in range(dim)]
+        metadata = {"ticker": "AAPL", "layer": "event", "source_id": str(idx)}
+        reference.add(vector, metadata)
+        fast.add(vector, metadata)
+    return reference, fast, rng
+
+
+def keys(results):
+    return [record.metadata["source_id"] for _, record in results]
+
+
+def test_numpy_store_matches_reference_after_growth_and_deletes():
+    reference, fast, rng = build_stores(100)
+    for idx in range(0, 100, 3):
+        reference.delete(("event", str(idx)))
+        fast.delete(("event", str(idx)))
+    assert len(fast) == len(reference)
+
+    query = [rng.uniform(-1, 1) for _ in range(8)]
+    assert keys(fast.search_scored(query, top_k=5)) == keys(reference.search_scored(query, top_k=5))
+    assert len(fast.search(query, top_k=500)) == len(reference)
+
+
+def test_numpy_store_batched_queries_and_upsert():
+    reference, fast, rng = build_stores(40)
+    queries = [[rng.uniform(-1, 1) for _ in range(8)] for _ in range(4)]
+    batched = fast.search_many_scored(queries, top_k=3)
+    assert [keys(result) for result in batched] == [
+        keys(reference.search_scored(query, top_k=3)) for query in queries
+    ]
+
+    fast.upsert(("event", "5"), queries[0], {"ticker": "AAPL", "layer": "event", "source_id": "5"})
+    assert len(fast) == 40
+    score, record = fast.search_scored(queries[0], top_k=1)[0]
+    assert record.metadata["source_id"] == "5"
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+
+def clustered(count: int, dim: int = 16, seed: int = 3):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((8, dim))
+    return (centers[rng.integers(0, 8, count)] + 0.3 * rng.standard_normal((count, dim))).tolist()
+
+
+def test_ann_store_reports_writes_made_after_the_index_was_built():
+    from app.vector_store import ANNStoreFactory, NumpyVectorStore
+
+    factory = ANNStoreFactory(backend="ivf", nprobe=4, min_train=200)
+    ann = factory(16)
+    exact = NumpyVectorStore(dim=16)
+    for idx, vector in enumerate(clustered(400)):
+        metadata = {"ticker": "AAPL", "layer": "event", "source_id": str(idx)}
+        ann.add(vector, metadata)
+        exact.add(vector, metadata)
+
+    queries = clustered(20, seed=9)
+    assert ann.search_many_scored(queries, top_k=5)
+    ann.wait_for_build()
+    assert ann._ann is not None and not ann.building
+
+    overlap = sum(
+        len(set(keys(approx)) & set(keys(truth)))
+        for approx, truth in zip(ann.search_many_scored(queries, 5), exact.search_many_scored(queries, 5))
+    )
+    assert overlap >= 0.8 * 20 * 5
+
+    ann.upsert(("event", "new"), queries[0], {"ticker": "AAPL", "layer": "event", "source_id": "new"})
+    score, record = ann.search_scored(queries[0], top_k=1)[0]
+    assert record.metadata["source_id"] == "new" and score == pytest.approx(1.0, abs=1e-5)
+
+    top = keys(ann.search_scored(queries[1], top_k=1))[0]
+    ann.delete(("event", top))
+    exact.delete(("event", top))
+    assert top not in keys(ann.search_scored(queries[1], top_k=10))
+
+    matrix, metadatas = ann.export()
+    restored = factory.from_arrays(16, matrix, ann.norms, metadatas)
+    assert keys(restored.search_scored(queries[2], top_k=3)) == keys(exact.search_scored(queries[2], top_k=3))
+
+
+def test_ivf_in_place_build_matches_copying_build():
+    import numpy as np
+
+    from app.ann_bench import synthetic_corpus
+    from app.vector_store import IVFIndex
+
+    vectors, _ = synthetic_corpus(3000, 16, clusters=32)
+    original = vectors.copy()
+    copied = IVFIndex(vectors, nlist=32, nprobe=4)
+    assert np.array_equal(vectors, original)
+
+    in_place = IVFIndex(vectors, nlist=32, nprobe=4, in_place=True)
+    assert in_place.vectors is vectors
+    assert np.array_equal(vectors, original[in_place.order])
+    queries = original[:20]
+    assert np.array_equal(in_place.search(queries, 5)[1], copied.search(queries, 5)[1])